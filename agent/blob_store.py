@@ -0,0 +1,220 @@
+# agent/blob_store.py
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import zstandard
+
+from agent import metrics
+from agent.fix_cache import CACHE_DIR
+
+# Blob store configuration
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(CACHE_DIR, "blobs"))
+BLOB_MEMORY_BYTES = int(os.getenv("BLOB_MEMORY_BYTES", str(64 * 1024 * 1024)))
+BLOB_COMPRESSION_LEVEL = int(os.getenv("BLOB_COMPRESSION_LEVEL", "3"))
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", str(1024 * 1024 * 1024)))  # Compressed, on disk
+BLOB_MAX_AGE = float(os.getenv("BLOB_MAX_AGE_SECONDS", str(30 * 24 * 3600)))  # Since last use
+BLOB_GC_INTERVAL = int(os.getenv("BLOB_GC_INTERVAL", "1000"))  # New blobs written between collections
+
+DIGEST_PREFIX = "sha256:"
+
+
+class BlobStore:
+    """
+    Content-addressed store for large texts (logs, fixed files).
+
+    Graph state holds only the digest returned by `put`, so checkpoints and
+    the per-step state copies stay small no matter how big the logs are.
+    Blobs are zstd-compressed on disk and written once: storing the same
+    text again (e.g. a resumed run) costs a hash and a stat.
+
+    Recently used texts are also kept decompressed in memory, up to
+    `memory_bytes` in total across all concurrent runs.
+
+    Every read or write of a blob refreshes its file's mtime. `gc` runs on
+    the first write and then every `gc_interval` writes. It deletes blobs
+    unused for `max_age` seconds, then the least recently used ones until
+    the store fits in `max_bytes`.
+
+    Counters (see agent.metrics) are prefixed with `blob_store.`.
+    """
+
+    def __init__(
+        self,
+        path: str = BLOB_DIR,
+        memory_bytes: int = BLOB_MEMORY_BYTES,
+        max_bytes: int = BLOB_MAX_BYTES,
+        max_age: float = BLOB_MAX_AGE,
+        gc_interval: int = BLOB_GC_INTERVAL,
+    ):
+        self.path = path
+        self.memory_bytes = memory_bytes
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.gc_interval = gc_interval
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_used = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._gc_lock = threading.Lock()
+        # zstd contexts are not thread-safe; one per thread
+        self._local = threading.local()
+
+    def _file(self, digest: str) -> str:
+        hexdigest = digest[len(DIGEST_PREFIX) :]
+        return os.path.join(self.path, hexdigest[:2], hexdigest[2:] + ".zst")
+
+    def _remember(self, digest: str, text: str):
+        size = len(text)  # Characters; close enough to bytes for logs and code
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                return
+            self._memory[digest] = text
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted)
+                metrics.incr("blob_store.evictions.memory")
+
+    def _codecs(self):
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=BLOB_COMPRESSION_LEVEL)
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.compressor, self._local.decompressor
+
+    def put(self, text: str) -> str:
+        """Store `text` and return its digest ('sha256:<hex>')."""
+        data = text.encode("utf-8")
+        digest = DIGEST_PREFIX + hashlib.sha256(data).hexdigest()
+        path = self._file(digest)
+
+        try:
+            os.utime(path)  # Already stored; mark it as recently used
+        except FileNotFoundError:
+            compressed = self._codecs()[0].compress(data)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so concurrent readers never see a partial blob
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp, path)
+            metrics.incr("blob_store.bytes_raw", len(data))
+            metrics.incr("blob_store.bytes_stored", len(compressed))
+
+            with self._lock:
+                self._writes += 1
+                collect = (self._writes - 1) % self.gc_interval == 0
+            if collect:
+                self.gc()
+
+        self._remember(digest, text)
+        return digest
+
+    def get(self, digest: str) -> str:
+        """
+        Text stored under `digest`.
+
+        Raises:
+            KeyError: if no such blob exists
+        """
+        with self._lock:
+            text = self._memory.get(digest)
+            if text is not None:
+                self._memory.move_to_end(digest)
+                metrics.incr("blob_store.hits.memory")
+                return text
+
+        try:
+            with open(self._file(digest), "rb") as f:
+                compressed = f.read()
+        except FileNotFoundError:
+            raise KeyError(digest) from None
+
+        try:
+            os.utime(self._file(digest))
+        except FileNotFoundError:
+            pass  # Collected since; the text is still good
+        text = self._codecs()[1].decompress(compressed).decode("utf-8")
+        metrics.incr("blob_store.hits.disk")
+        self._remember(digest, text)
+        return text
+
+    def gc(self) -> int:
+        """
+        Delete blobs unused for `max_age` seconds, then the least recently
+        used ones until the rest fit in `max_bytes`.
+
+        Skipped if another thread is already collecting.
+
+        Returns:
+            How many blobs were deleted
+        """
+        if not self._gc_lock.acquire(blocking=False):
+            return 0
+        try:
+            blobs = []  # (mtime, size, path), least recently used first
+            for shard in os.scandir(self.path):
+                if not shard.is_dir():
+                    continue
+                for blob in os.scandir(shard.path):
+                    if blob.name.endswith(".zst"):
+                        stat = blob.stat()
+                        blobs.append((stat.st_mtime, stat.st_size, blob.path))
+            blobs.sort()
+
+            cutoff = time.time() - self.max_age
+            total = sum(size for _, size, _ in blobs)
+            deleted = 0
+            for mtime, size, path in blobs:
+                if mtime >= cutoff and total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+        except FileNotFoundError:
+            return 0  # Nothing stored yet
+        finally:
+            self._gc_lock.release()
+
+        metrics.incr("blob_store.evictions.disk", deleted)
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        """Memory held by cached texts plus the blob_store counters."""
+        with self._lock:
+            held = {"memory_bytes": self._memory_used, "memory_entries": len(self._memory)}
+        return {**held, **metrics.get_counters("blob_store.")}
+
+
+_blob_store: Optional[BlobStore] = None
+_blob_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Shared process-wide BlobStore."""
+    global _blob_store
+    with _blob_store_lock:
+        if _blob_store is None:
+            _blob_store = BlobStore()
+        return _blob_store
+
+
+def put_blob(text: str) -> str:
+    """Store `text` in the shared blob store; returns its digest."""
+    return get_blob_store().put(text)
+
+
+def get_blob(digest: str) -> str:
+    """Text for a digest from `put_blob`."""
+    return get_blob_store().get(digest)
@@ -0,0 +1,170 @@
+# agent/bulk.py
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, List, Optional, TextIO, Tuple
+
+from agent.single_flight import aheal_coalesced
+
+# Defaults for bulk healing
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_PER_REPO_LIMIT = 2
+
+
+def parse_run_list(lines: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    Parse a list of failed runs to heal.
+
+    Each non-empty line is either 'owner/repo RUN_ID', 'owner/repo,RUN_ID'
+    or a JSON object with 'repo_name' and 'run_id'. Lines starting with '#'
+    are ignored.
+
+    Args:
+        lines: Lines of text (e.g., an open file or sys.stdin)
+
+    Returns:
+        List of (repo_name, run_id) pairs in input order
+    """
+    runs = []
+    for number, raw in enumerate(lines, start=1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("{"):
+            entry = json.loads(line)
+            repo_name, run_id = entry.get("repo_name"), entry.get("run_id")
+        else:
+            parts = line.replace(",", " ").split()
+            repo_name, run_id = (parts + [None, None])[:2]
+
+        if not repo_name or not run_id or "/" not in repo_name:
+            raise ValueError(f"Line {number}: expected 'owner/repo RUN_ID', got {raw!r}")
+
+        runs.append((repo_name, str(run_id)))
+
+    return runs
+
+
+def _summarize(repo_name: str, run_id: str, final_state: Optional[dict], error, started: float) -> dict:
+    """Turn a finished (or failed) graph run into one JSON-serializable record."""
+    final_state = final_state or {}
+    return {
+        "repo_name": repo_name,
+        "run_id": run_id,
+        "success": bool(final_state.get("success", False)),
+        "current_step": final_state.get("current_step", "starting"),
+        "failed_file": final_state.get("failed_file", ""),
+        "branch_name": final_state.get("branch_name", ""),
+        "pr_url": final_state.get("pr_url"),
+        "coalesced_with": final_state.get("coalesced_with"),
+        "tokens": sum(
+            usage["prompt_tokens"] + usage["completion_tokens"]
+            for usage in final_state.get("token_usage", {}).values()
+        ),
+        "error": str(error) if error else None,
+        "duration_s": round(time.monotonic() - started, 3),
+    }
+
+
+async def heal_runs(
+    runs: Iterable[Tuple[str, str]],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    per_repo_limit: int = DEFAULT_PER_REPO_LIMIT,
+    resume: bool = False,
+    prepared: Optional[Dict[Tuple[str, str], dict]] = None,
+) -> AsyncIterator[dict]:
+    """
+    Heal many failed workflow runs concurrently.
+
+    Runs are driven through `healing_graph.ainvoke`, bounded by a global
+    concurrency limit and a per-repository cap (so one noisy repo cannot
+    starve the others or open a flood of branches at once). Results are
+    yielded as soon as each run finishes, not in input order. Identical
+    heals (same repo, commit and error) share one execution, see
+    agent.single_flight.
+
+    Args:
+        runs: (repo_name, run_id) pairs
+        max_concurrency: Maximum number of runs healed at the same time
+        per_repo_limit: Maximum number of concurrent runs per repository
+        resume: Continue each run from its last checkpoint, if any
+        prepared: `prepare_state` output by (repo_name, run_id), for runs
+            whose logs the caller already fetched
+
+    Yields:
+        One summary dict per run (see `_summarize`)
+    """
+    if max_concurrency < 1 or per_repo_limit < 1:
+        raise ValueError("Concurrency limits must be at least 1")
+
+    global_limit = asyncio.Semaphore(max_concurrency)
+    repo_limits = defaultdict(lambda: asyncio.Semaphore(per_repo_limit))
+    prepared = prepared or {}
+
+    async def heal_one(repo_name: str, run_id: str) -> dict:
+        async with repo_limits[repo_name], global_limit:
+            started = time.monotonic()
+            try:
+                final_state = await aheal_coalesced(repo_name, run_id, resume, prepared.get((repo_name, run_id)))
+                return _summarize(repo_name, run_id, final_state, None, started)
+            except Exception as e:
+                return _summarize(repo_name, run_id, None, e, started)
+
+    tasks = [asyncio.create_task(heal_one(repo, run_id)) for repo, run_id in runs]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _write_results(
+    runs, output: TextIO, max_concurrency: int, per_repo_limit: int, resume: bool
+) -> int:
+    failures = 0
+    async for result in heal_runs(runs, max_concurrency, per_repo_limit, resume):
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        if not result["success"]:
+            failures += 1
+    return failures
+
+
+def run_bulk(
+    runs: List[Tuple[str, str]],
+    output: TextIO,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    per_repo_limit: int = DEFAULT_PER_REPO_LIMIT,
+    resume: bool = False,
+) -> int:
+    """
+    Blocking entry point for the bulk CLI.
+
+    The graph nodes are synchronous (the GitHub and LLM clients block), so
+    `ainvoke` runs them on the event loop's default executor. That executor
+    is sized here so the thread pool is never the bottleneck below
+    `max_concurrency`.
+
+    Args:
+        runs: (repo_name, run_id) pairs
+        output: Stream that receives one JSON line per finished run
+        max_concurrency: Maximum number of runs healed at the same time
+        per_repo_limit: Maximum number of concurrent runs per repository
+        resume: Continue each run from its last checkpoint, if any
+
+    Returns:
+        Number of runs that did not heal successfully
+    """
+
+    async def main() -> int:
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="heal") as pool:
+            loop.set_default_executor(pool)
+            return await _write_results(runs, output, max_concurrency, per_repo_limit, resume)
+
+    return asyncio.run(main())
@@ -0,0 +1,346 @@
+# agent/checkpoint.py
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from agent import metrics
+from agent.fix_cache import CACHE_DIR
+
+# Checkpoint configuration
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(CACHE_DIR, "checkpoints.sqlite3"))
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
+# A step writing more than this means something large slipped into the state
+CHECKPOINT_WARN_BYTES = int(os.getenv("CHECKPOINT_WARN_BYTES", str(256 * 1024)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    parent_id TEXT, checkpoint_type TEXT NOT NULL, checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, created REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL,
+    version TEXT NOT NULL, value_type TEXT NOT NULL, value BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL,
+    value_type TEXT NOT NULL, value BLOB NOT NULL, task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_created ON checkpoints (created);
+"""
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """
+    LangGraph checkpoint saver backed by a single SQLite file.
+
+    Every superstep of the healing graph is saved, so a run that dies in
+    apply_fix or create_pr can be resumed from its last checkpoint without
+    fetching the logs or calling the LLM again. Channel values are stored
+    once per version (like LangGraph's own savers), so the large
+    `error_logs` is written once rather than at every step.
+
+    Threads whose latest checkpoint is older than `ttl` seconds are deleted
+    when the store is opened.
+
+    Bytes written per step are counted in the `checkpoint.` metrics
+    (`writes`, `bytes`, `max_step_bytes`).
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH, ttl: float = CHECKPOINT_TTL, *, serde=None):
+        super().__init__(serde=serde)
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self.prune(ttl)
+
+    def prune(self, ttl: float) -> int:
+        """Delete threads not checkpointed for `ttl` seconds; returns how many."""
+        with self._lock:
+            stale = [
+                thread_id
+                for (thread_id,) in self._db.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created) < ?",
+                    (time.time() - ttl,),
+                )
+            ]
+        for thread_id in stale:
+            self.delete_thread(thread_id)
+        return len(stale)
+
+    def _row_to_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint_type, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+
+        values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            found = self._db.execute(
+                "SELECT value_type, value FROM blobs"
+                " WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if found is not None and found[0] != "empty":
+                values[channel] = self.serde.loads_typed(found)
+
+        writes = self._db.execute(
+            "SELECT task_id, channel, value_type, value FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+        def config_for(checkpoint_id: str) -> RunnableConfig:
+            return {
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            }
+
+        return CheckpointTuple(
+            config=config_for(checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=config_for(parent_id) if parent_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """The checkpoint named in `config`, or the thread's latest one."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        query = (
+            "SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata"
+            " FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        params: Tuple[Any, ...] = (thread_id, checkpoint_ns)
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params += (checkpoint_id,)
+        query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self._lock:
+            row = self._db.execute(query, params).fetchone()
+            return self._row_to_tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Checkpoints matching the criteria, newest first."""
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, checkpoint_type,"
+            " checkpoint, metadata_type, metadata FROM checkpoints WHERE 1 = 1"
+        )
+        params: Tuple[Any, ...] = ()
+        if config:
+            query += " AND thread_id = ?"
+            params += (config["configurable"]["thread_id"],)
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params += (config["configurable"]["checkpoint_ns"],)
+            if get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params += (get_checkpoint_id(config),)
+        if before and get_checkpoint_id(before):
+            query += " AND checkpoint_id < ?"
+            params += (get_checkpoint_id(before),)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                return
+            with self._lock:
+                item = self._row_to_tuple(thread_id, checkpoint_ns, tuple(row))
+            if filter and not all(item.metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint and the channel values that changed with it."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint = checkpoint.copy()
+        values = checkpoint.pop("channel_values")
+
+        blobs = [
+            (thread_id, checkpoint_ns, channel, str(version))
+            + (self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b""))
+            for channel, version in new_versions.items()
+        ]
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        size = len(checkpoint_blob) + len(metadata_blob) + sum(len(blob[-1]) for blob in blobs)
+        metrics.incr("checkpoint.writes")
+        metrics.incr("checkpoint.bytes", size)
+        metrics.record_max("checkpoint.max_step_bytes", size)
+        if size > CHECKPOINT_WARN_BYTES:
+            print(f"⚠️ Checkpoint step wrote {size} bytes (channels: {', '.join(new_versions)})")
+
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    checkpoint_type,
+                    checkpoint_blob,
+                    metadata_type,
+                    metadata_blob,
+                    time.time(),
+                ),
+            )
+            self._db.commit()
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Save the writes a task made before the next checkpoint."""
+        configurable = config["configurable"]
+        rows = []
+        for index, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, index)
+            rows.append(
+                (
+                    # Regular writes are kept from the first attempt, special
+                    # ones (errors, interrupts) are replaced
+                    "IGNORE" if idx >= 0 else "REPLACE",
+                    (
+                        configurable["thread_id"],
+                        configurable.get("checkpoint_ns", ""),
+                        configurable["checkpoint_id"],
+                        task_id,
+                        idx,
+                        channel,
+                        *self.serde.dumps_typed(value),
+                        task_path,
+                    ),
+                )
+            )
+
+        with self._lock:
+            for conflict, row in rows:
+                self._db.execute(f"INSERT OR {conflict} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+            self._db.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint, write and value of a thread."""
+        with self._lock:
+            for table in ("checkpoints", "blobs", "writes"):
+                self._db.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._db.commit()
+
+    # SQLite calls are short and local, so the async API simply calls the
+    # sync one (as LangGraph's InMemorySaver does)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Zero-padded so versions sort as strings; the random part keeps
+        # versions unique when a thread is forked from an older checkpoint
+        if current is None:
+            number = 0
+        elif isinstance(current, int):
+            number = current
+        else:
+            number = int(current.split(".")[0])
+        return f"{number + 1:032}.{random.random():016}"
+
+
+def thread_config(repo_name: str, run_id: str) -> RunnableConfig:
+    """Graph config for healing one workflow run; its checkpoints are keyed by repo and run."""
+    return {"configurable": {"thread_id": f"{repo_name}:{run_id}"}}
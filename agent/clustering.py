@@ -0,0 +1,158 @@
+# agent/clustering.py
+
+import hashlib
+import re
+from collections import Counter
+from typing import Iterable, List
+
+import numpy as np
+
+from agent.fix_cache import normalize_error
+from tools.error_extractor import SIGNATURE_INDEX
+
+SIMHASH_BITS = 64
+_BITS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+# Identifiers, words and version-like tokens ("numpy", "ModuleNotFoundError", "1.26.4")
+_TOKEN = re.compile(r"[A-Za-z0-9_][A-Za-z0-9_.-]*")
+
+# Error signatures (see tools.error_extractor) whose lines state the cause.
+# Traceback frames, pytest headers and exit codes are left out: they are
+# the same for every failure, or name files of one repository.
+CAUSE_SIGNATURES = ("pip_resolver", "python_exception", "yaml_error", "npm_error", "compiler_error")
+
+# Paths differ between repositories that fail the same way
+_PATH = re.compile(r"[^\s'\"()]*/[^\s'\"()]*")
+
+
+def cause_lines(text: str) -> str:
+    """
+    The lines of an error excerpt that state what went wrong, or the whole
+    excerpt if no known signature matches.
+    """
+    lines = []
+    for line in text.splitlines():
+        match = SIGNATURE_INDEX.search(line)
+        if match and match.lastgroup in CAUSE_SIGNATURES:
+            lines.append(line)
+    return "\n".join(lines) if lines else text
+
+
+def _features(text: str) -> Counter:
+    """Lowercased tokens and token pairs of the normalized cause lines, with their counts."""
+    text = _PATH.sub("<path>", normalize_error(cause_lines(text)))
+    tokens = [token.lower() for token in _TOKEN.findall(text)]
+    return Counter(tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])])
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash of an error excerpt.
+
+    Every feature is hashed to 64 bits (BLAKE2b); each bit of the result is
+    set if the features with that bit set outweigh those without, weighted
+    by how often each feature occurs. Near-identical texts get fingerprints
+    a few bits apart.
+    """
+    features = _features(text)
+    if not features:
+        return 0
+    digests = b"".join(hashlib.blake2b(feature.encode(), digest_size=8).digest() for feature in features)
+    hashes = np.frombuffer(digests, dtype="<u8")
+    weights = np.fromiter(features.values(), dtype=np.int64, count=len(features))
+
+    # (features x 64) matrix of +1/-1 per bit, summed with the weights
+    bits = ((hashes[:, None] >> _BITS) & np.uint64(1)).astype(np.int64)
+    votes = (2 * bits - 1).T @ weights
+    return int(np.bitwise_or.reduce(np.uint64(1) << _BITS[votes > 0], initial=np.uint64(0)))
+
+
+def simhashes(texts: Iterable[str]) -> np.ndarray:
+    """SimHash of every text, as a uint64 array."""
+    return np.array([simhash(text) for text in texts], dtype=np.uint64)
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Bits that differ between fingerprints (broadcasting like any NumPy operation)."""
+    return np.bitwise_count(np.bitwise_xor(a, b))
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 with path halving and union by size."""
+
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, item: int) -> int:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def roots(self) -> np.ndarray:
+        return np.array([self.find(item) for item in range(len(self.parent))], dtype=np.int64)
+
+
+def cluster(fingerprints: np.ndarray, max_distance: int) -> np.ndarray:
+    """
+    Group fingerprints that are at most `max_distance` bits apart
+    (transitively).
+
+    Identical fingerprints are collapsed first. The 64 bits are then split
+    into `max_distance + 1` bands (LSH banding): two fingerprints within
+    `max_distance` bits must agree on at least one whole band, so only
+    fingerprints that share a band value are compared, and no near pair is
+    missed. The work is linear in the number of distinct fingerprints plus
+    the pairs within shared buckets, not quadratic.
+
+    Returns:
+        A cluster label per fingerprint, numbered 0, 1, ... in order of
+        first appearance
+    """
+    if len(fingerprints) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if not 0 <= max_distance < SIMHASH_BITS:
+        raise ValueError(f"max_distance must be between 0 and {SIMHASH_BITS - 1}")
+
+    unique, inverse = np.unique(fingerprints, return_inverse=True)
+    sets = UnionFind(len(unique))
+
+    bounds = np.linspace(0, SIMHASH_BITS, max_distance + 2).astype(int)
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        mask = np.uint64((1 << int(high - low)) - 1)
+        keys = (unique >> np.uint64(low)) & mask
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        for start, end in zip(starts, np.r_[starts[1:], len(order)]):
+            if end - start < 2:
+                continue
+            members = order[start:end]
+            # Candidates share this band; keep the pairs that are really close
+            close = hamming(unique[members][:, None], unique[members][None, :]) <= max_distance
+            for first, second in zip(*np.nonzero(np.triu(close, 1))):
+                sets.union(int(members[first]), int(members[second]))
+
+    roots = sets.roots()[inverse]
+    _, first_seen, labels = np.unique(roots, return_index=True, return_inverse=True)
+    rank = np.argsort(np.argsort(first_seen))
+    return rank[labels]
+
+
+def groups(labels: np.ndarray) -> List[List[int]]:
+    """Indexes of the items in each cluster, clusters in label order."""
+    members: List[List[int]] = [[] for _ in range(int(labels.max()) + 1 if len(labels) else 0)]
+    for index, label in enumerate(labels):
+        members[int(label)].append(index)
+    return members
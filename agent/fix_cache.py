@@ -0,0 +1,273 @@
+# agent/fix_cache.py
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from agent import metrics
+
+# Cache configuration
+CACHE_DIR = os.path.expanduser(os.getenv("PIPELINE_HEALER_CACHE_DIR", "~/.cache/pipeline-healer"))
+FIX_CACHE_PATH = os.getenv("FIX_CACHE_PATH", os.path.join(CACHE_DIR, "fix_cache.sqlite3"))
+FIX_CACHE_TTL = float(os.getenv("FIX_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+FIX_CACHE_MAX_ENTRIES = int(os.getenv("FIX_CACHE_MAX_ENTRIES", "5000"))
+FIX_CACHE_MEMORY_ENTRIES = int(os.getenv("FIX_CACHE_MEMORY_ENTRIES", "256"))
+
+# Merge status of a fix's pull request. A cached fix is only reused once its
+# PR is merged, or when a scan offers it to another repository's heal
+OPEN, MERGED, CLOSED, OFFERED = "open", "merged", "closed", "offered"
+SERVED = (MERGED, OFFERED)
+
+# Volatile parts of an error excerpt, replaced before hashing
+_NORMALIZERS = [
+    # Runner workspace prefix: /home/runner/work/<repo>/<repo>/src/x.py -> src/x.py
+    (re.compile(r"(?:/home/runner/work|/__w|[A-Za-z]:\\a)/[^/\s\"']+/[^/\s\"']+/"), ""),
+    # Installed packages and interpreters live in machine-specific dirs
+    (re.compile(r"(?:/[\w.@+-]+)+/(?:site|dist)-packages/"), "<site-packages>/"),
+    (re.compile(r"/(?:tmp|var/folders)/[\w./-]+"), "<tmp>"),
+    (re.compile(r"\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(?:[.,]\d+)?Z?"), "<time>"),
+    (re.compile(r"\b\d\d:\d\d:\d\d(?:\.\d+)?\b"), "<time>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<addr>"),
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b"), "<uuid>"),
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{7,40}\b"), "<sha>"),
+    (re.compile(r"\blines? \d+(?:-\d+)?"), "line <n>"),
+    (re.compile(r"(\.\w+):\d+(?::\d+)?"), r"\1:<n>"),
+    (re.compile(r"\bin \d+(?:\.\d+)?s\b"), "in <t>s"),
+    (re.compile(r"[ \t]+"), " "),
+]
+
+
+def normalize_error(excerpt: str) -> str:
+    """Strip paths, timestamps, SHAs and line numbers from an error excerpt."""
+    text = excerpt
+    for pattern, replacement in _NORMALIZERS:
+        text = pattern.sub(replacement, text)
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def error_fingerprint(excerpt: str) -> str:
+    """Stable fingerprint of an error excerpt, insensitive to run-specific noise."""
+    return hashlib.sha256(normalize_error(excerpt).encode("utf-8")).hexdigest()[:32]
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU map."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: str, value) -> int:
+        """Store `value`; returns how many entries were evicted."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def pop(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class FixCache:
+    """
+    Two-tier cache from error fingerprint to a previous analysis and fix.
+
+    Lookups hit an in-process LRU first and fall back to a SQLite store that
+    survives restarts. The store expires entries after `ttl` seconds and
+    evicts the least recently used ones above `max_entries`.
+
+    Entries carry the `status` and `pr_number` of the PR that proposed the
+    fix; `set_status` records its merge and drops fixes whose PR was closed.
+
+    Counters (see agent.metrics) are prefixed with `fix_cache.`.
+    """
+
+    def __init__(
+        self,
+        path: str = FIX_CACHE_PATH,
+        ttl: float = FIX_CACHE_TTL,
+        max_entries: int = FIX_CACHE_MAX_ENTRIES,
+        memory_entries: int = FIX_CACHE_MEMORY_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = LRUCache(memory_entries)
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS fixes ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS fixes_accessed ON fixes (accessed)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached entry for `key`, or None."""
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            if now - entry["_created"] <= self.ttl:
+                metrics.incr("fix_cache.hits.memory")
+                return entry
+            self._memory.pop(key)
+
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created FROM fixes WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                metrics.incr("fix_cache.misses")
+                return None
+
+            value, created = row
+            if now - created > self.ttl:
+                self._db.execute("DELETE FROM fixes WHERE key = ?", (key,))
+                self._db.commit()
+                metrics.incr("fix_cache.evictions.ttl")
+                metrics.incr("fix_cache.misses")
+                return None
+
+            self._db.execute("UPDATE fixes SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+
+        entry = {**json.loads(value), "_created": created}
+        metrics.incr("fix_cache.evictions.memory", self._memory.put(key, entry))
+        metrics.incr("fix_cache.hits.disk")
+        return entry
+
+    def put(self, key: str, entry: dict):
+        """Store `entry` (a JSON-serializable dict) under `key`."""
+        now = time.time()
+        entry = {k: v for k, v in entry.items() if not k.startswith("_")}
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO fixes (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(entry), now, now),
+            )
+            evicted = self._evict()
+            self._db.commit()
+
+        metrics.incr("fix_cache.evictions.size", evicted)
+        metrics.incr("fix_cache.evictions.memory", self._memory.put(key, {**entry, "_created": now}))
+
+    def invalidate(self, key: str):
+        """Forget `key`, e.g. when its fix turned out to be stale."""
+        self._memory.pop(key)
+        with self._lock:
+            self._db.execute("DELETE FROM fixes WHERE key = ?", (key,))
+            self._db.commit()
+
+    def set_status(self, repo_name: str, number: int, status: str) -> int:
+        """
+        Record whether the PR that proposed a fix was merged or closed.
+
+        Merged fixes are served from then on; fixes of PRs closed without
+        merging were rejected by a reviewer and are dropped.
+
+        Returns:
+            How many entries changed
+        """
+        prefix = cache_key(repo_name, "")
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value FROM fixes WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+            changed = []
+            for key, value in rows:
+                entry = json.loads(value)
+                if entry.get("pr_number") != number or entry.get("status") == status:
+                    continue
+                if status == CLOSED:
+                    self._db.execute("DELETE FROM fixes WHERE key = ?", (key,))
+                else:
+                    entry["status"] = status
+                    self._db.execute("UPDATE fixes SET value = ? WHERE key = ?", (json.dumps(entry), key))
+                changed.append(key)
+            self._db.commit()
+
+        for key in changed:
+            self._memory.pop(key)
+        metrics.incr(f"fix_cache.status.{status}", len(changed))
+        return len(changed)
+
+    def open_prs(self) -> List[tuple]:
+        """(repo_name, PR number) of every cached fix whose PR is still open."""
+        with self._lock:
+            rows = self._db.execute("SELECT key, value FROM fixes").fetchall()
+        prs = set()
+        for key, value in rows:
+            entry = json.loads(value)
+            if entry.get("status") == OPEN and entry.get("pr_number") is not None:
+                prs.add((key.rsplit(":", 1)[0], entry["pr_number"]))
+        return sorted(prs)
+
+    def _evict(self) -> int:
+        """Drop expired entries, then the least recently used above max_entries."""
+        expired = self._db.execute(
+            "DELETE FROM fixes WHERE created < ?", (time.time() - self.ttl,)
+        ).rowcount
+        metrics.incr("fix_cache.evictions.ttl", expired)
+
+        (count,) = self._db.execute("SELECT COUNT(*) FROM fixes").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+
+        return self._db.execute(
+            "DELETE FROM fixes WHERE key IN"
+            " (SELECT key FROM fixes ORDER BY accessed ASC LIMIT ?)",
+            (excess,),
+        ).rowcount
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters."""
+        return metrics.get_counters("fix_cache.")
+
+
+def cache_key(repo_name: str, fingerprint: str) -> str:
+    """
+    Cache key for a fix.
+
+    Fix patches carry file paths and context lines from one repository, so
+    they are only reused within that repository.
+    """
+    return f"{repo_name}:{fingerprint}"
+
+
+_fix_cache: Optional[FixCache] = None
+_fix_cache_lock = threading.Lock()
+
+
+def get_fix_cache() -> FixCache:
+    """Shared process-wide FixCache, opened on first use."""
+    global _fix_cache
+    with _fix_cache_lock:
+        if _fix_cache is None:
+            _fix_cache = FixCache()
+        return _fix_cache
@@ -0,0 +1,323 @@
+# agent/fix_index.py
+
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from agent import metrics
+from agent.fix_cache import CACHE_DIR, CLOSED, MERGED, OPEN, normalize_error
+
+# Index configuration
+FIX_INDEX_DIR = os.getenv("FIX_INDEX_DIR", os.path.join(CACHE_DIR, "fix_index"))
+FIX_INDEX_DIM = int(os.getenv("FIX_INDEX_DIM", "512"))  # Only used when a new index is created
+FIX_INDEX_EXAMPLES = int(os.getenv("FIX_INDEX_EXAMPLES", "2"))  # Past fixes shown to generate_fix
+FIX_INDEX_MIN_SCORE = float(os.getenv("FIX_INDEX_MIN_SCORE", "0.35"))  # Cosine similarity
+
+# Compact once this share of the rows belongs to closed (unmerged) PRs
+FIX_INDEX_COMPACT_RATIO = float(os.getenv("FIX_INDEX_COMPACT_RATIO", "0.25"))
+
+# Identifiers and words; with the paths, numbers and times already
+# normalized away they carry what an error is about
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]+")
+
+# Pull request number in its URL: https://github.com/owner/repo/pull/12
+_PR_NUMBER = re.compile(r"/pull/(\d+)")
+
+
+def pr_number(pr_url: str) -> Optional[int]:
+    """The pull request number in a PR URL (or create_pull_request's reply), if any."""
+    match = _PR_NUMBER.search(pr_url or "")
+    return int(match.group(1)) if match else None
+
+
+def embed(text: str, dim: int = FIX_INDEX_DIM) -> np.ndarray:
+    """
+    Embed an error description with a hashing vectorizer (no model, no
+    network).
+
+    Lowercased words and word bigrams of the normalized text are hashed
+    (CRC-32) into `dim` buckets with a hash-derived sign, counts are damped
+    with log1p and the vector is L2-normalized, so a dot product is the
+    cosine similarity.
+    """
+    words = [word.lower() for word in _WORD.findall(normalize_error(text))]
+    features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    if not features:
+        return np.zeros(dim, dtype=np.float32)
+
+    hashes = np.fromiter((zlib.crc32(feature.encode()) for feature in features), dtype=np.uint32, count=len(features))
+    signs = np.where(hashes >> 31, -1.0, 1.0)
+    counts = np.bincount(hashes % dim, weights=signs, minlength=dim)
+    vector = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class PastFix(NamedTuple):
+    """A merged fix found by `FixIndex.search`."""
+
+    score: float  # Cosine similarity to the query
+    repo_name: str
+    failed_file: str
+    error_analysis: str
+    patch: str
+    explanation: str
+
+
+class FixIndex:
+    """
+    Error -> fix pairs from completed heals, searchable by similarity.
+
+    Metadata (repository, PR, merge status, analysis and diff) lives in
+    SQLite; the embeddings are the rows of a float32 matrix in
+    `vectors-<generation>.f32`, which searches memory-map. Appending writes
+    one row at the end of the file. `compact()` copies the rows still worth
+    keeping into the next generation's file and renumbers the metadata in
+    one transaction, so a crash leaves either the old or the new index.
+
+    Counters (see agent.metrics) are prefixed with `fix_index.`.
+    """
+
+    def __init__(self, directory: str = FIX_INDEX_DIR, dim: int = FIX_INDEX_DIM):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._loaded = None
+        self._view = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                row INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, repo TEXT NOT NULL,
+                pr_number INTEGER, status TEXT NOT NULL, created REAL NOT NULL, value TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS entries_pr ON entries (repo, pr_number);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        # An existing index keeps the dimension it was built with
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?), ('generation', '0')", (str(dim),))
+        self._db.commit()
+        self.dim = int(self._meta("dim"))
+
+    def _meta(self, name: str) -> str:
+        return self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+    def _vectors_path(self, generation: Optional[str] = None) -> str:
+        return os.path.join(self.directory, f"vectors-{generation or self._meta('generation')}.f32")
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def add(
+        self,
+        key: str,
+        repo_name: str,
+        pr_url: str,
+        error_text: str,
+        entry: dict,
+        status: str = OPEN,
+    ) -> bool:
+        """
+        Append a completed heal.
+
+        Args:
+            key: Unique ID of the heal (e.g. "owner/repo:run_id"); adding a
+                key again is a no-op
+            repo_name: Repository in format 'owner/repo'
+            pr_url: URL of the heal's pull request
+            error_text: What the entry is found by (error analysis and excerpt)
+            entry: failed_file, error_analysis, patch and explanation
+            status: Merge status of the PR
+
+        Returns:
+            True if the entry was added
+        """
+        vector = embed(error_text, self.dim)
+        value = json.dumps({name: entry.get(name, "") for name in PastFix._fields[2:]})
+
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                return False
+            row = self._count()
+            path = self._vectors_path()
+            with open(path, "ab") as f:
+                # Drop a row a crashed append wrote without its metadata
+                f.truncate(row * self.dim * 4)
+                f.write(vector.tobytes())
+            self._db.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row, key, repo_name, pr_number(pr_url), status, time.time(), value),
+            )
+            self._db.commit()
+            self._writes += 1
+
+        metrics.incr("fix_index.appends")
+        return True
+
+    def set_status(self, repo_name: str, number: int, status: str) -> int:
+        """
+        Record whether a heal's PR was merged or closed.
+
+        Compacts the index once closed PRs make up FIX_INDEX_COMPACT_RATIO
+        of it.
+
+        Returns:
+            How many entries changed
+        """
+        with self._lock:
+            changed = self._db.execute(
+                "UPDATE entries SET status = ? WHERE repo = ? AND pr_number = ? AND status != ?",
+                (status, repo_name, number, status),
+            ).rowcount
+            self._db.commit()
+            self._writes += 1
+            (closed,) = self._db.execute("SELECT COUNT(*) FROM entries WHERE status = ?", (CLOSED,)).fetchone()
+            total = self._count()
+
+        metrics.incr(f"fix_index.status.{status}", changed)
+        if closed and closed >= total * FIX_INDEX_COMPACT_RATIO:
+            self.compact()
+        return changed
+
+    def open_prs(self) -> List[tuple]:
+        """(repo_name, PR number) of every entry whose PR is still open."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT DISTINCT repo, pr_number FROM entries WHERE status = ? AND pr_number IS NOT NULL", (OPEN,)
+            ).fetchall()
+
+    def compact(self) -> int:
+        """
+        Drop the entries of closed (unmerged) PRs and rewrite the vectors
+        without them.
+
+        Returns:
+            How many entries were dropped
+        """
+        with self._lock:
+            generation = self._meta("generation")
+            count = self._count()
+            kept = self._db.execute("SELECT row FROM entries WHERE status != ? ORDER BY row", (CLOSED,))
+            keep = [row for (row,) in kept]
+            if len(keep) == count:
+                return 0
+
+            following = str(int(generation) + 1)
+            new_path = self._vectors_path(following)
+            if keep:
+                path = self._vectors_path(generation)
+                vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(count, self.dim))
+                vectors[keep].tofile(new_path)
+                del vectors
+            else:
+                open(new_path, "wb").close()
+
+            with self._db:
+                self._db.execute("DELETE FROM entries WHERE status = ?", (CLOSED,))
+                # In row order every entry moves down into a free row
+                for new_row, old_row in enumerate(keep):
+                    if new_row != old_row:
+                        self._db.execute("UPDATE entries SET row = ? WHERE row = ?", (new_row, old_row))
+                self._db.execute("UPDATE meta SET value = ? WHERE name = 'generation'", (following,))
+            self._writes += 1
+
+            # Earlier generations and any left by a crashed compaction
+            for path in glob.glob(os.path.join(self.directory, "vectors-*.f32")):
+                if path != new_path:
+                    os.remove(path)
+
+        metrics.incr("fix_index.compactions")
+        return count - len(keep)
+
+    def _snapshot(self):
+        """
+        (vectors, merged) for searching: the memory-mapped matrix and a mask
+        of its rows whose PR was merged. Reloaded when this or another
+        process changed the index.
+        """
+        (data_version,) = self._db.execute("PRAGMA data_version").fetchone()
+        version = (data_version, self._writes)
+        if self._loaded != version:
+            count = self._count()
+            merged = np.zeros(count, dtype=bool)
+            rows = [row for (row,) in self._db.execute("SELECT row FROM entries WHERE status = ?", (MERGED,))]
+            merged[rows] = True
+            vectors = None
+            if count and rows:
+                vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r", shape=(count, self.dim))
+            self._view = (vectors, merged)
+            self._loaded = version
+        return self._view
+
+    def search(
+        self, error_text: str, k: int = FIX_INDEX_EXAMPLES, min_score: float = FIX_INDEX_MIN_SCORE
+    ) -> List[PastFix]:
+        """
+        The `k` merged fixes whose errors are most similar to `error_text`.
+
+        Returns:
+            PastFix records, most similar first, all scoring at least
+            `min_score`
+        """
+        query = embed(error_text, self.dim)
+        with self._lock:
+            vectors, merged = self._snapshot()
+        if vectors is None or k <= 0:
+            metrics.incr("fix_index.misses")
+            return []
+
+        # One pass over the mapped matrix; rows of unmerged PRs never win
+        scores = np.where(merged, vectors @ query, -1.0)
+        best = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        best = [int(row) for row in best[np.argsort(-scores[best])] if scores[row] >= min_score]
+        if not best:
+            metrics.incr("fix_index.misses")
+            return []
+
+        with self._lock:
+            found = {
+                row: (repo_name, json.loads(value))
+                for row, repo_name, value in self._db.execute(
+                    f"SELECT row, repo, value FROM entries WHERE row IN ({', '.join('?' * len(best))})", best
+                )
+            }
+        metrics.incr("fix_index.hits")
+        # A compaction in between may have moved rows; skip those
+        return [
+            PastFix(round(float(scores[row]), 3), found[row][0], **found[row][1]) for row in best if row in found
+        ]
+
+    def stats(self) -> dict:
+        """Entries per merge status, the vectors' size on disk and the embedding dimension."""
+        with self._lock:
+            statuses = dict(self._db.execute("SELECT status, COUNT(*) FROM entries GROUP BY status").fetchall())
+            path = self._vectors_path()
+        return {
+            "entries": sum(statuses.values()),
+            **{status: statuses.get(status, 0) for status in (OPEN, MERGED, CLOSED)},
+            "vector_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+            "dim": self.dim,
+        }
+
+
+_fix_index: Optional[FixIndex] = None
+_fix_index_lock = threading.Lock()
+
+
+def get_fix_index() -> FixIndex:
+    """Shared FixIndex in FIX_INDEX_DIR (opened on first use)."""
+    global _fix_index
+    with _fix_index_lock:
+        if _fix_index is None:
+            _fix_index = FixIndex()
+        return _fix_index
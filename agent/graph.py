@@ -1,147 +1,774 @@
 # agent/graph.py
 
 import os
-
-from dotenv import load_dotenv
-from langchain_core.messages import SystemMessage
-from langchain_groq import ChatGroq
-from langgraph.graph import END, StateGraph
+import re
+import threading
+from collections import Counter
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from tools.code_fixer import PatchError, apply_patch, patched_paths
+from tools.context_builder import build_file_context
+from tools.error_extractor import extract_error_excerpt, referenced_files
+from tools.fix_validator import validate_fix
 from tools.github_tools import (
-    create_branch_and_update_file,
+    create_branch_with_files,
     create_pull_request,
-    get_file_content,
+    default_branch,
+    get_workflow_run_info,
     get_workflow_run_logs,
+    list_repo_files,
+    list_run_jobs,
+    read_file,
+)
+from tools.sandbox import SandboxError, get_git_cache, run_step, write_files
+from tools.workflow_steps import NotReproducible, find_step
+
+from agent import metrics
+from agent.blob_store import get_blob, put_blob
+from agent.fix_cache import MERGED, OPEN, SERVED, cache_key, error_fingerprint, get_fix_cache, normalize_error
+from agent.fix_index import PastFix, get_fix_index, pr_number
+from agent.json_stream import LLMOutputError, OffSchemaError, stream_json
+from agent.llm_router import LLMOverloadedError, get_router
+from agent.run_cache import get_run_cache
+from agent.state import PipelineHealingState, new_state
+from agent.token_budget import (
+    Section,
+    affordable_calls,
+    count_tokens,
+    fit_sections,
+    min_call_tokens,
+    prompt_budget,
+    record_usage,
 )
+from agent.tracing import annotate, trace_node
+
+# Rounds of fix generation per heal, counting the first one; if no fix of
+# the last round passes its checks the heal ends without a PR
+FIX_MAX_ATTEMPTS = int(os.getenv("FIX_MAX_ATTEMPTS", "3"))
+
+# Candidate fixes generated in parallel each round, at most; the best one
+# is kept. Rounds get fewer when the token budget cannot pay for them all.
+# Best-of-N is opt-in: one candidate costs about half the tokens of three
+FIX_CANDIDATES = max(int(os.getenv("FIX_CANDIDATES", "1")), 1)
+
+# LLM calls for extra candidates (all but the first of each heal) in flight
+# at once across the process
+FIX_CANDIDATE_CONCURRENCY = max(int(os.getenv("FIX_CANDIDATE_CONCURRENCY", "4")), 1)
+_candidate_slots = threading.BoundedSemaphore(FIX_CANDIDATE_CONCURRENCY)
+
+# Sampling temperature (None: the model's default) and extra instruction
+# for each candidate, cycled; the first is the fix a single-candidate heal
+# would get, the others explore
+CANDIDATE_STRATEGIES = [
+    (None, ""),
+    (0.7, "Prefer fixing the root cause over working around the symptom.\n"),
+    (1.0, "The analysis may be wrong: base the fix on what the error logs show.\n"),
+]
+
+# Re-run the failing step locally with the fix before opening a PR ("1": on).
+# Off by default: the step runs the repository's code with an LLM-written
+# patch applied on this host, without filesystem or network isolation
+REPRO_ENABLED = os.getenv("REPRO_ENABLED", "0") == "1"
+
+# Lines of the reproduced step's output shown to the LLM when a fix fails
+REPRO_FEEDBACK_LINES = 40
+
+# Error lines that tie a local failure to the one in the CI logs
+ERROR_LINE = re.compile(r"Error\b|ERROR|FAILED|FAILURE|Fatal|FATAL|npm ERR!|\berror(?:\[\w+\])?:")
+
+# Dependency manifests worth having at hand for most fixes
+MANIFEST_FILES = [
+    "requirements.txt",
+    "requirements-dev.txt",
+    "pyproject.toml",
+    "setup.py",
+    "setup.cfg",
+    "package.json",
+]
+
+# Expected shape of each LLM node's JSON answer
+ANALYSIS_SCHEMA = {"failed_file": str, "error_type": str, "analysis": str}
+FIX_SCHEMA = {"patch": str, "explanation": str}
+
+ANALYSIS_PROMPT = """
+You are an expert DevOps engineer. Analyze this GitHub Actions error:
 
-from agent.state import PipelineHealingState
+{error_excerpt}
 
-load_dotenv()
+Provide:
+1. What type of error is this? (dependency, syntax, configuration, etc.)
+2. Which file likely has the problem?
+3. What specifically went wrong?
 
-# Initialize LLM
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile", temperature=0, api_key=os.getenv("GROQ_API_KEY")
-)
+Be concise and specific. Format as JSON:
+{{
+    "failed_file": "...",
+    "error_type": "...",
+    "analysis": "..."
+}}
+"""
+
+FIX_PROMPT = """
+You are an expert DevOps engineer. Here's a failed file and error analysis:
 
+FILE CONTENT (each line starts with its line number and '| ', which is not
+part of the file; '...' marks lines that were left out):
+File: {failed_file}
+{file_context}
 
+ERROR ANALYSIS:
+{error_analysis}
+
+ERROR LOGS:
+{error_excerpt}
+{past_fixes}{repair_feedback}
+{approach}Fix the error with the smallest possible change. Provide:
+1. A unified diff (like `git diff`) with ---/+++ headers and 3 lines of
+   unchanged context around each change. If other files must change too
+   (e.g. adding a package to requirements.txt), include them in the same
+   diff with their own ---/+++ headers. Use the line numbers for the @@
+   headers, but never copy the 'N| ' prefixes into the diff.
+2. Explanation of what you changed and why
+
+Format as JSON:
+{{
+    "patch": "--- a/path\\n+++ b/path\\n@@ -1,3 +1,3 @@\\n...",
+    "explanation": "..."
+}}
+"""
+
+REPAIR_FEEDBACK = """
+YOUR PREVIOUS FIX WAS REJECTED. It failed these checks:
+{errors}
+
+Rejected diff (do not repeat its mistakes; write the whole diff again
+against the original file):
+{patch}
+"""
+
+
+PAST_FIXES_HEADER = """
+SIMILAR ERRORS FIXED BEFORE (merged fixes from earlier heals; the code may
+have changed since, so use them as hints, not as the answer):
+"""
+
+PAST_FIX = """
+Example {number} ({repo_name}, {failed_file}):
+Error: {error_analysis}
+Fix:
+{patch}
+"""
+
+
+def _past_fixes_text(past_fixes: List[PastFix], max_tokens: Optional[int] = None) -> str:
+    """The past fixes section of the prompt, with as many whole examples as fit in `max_tokens`."""
+    text = ""
+    for number, fix in enumerate(past_fixes, start=1):
+        candidate = (text or PAST_FIXES_HEADER) + PAST_FIX.format(number=number, **fix._asdict())
+        if max_tokens is not None and count_tokens(candidate) > max_tokens:
+            break
+        text = candidate
+    return text
+
+
+def _error_text(state: PipelineHealingState) -> str:
+    """What the fix index stores and finds an error by."""
+    return f"{state['error_analysis']}\n{state['error_excerpt']}"
+
+
+def _load_file(repo_name: str, file_path: str):
+    return read_file(repo_name, file_path)
+
+
+def _apply_fix_patch(state: PipelineHealingState, patch: str, failed_file: str):
+    """
+    Apply a unified diff to the repository's current files.
+
+    Returns:
+        {path: new content} for every file the diff changes
+
+    Raises:
+        PatchError: if the diff does not apply
+    """
+    repo_name = state["repo_name"]
+    run_cache = get_run_cache(repo_name, state["run_id"])
+
+    paths = set(patched_paths(patch, failed_file)) | {failed_file}
+    originals = {path: run_cache.get(path, partial(_load_file, repo_name, path)) for path in paths}
+
+    return apply_patch(patch, originals, failed_file)
+
+
+def _store_fix(files: Dict[str, str]) -> Dict[str, str]:
+    """Move fixed file contents out of the state: {path: blob digest}."""
+    return {path: put_blob(content) for path, content in files.items()}
+
+
+@trace_node
 def fetch_logs_node(state: PipelineHealingState) -> PipelineHealingState:
-    """Step 1: Fetch the error logs from GitHub."""
+    """Step 1: Fetch the error logs and the commit the run was built from."""
+    if state["error_logs_ref"]:
+        return {}  # Already fetched by prepare_state
+
     print("📥 Fetching logs from GitHub...")
 
+    head_sha = get_workflow_run_info(state["repo_name"], state["run_id"])["head_sha"]
     logs = get_workflow_run_logs.invoke(
         {"repo_name": state["repo_name"], "run_id": state["run_id"]}
     )
+    annotate(bytes=len(logs.encode("utf-8")))
 
-    return {**state, "error_logs": logs, "current_step": "logs_fetched"}
+    return {"head_sha": head_sha, "error_logs_ref": put_blob(logs), "current_step": "logs_fetched"}
+
+
+@trace_node
+def extract_errors_node(state: PipelineHealingState) -> PipelineHealingState:
+    """Step 1b: Cut the logs down to the ranked error excerpts (no LLM)."""
+    if state["error_fingerprint"]:
+        return {}  # Already extracted by prepare_state
+
+    print("✂️ Extracting error excerpts...")
+
+    excerpt = extract_error_excerpt(get_blob(state["error_logs_ref"]))
+
+    return {
+        "error_excerpt": excerpt,
+        "error_fingerprint": error_fingerprint(excerpt),
+        "current_step": "errors_extracted",
+    }
+
+
+@trace_node
+def lookup_fix_node(state: PipelineHealingState) -> PipelineHealingState:
+    """Step 1c: Reuse a previous fix if we have seen this exact error before."""
+    key = cache_key(state["repo_name"], state["error_fingerprint"])
+    cached = get_fix_cache().get(key)
+
+    if cached is None:
+        return {"fix_cache_hit": False}
+
+    # A fix whose PR is still open may yet be rejected by its reviewer
+    if cached.get("status") not in SERVED:
+        print("⏳ Cached fix is waiting for its PR to be merged, re-analyzing...")
+        metrics.incr("fix_cache.unverified")
+        return {"fix_cache_hit": False}
+
+    # The cached fix is a patch; it still applies if the lines it touches
+    # have not changed too much since
+    try:
+        files = _apply_fix_patch(state, cached["proposed_patch"], cached["failed_file"])
+    except PatchError:
+        print("♻️ Cached fix is stale, re-analyzing...")
+        get_fix_cache().invalidate(key)
+        return {"fix_cache_hit": False}
+
+    print("⚡ Known error, reusing cached fix...")
+
+    # The only candidate of round 0, ranked and checked like a generated one
+    candidate = {
+        "round": 0,
+        "index": 0,
+        "patch": cached["proposed_patch"],
+        "refs": _store_fix(files),
+        "explanation": cached["fix_explanation"],
+    }
+    return {
+        "failed_file": cached["failed_file"],
+        "error_analysis": cached["error_analysis"],
+        "fix_candidates": [candidate],
+        "fix_cache_hit": True,
+        "current_step": "fix_generated",
+    }
 
 
+def route_after_lookup(state: PipelineHealingState):
+    """Skip both LLM calls on a fix cache hit, otherwise analyze and prefetch in parallel."""
+    return "rank_fixes" if state["fix_cache_hit"] else ["analyze_error", "prefetch_context"]
+
+
+@trace_node
 def analyze_error_node(state: PipelineHealingState) -> PipelineHealingState:
     """Step 2: Analyze what went wrong."""
     print("🔍 Analyzing error...")
 
-    prompt = f"""
-You are an expert DevOps engineer. Analyze this GitHub Actions error:
+    template = ANALYSIS_PROMPT.format(error_excerpt="")
+    fitted = fit_sections(
+        template,
+        [Section("error_excerpt", state["error_excerpt"], priority=0)],
+        prompt_budget(state, "analyze_error"),
+    )
+    prompt = ANALYSIS_PROMPT.format(**fitted)
 
-{state["error_logs"]}
+    repo_name = state["repo_name"]
+    run_cache = get_run_cache(repo_name, state["run_id"])
 
-Provide:
-1. What type of error is this? (dependency, syntax, configuration, etc.)
-2. Which file likely has the problem?
-3. What specifically went wrong?
+    def on_field(key, value):
+        # Start fetching the culprit file while the model is still writing
+        if key == "failed_file" and value and value != "unknown":
+            run_cache.prefetch(value, partial(_load_file, repo_name, value))
 
-Be concise and specific. Format as JSON:
-{{
-    "error_type": "...",
-    "failed_file": "...",
-    "analysis": "..."
-}}
-"""
+    analysis, timings = stream_json(
+        get_router().for_task("analyze_error"), prompt, ANALYSIS_SCHEMA, ["failed_file", "analysis"], on_field
+    )
+    print(f"⏱️ First field after {timings['first_field_s']}s")
+
+    # Partial update: prefetch_context runs in the same step
+    return {
+        "failed_file": analysis["failed_file"],
+        "error_analysis": analysis["analysis"],
+        "llm_timings": {"analyze_error": timings},
+        "token_usage": record_usage("analyze_error", timings),
+        "current_step": "error_analyzed",
+    }
 
-    response = llm.invoke(prompt)
 
-    # Parse the response (in production, use proper JSON parsing)
-    import json
+@trace_node
+def prefetch_context_node(state: PipelineHealingState) -> PipelineHealingState:
+    """
+    Step 2b: Runs alongside analyze_error. Starts fetching the files the fix
+    will most likely need (traceback files, the workflow YAML and dependency
+    manifests) into the per-run cache, so generate_fix starts warm.
+    """
+    print("📦 Prefetching likely files...")
 
-    try:
-        analysis = json.loads(response.content)
-    except:
-        analysis = {
-            "error_type": "unknown",
-            "failed_file": "unknown",
-            "analysis": response.content,
-        }
+    repo_name = state["repo_name"]
+    candidates = [path for path, _ in referenced_files(state["error_excerpt"], limit=5)]
+    existing = None
 
+    try:
+        candidates.append(get_workflow_run_info(repo_name, state["run_id"])["path"])
+        existing = list_repo_files(repo_name)
+    except Exception as e:
+        print(f"⚠️ Prefetch could not list repository files: {e}")
+
+    candidates.extend(MANIFEST_FILES)
+    if existing is not None:
+        candidates = [path for path in candidates if path in existing]
+    else:
+        candidates = candidates[:5]
+
+    # Fire and forget: generate_fix waits only for the file it needs
+    run_cache = get_run_cache(repo_name, state["run_id"])
+    for path in dict.fromkeys(candidates):
+        run_cache.prefetch(path, partial(_load_file, repo_name, path))
+
+    return {"prefetched_files": run_cache.keys()}
+
+
+def plan_fixes_node(state: PipelineHealingState) -> PipelineHealingState:
+    """
+    Step 3: Start a round of fix generation; route_fix_candidates fans it out.
+
+    Every later round keeps enough of the token budget for one minimal fix
+    prompt, and the round gets as many of FIX_CANDIDATES candidates as the
+    rest pays for. If not even one candidate fits, the heal ends at
+    `validation_failed` rather than prompting the model with nothing.
+    """
+    attempt = state["fix_attempts"] + 1
+    reserved = (FIX_MAX_ATTEMPTS - attempt) * min_call_tokens("generate_fix")
+    candidates = affordable_calls(state, "generate_fix", FIX_CANDIDATES, reserved)
+    if candidates == 0:
+        # Too little for this round and the later ones: this is the last
+        reserved = 0
+        candidates = affordable_calls(state, "generate_fix", 1)
+    if candidates == 0:
+        print("🛑 Token budget exhausted before a working fix, not opening a PR")
+        metrics.incr("fixes.budget_exhausted")
+        return {"fix_round_size": 0, "current_step": "validation_failed"}
+
+    print(f"🔧 Generating {candidates} candidate fix(es), round {attempt}...")
     return {
-        **state,
-        "failed_file": analysis.get("failed_file", "unknown"),
-        "error_analysis": analysis.get("analysis", ""),
-        "current_step": "error_analyzed",
+        "fix_attempts": attempt,
+        "fix_round_size": candidates,
+        "fix_prompt_budget": prompt_budget(state, "generate_fix", candidates, reserved),
+        "current_step": "generating_fixes",
     }
 
 
-def generate_fix_node(state: PipelineHealingState) -> PipelineHealingState:
-    """Step 3: Generate a fix for the error."""
-    print("🔧 Generating fix...")
+def route_fix_candidates(state: PipelineHealingState):
+    """One generate_fix branch per candidate, run in parallel; none if the budget ran out."""
+    from langgraph.types import Send
+
+    if not state["fix_round_size"]:
+        return "give_up"
+    return [Send("generate_fix", {**state, "candidate": index}) for index in range(state["fix_round_size"])]
 
-    # First, get the current file content
-    file_content = get_file_content.invoke(
-        {"repo_name": state["repo_name"], "file_path": state["failed_file"]}
+
+@trace_node
+def generate_fix_node(state: PipelineHealingState) -> PipelineHealingState:
+    """
+    Step 3a: Generate one candidate fix for the error (`state["candidate"]`
+    picks its temperature and instruction from CANDIDATE_STRATEGIES).
+
+    A candidate whose LLM call fails is recorded with its error, so the
+    other candidates of the round can still be used.
+    """
+    index = state["candidate"]
+    temperature, approach = CANDIDATE_STRATEGIES[index % len(CANDIDATE_STRATEGIES)]
+    annotate(candidate=index)
+
+    # First, get the current file content (usually already prefetched)
+    file_content = get_run_cache(state["repo_name"], state["run_id"]).get(
+        state["failed_file"], partial(_load_file, state["repo_name"], state["failed_file"])
     )
 
-    prompt = f"""
-You are an expert DevOps engineer. Here's a failed file and error analysis:
+    sections = [Section("error_analysis", state["error_analysis"], priority=0)]
+    if file_content is None:
+        sections.append(Section("file_context", "(this file does not exist yet)", priority=1))
+    else:
+        # Only the parts of the file around the lines the traceback points at
+        focus_lines = dict(referenced_files(state["error_excerpt"], limit=50)).get(state["failed_file"], [])[::-1]
+        shrink = partial(build_file_context, state["failed_file"], file_content, focus_lines)
+        sections.append(Section("file_context", shrink(), priority=1, min_tokens=800, shrink=shrink))
+    # The analysis already summarizes the logs, so they come last here
+    sections.append(Section("error_excerpt", state["error_excerpt"], priority=2, min_tokens=300))
+    try:
+        past_fixes = get_fix_index().search(_error_text(state))
+    except Exception as e:
+        past_fixes = []
+        print(f"⚠️ Fix index unavailable: {e}")
+    if past_fixes:
+        # Whatever budget is left over, in whole examples
+        shrink = partial(_past_fixes_text, past_fixes)
+        sections.append(Section("past_fixes", shrink(), priority=3, shrink=shrink))
+        if index == 0:
+            print(f"📚 {len(past_fixes)} similar past fix(es), best similarity {past_fixes[0].score}")
+    if state["validation_errors"]:
+        # A repair: show what the last round's best fix broke, errors first
+        feedback = REPAIR_FEEDBACK.format(
+            errors="\n".join(f"- {error}" for error in state["validation_errors"]), patch=state["proposed_patch"]
+        )
+        sections.append(Section("repair_feedback", feedback, priority=0, min_tokens=200))
+
+    template = FIX_PROMPT.format(
+        failed_file=state["failed_file"],
+        file_context="",
+        error_analysis="",
+        error_excerpt="",
+        past_fixes="",
+        repair_feedback="",
+        approach=approach,
+    )
+    # The round's candidates share what plan_fixes set aside for it
+    fitted = {"past_fixes": "", "repair_feedback": "", **fit_sections(template, sections, state["fix_prompt_budget"])}
+    prompt = FIX_PROMPT.format(failed_file=state["failed_file"], approach=approach, **fitted)
+    context_tokens = count_tokens(fitted["file_context"])
+    print(f"📐 Candidate {index + 1} prompt: {count_tokens(prompt)} tokens, file context {context_tokens}")
+
+    def check(fields):
+        # A diff that does not apply is as useless as malformed JSON
+        try:
+            _apply_fix_patch(state, fields["patch"], state["failed_file"])
+        except PatchError as e:
+            raise OffSchemaError(f"the patch does not apply: {e}") from None
+
+    options = {} if temperature is None else {"temperature": temperature}
+    candidate = {"round": state["fix_attempts"], "index": index}
+    # The first candidate never waits, so a heal always makes progress
+    slot = _candidate_slots if index > 0 else None
+    if slot is not None:
+        slot.acquire()
+    try:
+        fix, timings = stream_json(
+            get_router().for_task("generate_fix", **options), prompt, FIX_SCHEMA, ["patch", "explanation"], check=check
+        )
+    except (LLMOutputError, LLMOverloadedError) as e:
+        print(f"⚠️ Candidate {index + 1} failed: {e}")
+        candidate.update(error=str(e), overloaded=isinstance(e, LLMOverloadedError))
+        # Rejected or cut-off answers were still paid for
+        usage = getattr(e, "stats", None) or {"prompt_tokens": 0, "completion_tokens": 0}
+        return {"fix_candidates": [candidate], "token_usage": record_usage("generate_fix", usage)}
+    finally:
+        if slot is not None:
+            slot.release()
+    print(f"⏱️ Candidate {index + 1}: first field after {timings['first_field_s']}s")
+
+    files = _apply_fix_patch(state, fix["patch"], state["failed_file"])
+    candidate.update(patch=fix["patch"], refs=_store_fix(files), explanation=fix["explanation"])
 
-FILE CONTENT:
-{file_content}
+    return {
+        "fix_candidates": [candidate],
+        "llm_timings": {"generate_fix" if index == 0 else f"generate_fix[{index}]": timings},
+        "token_usage": record_usage("generate_fix", timings),
+    }
 
-ERROR ANALYSIS:
-{state["error_analysis"]}
 
-ERROR LOGS:
-{state["error_logs"]}
+def _fix_files(candidate: dict) -> Dict[str, str]:
+    return {path: get_blob(digest) for path, digest in candidate["refs"].items()}
 
-Generate a fixed version of the file. Provide:
-1. The complete corrected file content
-2. Explanation of what you changed and why
 
-Format as JSON:
-{{
-    "fixed_content": "...",
-    "explanation": "..."
-}}
-"""
+def _changed_lines(patch: str) -> int:
+    """Lines a unified diff adds or removes."""
+    return sum(1 for line in patch.splitlines() if line[:1] in "+-" and not line.startswith(("+++ ", "--- ")))
 
-    response = llm.invoke(prompt)
 
-    import json
+def _chosen_fix(candidate: dict) -> PipelineHealingState:
+    """State update that makes `candidate` the heal's fix."""
+    return {
+        "proposed_patch": candidate["patch"],
+        "fix_refs": candidate["refs"],
+        "fix_explanation": candidate["explanation"],
+    }
 
-    try:
-        fix = json.loads(response.content)
-    except:
-        fix = {"fixed_content": response.content, "explanation": "Auto-generated fix"}
 
+@trace_node
+def rank_fixes_node(state: PipelineHealingState) -> PipelineHealingState:
+    """
+    Step 3b: Check this round's candidate fixes locally before anything
+    reaches GitHub (Python must compile, workflow YAML must parse and look
+    like a workflow, requirement specifiers must parse) and rank the ones
+    that pass.
+
+    Candidates that produce the same files are one fix with several votes.
+    More votes rank first, then fewer changed lines, then fewer files.
+
+    Raises:
+        LLMOverloadedError, LLMOutputError: if no candidate was generated
+    """
+    print("🧪 Validating and ranking fixes...")
+
+    # (position in fix_candidates, candidate) for this round
+    entries = [
+        (position, candidate)
+        for position, candidate in enumerate(state["fix_candidates"])
+        if candidate["round"] == state["fix_attempts"]
+    ]
+    generated = [(position, candidate) for position, candidate in entries if "error" not in candidate]
+    if not generated:
+        error = LLMOverloadedError if all(candidate["overloaded"] for _, candidate in entries) else LLMOutputError
+        raise error(f"No candidate fix was generated: {entries[0][1]['error']}")
+
+    def fix_key(candidate):
+        return tuple(sorted(candidate["refs"].items()))
+
+    votes = Counter(fix_key(candidate) for _, candidate in generated)
+    distinct = {}
+    for position, candidate in generated:
+        distinct.setdefault(fix_key(candidate), (position, candidate))
+
+    def rank(entry):
+        candidate = entry[1]
+        size = (_changed_lines(candidate["patch"]), len(candidate["refs"]))
+        return (-votes[fix_key(candidate)], *size, candidate["index"])
+
+    valid, rejected = [], []
+    for position, candidate in sorted(distinct.values(), key=rank):
+        errors = validate_fix(_fix_files(candidate))
+        if errors:
+            rejected.append((candidate, errors))
+        else:
+            valid.append(position)
+    metrics.incr("fixes.candidates", len(generated))
+    annotate(candidates=len(generated), distinct=len(distinct), valid=len(valid))
+
+    for candidate, errors in rejected:
+        for error in errors:
+            print(f"❌ Candidate {candidate['index'] + 1}: {error}")
+
+    if not valid:
+        # The best of the rejected fixes and its errors go back to the LLM
+        candidate, errors = rejected[0]
+        return {**_chosen_fix(candidate), "ranked_candidates": [], **_reject_fix(state, errors, "validation_failed")}
+
+    winner = state["fix_candidates"][valid[0]]
+    print(
+        f"🏅 Picked candidate {winner['index'] + 1} of {len(generated)}: "
+        f"{votes[fix_key(winner)]} vote(s), {_changed_lines(winner['patch'])} changed line(s)"
+    )
     return {
-        **state,
-        "proposed_fix": fix.get("fixed_content", ""),
-        "fix_explanation": fix.get("explanation", ""),
-        "current_step": "fix_generated",
+        **_chosen_fix(winner),
+        "ranked_candidates": valid,
+        "validation_errors": [],
+        "current_step": "fix_validated",
     }
 
 
+def _reject_fix(state: PipelineHealingState, errors: List[str], final_step: str) -> PipelineHealingState:
+    """
+    State update for a fix that failed a check: the errors go back to
+    generate_fix, or the heal ends at `final_step` after the last attempt.
+    """
+    metrics.incr("fixes.rejected")
+
+    update = {"validation_errors": errors, "current_step": "fix_rejected"}
+    if state["fix_cache_hit"]:
+        # The cached fix no longer holds up here; forget it and ask the LLM
+        print("♻️ Cached fix fails its checks, generating a new one...")
+        get_fix_cache().invalidate(cache_key(state["repo_name"], state["error_fingerprint"]))
+        update["fix_cache_hit"] = False
+    elif state["fix_attempts"] >= FIX_MAX_ATTEMPTS:
+        print(f"🛑 No working fix after {state['fix_attempts']} attempts, not opening a PR")
+        update["current_step"] = final_step
+    return update
+
+
+def route_after_check(state: PipelineHealingState) -> str:
+    """Move a fix that passed on; send a rejected one back to the LLM while attempts remain."""
+    if not state["validation_errors"]:
+        return "passed"
+    if state["fix_attempts"] < FIX_MAX_ATTEMPTS:
+        return "retry"
+    return "give_up"
+
+
+def _failed_steps(state: PipelineHealingState) -> List[Tuple[str, str]]:
+    """(job name, step name) of every failed step in the run."""
+    return [
+        (job["name"], step["name"])
+        for job in list_run_jobs(state["repo_name"], state["run_id"])
+        if job["conclusion"] == "failure"
+        for step in job.get("steps") or []
+        if step.get("conclusion") == "failure"
+    ]
+
+
+def _same_failure(ci_excerpt: str, output: str) -> bool:
+    """Does the local output repeat one of the CI run's error lines (paths, line numbers and times aside)?"""
+    local = set(normalize_error(output).splitlines())
+    return any(
+        line in local
+        for line in normalize_error(ci_excerpt).splitlines()
+        if ERROR_LINE.search(line) and len(line.strip("=_-!* ")) > 20
+    )
+
+
+def _read_workflow(worktree: str, path: str) -> str:
+    try:
+        with open(os.path.join(worktree, path)) as f:
+            return f.read()
+    except OSError:
+        raise NotReproducible(f"{path} does not exist at this commit") from None
+
+
+def _reproduce(state: PipelineHealingState, candidates: List[dict]) -> Tuple[dict, dict]:
+    """
+    Run the run's failing step on its commit, first as it is and then with
+    each candidate fix applied (best first) until one makes it pass.
+
+    Returns:
+        (reproduction, candidate): reproduction is {"status": "verified" |
+        "failed" | "skipped", "detail", and, once a step was found, "job",
+        "command", "baseline_exit", "exit_code", "output",
+        "candidates_tried"}; candidate is the first fix that passed, else
+        the best one. Skipped means the failure could not be reproduced
+        here, which says nothing about the fixes.
+    """
+    best = candidates[0]
+    if all(path in MANIFEST_FILES or path.startswith(".github/") for path in best["refs"]):
+        # The sandbox runs one step with the host's toolchain; it does not
+        # install dependencies or run the workflow's setup actions
+        return {"status": "skipped", "detail": "the fix only changes dependency manifests or workflows"}, best
+    if not state["head_sha"]:
+        # A state checkpointed before the head SHA was recorded
+        return {"status": "skipped", "detail": "the run's head commit is unknown"}, best
+
+    workflow_path = get_workflow_run_info(state["repo_name"], state["run_id"])["path"]
+    cache = get_git_cache()
+    previous = state["reproduction"]
+    record = {}
+
+    try:
+        with cache.worktree(state["repo_name"], state["head_sha"]) as tree:
+            workflow = _read_workflow(tree, workflow_path)
+            reasons = []
+            for job_name, step_name in _failed_steps(state):
+                try:
+                    step = find_step(workflow, job_name, step_name)
+                    break
+                except NotReproducible as e:
+                    reasons.append(str(e))
+            else:
+                raise NotReproducible(reasons[0] if reasons else "the run reports no failed step")
+
+            record.update(job=job_name, command=step.run)
+            # The commit does not change between repair attempts
+            if previous.get("status") == "failed" and previous.get("command") == step.run:
+                record["baseline_exit"] = previous["baseline_exit"]
+            else:
+                baseline = run_step(step, tree)
+                record["baseline_exit"] = baseline.exit_code
+                if baseline.exit_code is None:
+                    raise NotReproducible(f"the step timed out without the fix after {baseline.duration}s")
+                if baseline.passed:
+                    raise NotReproducible("the step passes without the fix, so the failure depends on the CI runner")
+                if baseline.exit_code in (126, 127):
+                    raise NotReproducible("the step's command is not available here")
+                if not _same_failure(state["error_excerpt"], baseline.output):
+                    raise NotReproducible("the step fails here, but not with the error from the CI logs")
+
+            results = []
+            for candidate in candidates:
+                cache.reset(tree)
+                write_files(tree, _fix_files(candidate))
+                step = find_step(_read_workflow(tree, workflow_path), job_name, step_name)
+                results.append((candidate, step, run_step(step, tree)))
+                if results[-1][2].passed:
+                    break
+    except (NotReproducible, SandboxError) as e:
+        return {"status": "skipped", "detail": str(e), **record}, best
+
+    record["candidates_tried"] = len(results)
+    candidate, step, result = results[-1] if results[-1][2].passed else results[0]
+    output = "\n".join(result.output.rstrip().splitlines()[-REPRO_FEEDBACK_LINES:])
+    if result.passed:
+        detail = f"`{step.name}` passes with the fix in {result.duration}s"
+        return {"status": "verified", "detail": detail, **record, "exit_code": 0, "output": output}, candidate
+    outcome = "timed out" if result.exit_code is None else f"exited with {result.exit_code}"
+    fixes = "the fix" if len(results) == 1 else f"each of the {len(results)} fixes"
+    detail = f"`{step.name}` still fails with {fixes}: {outcome}"
+    return {"status": "failed", "detail": detail, **record, "exit_code": result.exit_code, "output": output}, best
+
+
+@trace_node
+def reproduce_fix_node(state: PipelineHealingState) -> PipelineHealingState:
+    """
+    Step 3c: Re-run the failing step on the failing commit in a local
+    sandbox, with each of the round's valid fixes in rank order until one
+    makes it pass, and keep that one. If none does, the best goes back to
+    the LLM; if the failure cannot be reproduced here, the best fix goes on
+    unverified.
+    """
+    if not REPRO_ENABLED:
+        return {"reproduction": {"status": "skipped", "detail": "local reproduction is turned off"}}
+
+    print("🏃 Reproducing the failing step locally...")
+
+    candidates = [state["fix_candidates"][position] for position in state["ranked_candidates"]]
+    reproduction, candidate = _reproduce(state, candidates)
+    metrics.incr(f"fixes.reproduction.{reproduction['status']}")
+    annotate(status=reproduction["status"], candidates_tried=reproduction.get("candidates_tried", 0))
+    update = {"reproduction": reproduction, **_chosen_fix(candidate)}
+
+    if reproduction["status"] == "verified":
+        if candidate is not candidates[0]:
+            print(f"🔀 Candidate {candidate['index'] + 1} passes where the top-ranked fix did not")
+        print(f"✅ {reproduction['detail']}")
+        return {**update, "validation_errors": [], "current_step": "fix_verified"}
+    if reproduction["status"] == "skipped":
+        print(f"⏭️ Not verified locally: {reproduction['detail']}")
+        return {**update, "validation_errors": []}
+
+    print(f"❌ {reproduction['detail']}")
+    error = f"{reproduction['detail']}. The end of its output:\n{reproduction['output']}"
+    return {**update, **_reject_fix(state, [error], "reproduction_failed")}
+
+
+@trace_node
 def apply_fix_node(state: PipelineHealingState) -> PipelineHealingState:
     """Step 4: Create a branch and apply the fix."""
     print("✍️ Applying fix to new branch...")
 
-    # Create unique branch name
-    import time
+    # One branch per failed run, so a retried or resumed heal reuses it
+    branch_name = f"auto-fix-{state['run_id']}"
 
-    branch_name = f"auto-fix-{int(time.time())}"
-
-    # Create branch and update file
-    result = create_branch_and_update_file.invoke(
+    # Create branch and commit every changed file in one commit (no-op if
+    # the branch already has them)
+    files = {path: get_blob(digest) for path, digest in state["fix_refs"].items()}
+    result = create_branch_with_files.invoke(
         {
             "repo_name": state["repo_name"],
-            "file_path": state["failed_file"],
-            "new_content": state["proposed_fix"],
+            "files": files,
             "branch_name": branch_name,
             "commit_message": f"🤖 Auto-fix: {state['error_analysis'][:50]}",
         }
@@ -149,13 +776,31 @@ def apply_fix_node(state: PipelineHealingState) -> PipelineHealingState:
 
     print(result)
 
-    return {**state, "branch_name": branch_name, "current_step": "fix_applied"}
+    if not result.startswith("✓"):
+        return {"branch_name": "", "current_step": "apply_failed"}
+    return {"branch_name": branch_name, "current_step": "fix_applied"}
+
 
+def route_after_apply(state: PipelineHealingState) -> str:
+    """Open the PR only if the fix branch was written."""
+    return "create_pr" if state["current_step"] == "fix_applied" else "give_up"
 
+
+@trace_node
 def create_pr_node(state: PipelineHealingState) -> PipelineHealingState:
     """Step 5: Create a pull request with the fix."""
     print("📝 Creating pull request...")
 
+    files_fixed = "\n".join(f"- `{path}`" for path in state["fix_refs"])
+
+    reproduction = state["reproduction"]
+    if reproduction.get("status") == "verified":
+        local_check = f"✅ Failed before this change and passes with it: {reproduction['detail']}"
+    elif reproduction.get("status") == "skipped":
+        local_check = f"⚠️ Not verified locally: {reproduction['detail']}"
+    else:
+        local_check = "Not run"
+
     pr_body = f"""
 ## 🤖 Automated Fix
 
@@ -165,8 +810,11 @@ def create_pr_node(state: PipelineHealingState) -> PipelineHealingState:
 **What I Changed:**
 {state["fix_explanation"]}
 
-**File Fixed:**
-`{state["failed_file"]}`
+**Files Fixed:**
+{files_fixed}
+
+**Local Check:**
+{local_check}
 
 ---
 *This PR was automatically created by Pipeline Healer Agent*
@@ -179,37 +827,169 @@ def create_pr_node(state: PipelineHealingState) -> PipelineHealingState:
             "title": f"🤖 Auto-fix: {state['failed_file']}",
             "body": pr_body,
             "head_branch": state["branch_name"],
-            "base_branch": "main",
+            "base_branch": default_branch(state["repo_name"]),
         }
     )
 
     print(result)
-
-    return {**state, "pr_url": result, "success": True, "current_step": "completed"}
-
-
-def create_healing_graph():
-    """Create the complete healing workflow."""
+    opened = result.startswith("✓")
+
+    # Remember fixes that made it to a PR; once the PR is merged, recurring
+    # errors skip the LLM and similar ones get them as examples
+    key = cache_key(state["repo_name"], state["error_fingerprint"])
+    cached = get_fix_cache().get(key) if opened and state["fix_cache_hit"] else None
+    if opened and (cached is None or cached.get("status") != MERGED):
+        get_fix_cache().put(
+            key,
+            {
+                "failed_file": state["failed_file"],
+                "error_analysis": state["error_analysis"],
+                "proposed_patch": state["proposed_patch"],
+                "fix_explanation": state["fix_explanation"],
+                "status": OPEN,
+                "pr_number": pr_number(result),
+            },
+        )
+    if opened and not state["fix_cache_hit"]:
+        try:
+            get_fix_index().add(
+                f"{state['repo_name']}:{state['run_id']}",
+                state["repo_name"],
+                result,
+                _error_text(state),
+                {
+                    "failed_file": state["failed_file"],
+                    "error_analysis": state["error_analysis"],
+                    "patch": state["proposed_patch"],
+                    "explanation": state["fix_explanation"],
+                },
+            )
+        except Exception as e:
+            print(f"⚠️ Could not add the fix to the fix index: {e}")
+
+    if not opened:
+        return {"pr_url": None, "success": False, "current_step": "pr_failed"}
+    return {"pr_url": result, "success": True, "current_step": "completed"}
+
+
+def prepare_state(state: PipelineHealingState) -> PipelineHealingState:
+    """
+    Run the cheap, LLM-free first steps outside the graph: fetch the run's
+    head SHA and logs and extract the error fingerprint.
+
+    This gives the (repo, head SHA, fingerprint) key that identical heal
+    requests are coalesced on; the graph then skips these steps.
+    """
+    state = {**state, **fetch_logs_node(state)}
+    state.update(extract_errors_node(state))
+    return state
+
+
+def create_healing_graph(checkpointer=None):
+    """
+    Create the complete healing workflow.
+
+    Args:
+        checkpointer: LangGraph checkpoint saver; with one, every run must be
+            invoked with a `thread_config` and can be resumed after a crash
+    """
+    # langgraph takes most of a second to import; only pay for it when a
+    # graph is actually built
+    from langgraph.graph import END, StateGraph
 
     workflow = StateGraph(PipelineHealingState)
 
     # Add all nodes
     workflow.add_node("fetch_logs", fetch_logs_node)
+    workflow.add_node("extract_errors", extract_errors_node)
+    workflow.add_node("lookup_fix", lookup_fix_node)
     workflow.add_node("analyze_error", analyze_error_node)
+    workflow.add_node("prefetch_context", prefetch_context_node)
+    workflow.add_node("plan_fixes", plan_fixes_node)
     workflow.add_node("generate_fix", generate_fix_node)
+    workflow.add_node("rank_fixes", rank_fixes_node)
+    workflow.add_node("reproduce_fix", reproduce_fix_node)
     workflow.add_node("apply_fix", apply_fix_node)
     workflow.add_node("create_pr", create_pr_node)
 
     # Define the flow
     workflow.set_entry_point("fetch_logs")
-    workflow.add_edge("fetch_logs", "analyze_error")
-    workflow.add_edge("analyze_error", "generate_fix")
-    workflow.add_edge("generate_fix", "apply_fix")
-    workflow.add_edge("apply_fix", "create_pr")
+    workflow.add_edge("fetch_logs", "extract_errors")
+    workflow.add_edge("extract_errors", "lookup_fix")
+    workflow.add_conditional_edges(
+        "lookup_fix", route_after_lookup, ["analyze_error", "prefetch_context", "rank_fixes"]
+    )
+    workflow.add_edge(["analyze_error", "prefetch_context"], "plan_fixes")
+    # Fan out one generate_fix per candidate; rank_fixes waits for them all
+    workflow.add_conditional_edges("plan_fixes", route_fix_candidates, {"generate_fix": "generate_fix", "give_up": END})
+    workflow.add_edge("generate_fix", "rank_fixes")
+    workflow.add_conditional_edges(
+        "rank_fixes", route_after_check, {"passed": "reproduce_fix", "retry": "plan_fixes", "give_up": END}
+    )
+    workflow.add_conditional_edges(
+        "reproduce_fix", route_after_check, {"passed": "apply_fix", "retry": "plan_fixes", "give_up": END}
+    )
+    workflow.add_conditional_edges("apply_fix", route_after_apply, {"create_pr": "create_pr", "give_up": END})
     workflow.add_edge("create_pr", END)
 
-    return workflow.compile()
-
-
-# Create the graph
-healing_graph = create_healing_graph()
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def graph_input(graph, repo_name: str, run_id: str, resume: bool = False):
+    """
+    Input and config for healing one run with a checkpointed graph.
+
+    Args:
+        graph: A graph compiled with a checkpointer
+        repo_name: GitHub repo in format 'owner/repo'
+        run_id: The workflow run ID
+        resume: Continue from the run's last checkpoint if there is one (a
+            successful run just returns its final state; one that ended
+            without a fix, e.g. at validation_failed, starts over)
+
+    Returns:
+        (input, config) to pass to `graph.invoke` / `graph.ainvoke`
+    """
+    from agent.checkpoint import thread_config
+
+    config = thread_config(repo_name, run_id)
+    if resume:
+        snapshot = graph.get_state(config)
+        if snapshot.values:
+            step = snapshot.values.get("current_step", "starting")
+            if snapshot.next or snapshot.values.get("success"):
+                print(f"⏯️ Resuming from checkpoint after '{step}'")
+                return None, config
+            print(f"🔁 The last heal of this run ended at '{step}', starting over")
+    # Starting over: fields with reducers (fix candidates, token usage)
+    # must not add to an earlier heal of the same run
+    graph.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    return new_state(repo_name, run_id), config
+
+
+_healing_graph = None
+_healing_graph_lock = threading.Lock()
+
+
+def get_healing_graph():
+    """
+    The shared healing graph, checkpointed to CHECKPOINT_PATH.
+
+    Built on first use rather than at import, so commands and processes
+    that never heal anything do not import langgraph or open the
+    checkpoint database.
+    """
+    global _healing_graph
+    with _healing_graph_lock:
+        if _healing_graph is None:
+            from agent.checkpoint import SQLiteCheckpointer
+
+            _healing_graph = create_healing_graph(SQLiteCheckpointer())
+        return _healing_graph
+
+
+def __getattr__(name: str):
+    # `from agent.graph import healing_graph` keeps working, built lazily
+    if name == "healing_graph":
+        return get_healing_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
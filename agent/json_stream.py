@@ -0,0 +1,312 @@
+# agent/json_stream.py
+
+import json
+import re
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from agent.token_budget import count_tokens
+from agent.tracing import annotate
+
+# Next character that ends or escapes a JSON string
+_STRING_SPECIAL = re.compile(r'["\\]')
+# End of a number / true / false / null
+_SCALAR_END = re.compile(r"[,}\s]")
+
+# How many times a node re-asks the model after off-schema output
+MAX_ATTEMPTS = 3
+
+
+class OffSchemaError(ValueError):
+    """The streamed output can no longer become the JSON object we asked for."""
+
+
+class IncrementalJSONParser:
+    """
+    Parse one flat JSON object from text that arrives in pieces.
+
+    Each top-level field is reported through `on_field` as soon as its value
+    is complete, long before the closing brace arrives. Anything that cannot
+    lead to a valid object of the given schema (prose instead of JSON, an
+    unknown key, a value of the wrong type) raises OffSchemaError right
+    away, so the caller can abort the stream instead of waiting for the
+    whole bad completion.
+
+    A leading Markdown code fence (```json) is tolerated.
+    """
+
+    def __init__(self, schema: Dict[str, type], on_field: Optional[Callable[[str, object], None]] = None):
+        self.schema = schema
+        self.on_field = on_field
+        self.fields: Dict[str, object] = {}
+        self.done = False
+
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key: Optional[str] = None
+        self._value_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._scan_pos = 0  # Where to resume searching an unfinished string
+
+    def feed(self, text: str):
+        """Feed the next piece of model output."""
+        if self.done:
+            return
+        self._buffer += text
+        self._parse()
+
+    def _parse(self):
+        buf = self._buffer
+        while self._pos < len(buf) and not self.done:
+            state = self._state
+            char = buf[self._pos]
+
+            if state == "start":
+                if char.isspace():
+                    self._pos += 1
+                elif char == "`":
+                    # Skip a ```json fence line once we have all of it
+                    end = buf.find("\n", self._pos)
+                    if end == -1:
+                        return
+                    self._pos = end + 1
+                elif char == "{":
+                    self._pos += 1
+                    self._state = "key_or_end"
+                else:
+                    raise OffSchemaError(f"expected a JSON object, got {buf[self._pos:self._pos + 40]!r}")
+
+            elif state in ("key_or_end", "key"):
+                if char.isspace():
+                    self._pos += 1
+                elif char == "}" and state == "key_or_end":
+                    self._pos += 1
+                    self.done = True
+                elif char == '"':
+                    end, _ = self._find_string_end(self._pos + 1)
+                    if end is None:
+                        return
+                    key = json.loads(buf[self._pos : end + 1])
+                    if key not in self.schema:
+                        raise OffSchemaError(f"unexpected key {key!r}")
+                    self._key = key
+                    self._pos = end + 1
+                    self._state = "colon"
+                else:
+                    raise OffSchemaError(f"expected a key, got {char!r}")
+
+            elif state == "colon":
+                if char.isspace():
+                    self._pos += 1
+                elif char == ":":
+                    self._pos += 1
+                    self._state = "value"
+                else:
+                    raise OffSchemaError(f"expected ':', got {char!r}")
+
+            elif state == "value":
+                if char.isspace():
+                    self._pos += 1
+                    continue
+                self._value_start = self._pos
+                self._scan_pos = self._pos + 1
+                self._depth = 0
+                self._in_string = False
+                self._state = "in_value"
+
+            elif state == "in_value":
+                if not self._scan_value():
+                    return
+
+            elif state == "comma_or_end":
+                if char.isspace():
+                    self._pos += 1
+                elif char == ",":
+                    self._pos += 1
+                    self._state = "key"
+                elif char == "}":
+                    self._pos += 1
+                    self.done = True
+                else:
+                    raise OffSchemaError(f"expected ',' or '}}', got {char!r}")
+
+    def _find_string_end(self, pos: int) -> Tuple[Optional[int], int]:
+        """
+        Find the quote closing a string, searching from `pos` (inside the body).
+
+        Returns:
+            (index of the closing quote or None, where to resume next time)
+        """
+        buf = self._buffer
+        while True:
+            match = _STRING_SPECIAL.search(buf, pos)
+            if match is None:
+                return None, len(buf)
+            if match.group() == '"':
+                return match.start(), match.start() + 1
+            if match.start() + 1 >= len(buf):
+                return None, match.start()  # Escape sequence split across chunks
+            pos = match.start() + 2
+
+    def _scan_value(self) -> bool:
+        """Advance through the current value; True once it has been completed."""
+        buf = self._buffer
+        first = buf[self._value_start]
+
+        if first == '"':
+            end, self._scan_pos = self._find_string_end(self._scan_pos)
+            if end is None:
+                return False
+            self._pos = end + 1
+            return self._finish_value(buf[self._value_start : end + 1])
+
+        if first in "{[":
+            while self._pos < len(buf):
+                char = buf[self._pos]
+                if self._in_string:
+                    end, self._scan_pos = self._find_string_end(self._scan_pos)
+                    if end is None:
+                        return False
+                    self._pos = end + 1
+                    self._in_string = False
+                    continue
+                if char == '"':
+                    self._in_string = True
+                    self._scan_pos = self._pos + 1
+                elif char in "{[":
+                    self._depth += 1
+                elif char in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._pos += 1
+                        return self._finish_value(buf[self._value_start : self._pos])
+                self._pos += 1
+            return False
+
+        # Number, true, false or null: ends at the next ',' or '}'
+        match = _SCALAR_END.search(buf, self._value_start)
+        if match is None:
+            return False
+        self._pos = match.start()
+        return self._finish_value(buf[self._value_start : self._pos])
+
+    def _finish_value(self, raw: str) -> bool:
+        try:
+            value = json.loads(raw)
+        except ValueError as e:
+            raise OffSchemaError(f"invalid value for {self._key!r}: {e}") from None
+
+        expected = self.schema[self._key]
+        if not isinstance(value, expected):
+            raise OffSchemaError(f"{self._key!r} should be {expected.__name__}, got {type(value).__name__}")
+
+        self.fields[self._key] = value
+        self._state = "comma_or_end"
+        if self.on_field is not None:
+            self.on_field(self._key, value)
+        return True
+
+
+class LLMOutputError(RuntimeError):
+    """The model did not produce the requested JSON after all attempts."""
+
+    def __init__(self, message: str, stats: Optional[dict] = None):
+        super().__init__(message)
+        self.stats = stats or {}
+
+
+def stream_json(
+    llm,
+    prompt: str,
+    schema: Dict[str, type],
+    required: Iterable[str],
+    on_field: Optional[Callable[[str, object], None]] = None,
+    max_attempts: int = MAX_ATTEMPTS,
+    check: Optional[Callable[[dict], None]] = None,
+) -> Tuple[dict, dict]:
+    """
+    Stream a JSON answer from `llm`, parsing it as it arrives.
+
+    The stream is abandoned as soon as it goes off-schema, and the model is
+    asked again with the parse error appended to the prompt. Once the object
+    is complete the rest of the stream is not consumed.
+
+    Args:
+        llm: A LangChain chat model (anything with `.stream(prompt)`)
+        prompt: The prompt asking for a JSON object
+        schema: Allowed top-level keys and their Python types
+        required: Keys that must be present
+        on_field: Called with (key, value) as soon as each field is complete
+        max_attempts: How many completions to try before giving up
+        check: Called with the complete fields; may raise OffSchemaError to
+            reject an answer that parses but is unusable
+
+    Returns:
+        (fields, stats) where stats has `first_field_s` (time to the first
+        complete field), `total_s`, `attempts`, and `prompt_tokens` /
+        `completion_tokens` summed over all attempts
+
+    Raises:
+        LLMOutputError: if no attempt produced a valid object. It, and any
+            error raised by the model, carries the stats so far as `.stats`,
+            so a failed call still counts against the token budget
+    """
+    required = list(required)
+    started = time.monotonic()
+    timings = {
+        "first_field_s": None,
+        "total_s": None,
+        "attempts": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+    }
+    reminder = ""
+
+    def report(key, value):
+        if timings["first_field_s"] is None:
+            timings["first_field_s"] = round(time.monotonic() - started, 3)
+        if on_field is not None:
+            on_field(key, value)
+
+    for attempt in range(1, max_attempts + 1):
+        timings["attempts"] = attempt
+        parser = IncrementalJSONParser(schema, report)
+        timings["prompt_tokens"] += count_tokens(prompt + reminder)
+        received = []
+
+        try:
+            try:
+                for chunk in llm.stream(prompt + reminder):
+                    received.append(chunk.content)
+                    parser.feed(chunk.content)
+                    if parser.done:
+                        break  # Stop reading (and paying for) trailing output
+            finally:
+                timings["completion_tokens"] += count_tokens("".join(received))
+
+            if not parser.done:
+                raise OffSchemaError("the reply ended before the JSON object was complete")
+            missing = [key for key in required if key not in parser.fields]
+            if missing:
+                raise OffSchemaError(f"missing keys: {', '.join(missing)}")
+            if check is not None:
+                check(parser.fields)
+
+            timings["total_s"] = round(time.monotonic() - started, 3)
+            annotate(tokens=timings["prompt_tokens"] + timings["completion_tokens"], retries=attempt - 1)
+            return parser.fields, timings
+
+        except OffSchemaError as e:
+            print(f"⚠️ Model output went off-schema ({e}), asking again...")
+            reminder = (
+                f"\n\nYour previous reply was rejected: {e}. "
+                "Reply with ONLY the JSON object, nothing else."
+            )
+        except Exception as e:
+            e.stats = timings
+            raise
+
+    annotate(tokens=timings["prompt_tokens"] + timings["completion_tokens"], retries=max_attempts - 1)
+    raise LLMOutputError(f"No valid JSON after {max_attempts} attempts", timings)
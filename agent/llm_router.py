@@ -0,0 +1,313 @@
+# agent/llm_router.py
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from agent import metrics
+from agent.token_budget import count_tokens
+from agent.tracing import span
+
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessageChunk
+
+# Which backend builds the models ("groq", or "fake" for offline runs)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+# Latency samples kept per tier for the percentiles in `stats()`
+LATENCY_SAMPLES = 1000
+
+
+class Tier(NamedTuple):
+    """One model backend and the limits it is called with."""
+
+    name: str
+    model: str
+    max_concurrency: int
+    timeout: float  # Seconds for one whole completion
+    queue_timeout: float  # Seconds to wait for a free slot before falling back
+    fallback: Optional[str] = None  # Tier to use when this one is overloaded
+
+
+def tier_from_env(name: str, model: str, concurrency: int, timeout: float, fallback: Optional[str]) -> Tier:
+    """A tier whose settings can be overridden with LLM_<NAME>_* variables."""
+    prefix = f"LLM_{name.upper()}_"
+    return Tier(
+        name=name,
+        model=os.getenv(prefix + "MODEL", model),
+        max_concurrency=int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+        timeout=float(os.getenv(prefix + "TIMEOUT_SECONDS", str(timeout))),
+        queue_timeout=float(os.getenv(prefix + "QUEUE_TIMEOUT_SECONDS", "30")),
+        fallback=os.getenv(prefix + "FALLBACK", fallback or "") or None,
+    )
+
+
+# A small fast model for structured extraction, a large one for writing fixes
+DEFAULT_TIERS = [
+    tier_from_env("fast", "llama-3.1-8b-instant", concurrency=8, timeout=60, fallback="strong"),
+    tier_from_env("strong", "llama-3.3-70b-versatile", concurrency=4, timeout=180, fallback="fast"),
+]
+
+# Graph node -> tier
+TASK_TIERS = {
+    "analyze_error": "fast",  # Error classification and failed-file extraction
+    "generate_fix": "strong",
+}
+
+
+class LLMOverloadedError(RuntimeError):
+    """No tier could take the request (all busy, timed out or failing)."""
+
+
+@functools.lru_cache(maxsize=None)
+def _provider_overload() -> Tuple[type, ...]:
+    """Provider errors that mean "busy or unreachable", not "bad request"."""
+    # Imported on the first failure, not at startup (the groq SDK is slow to import)
+    try:
+        import groq
+    except ImportError:  # pragma: no cover - only the fake provider is usable then
+        return ()
+    return (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)
+
+
+def is_overload(error: BaseException) -> bool:
+    """True for errors worth retrying on another tier (busy, slow, unreachable)."""
+    return isinstance(error, (LLMOverloadedError, TimeoutError, ConnectionError) + _provider_overload())
+
+
+class FakeChatModel:
+    """
+    Offline stand-in for a chat model.
+
+    `stream(prompt)` yields `respond(prompt)` in chunks, like a LangChain
+    chat model would; call options such as `temperature` are accepted and
+    ignored. `respond` may raise (e.g. LLMOverloadedError) to simulate a
+    failing backend.
+    """
+
+    def __init__(
+        self,
+        respond: Callable[[str], str],
+        chunk_chars: int = 16,
+        first_token_delay: float = 0.0,
+        chunk_delay: float = 0.0,
+    ):
+        self.respond = respond
+        self.chunk_chars = chunk_chars
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.prompts: List[str] = []
+
+    def stream(self, prompt: str, **options) -> Iterator["AIMessageChunk"]:
+        from langchain_core.messages import AIMessageChunk
+
+        self.prompts.append(prompt)
+        text = self.respond(prompt)
+        time.sleep(self.first_token_delay)
+        for start in range(0, len(text), self.chunk_chars):
+            if start:
+                time.sleep(self.chunk_delay)
+            yield AIMessageChunk(content=text[start : start + self.chunk_chars])
+
+
+def _default_fake_reply(prompt: str) -> str:
+    """Minimal schema-valid answers, enough to drive the graph offline."""
+    if '"patch"' in prompt:
+        return '{"patch": "", "explanation": "Fake model: no change proposed"}'
+    return '{"failed_file": "unknown", "error_type": "unknown", "analysis": "Fake model analysis"}'
+
+
+def _groq_model(tier: Tier):
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        model=tier.model,
+        temperature=0,
+        api_key=os.getenv("GROQ_API_KEY"),
+        timeout=tier.timeout,
+        max_retries=LLM_MAX_RETRIES,
+    )
+
+
+# Provider name -> factory building the model for a tier
+PROVIDERS: Dict[str, Callable[[Tier], object]] = {
+    "groq": _groq_model,
+    "fake": lambda tier: FakeChatModel(_default_fake_reply),
+}
+
+
+def _fallback_note(tier: Tier) -> str:
+    return f", falling back to {tier.fallback}" if tier.fallback else ""
+
+
+class RoutedModel:
+    """
+    A tier of the router, usable wherever a chat model's `.stream()` is
+    expected. `options` (e.g. temperature) are passed with every call.
+    """
+
+    def __init__(self, router: "LLMRouter", tier: str, **options):
+        self.router = router
+        self.tier = tier
+        self.options = options
+
+    def stream(self, prompt: str) -> Iterator["AIMessageChunk"]:
+        return self.router.stream(self.tier, prompt, **self.options)
+
+
+class LLMRouter:
+    """
+    Routes LLM calls to model tiers.
+
+    Each task (graph node) maps to a tier (`TASK_TIERS`): cheap structured
+    extraction goes to a small fast model, fix generation to the large one.
+    Every tier has one shared client, a concurrency limit and a timeout.
+    A call that cannot get a slot within `queue_timeout`, or whose backend
+    is overloaded before it produced any output (rate limited, 5xx,
+    timeout, unreachable), moves on to the tier's fallback.
+
+    `factory` builds the model for a tier (default: the `LLM_PROVIDER`
+    entry of `PROVIDERS`), so tests and benchmarks can plug in
+    FakeChatModel.
+
+    Counters (see agent.metrics) are prefixed with `llm.<tier>.`; `stats()`
+    adds latency percentiles and throughput per tier.
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[List[Tier]] = None,
+        factory: Optional[Callable[[Tier], object]] = None,
+        tasks: Optional[Dict[str, str]] = None,
+    ):
+        self.tiers = {tier.name: tier for tier in tiers or DEFAULT_TIERS}
+        self.factory = factory or PROVIDERS[LLM_PROVIDER]
+        self.tasks = dict(TASK_TIERS if tasks is None else tasks)
+        self._models: Dict[str, object] = {}
+        self._slots = {name: threading.BoundedSemaphore(t.max_concurrency) for name, t in self.tiers.items()}
+        self._samples = {name: deque(maxlen=LATENCY_SAMPLES) for name in self.tiers}
+        self._lock = threading.Lock()
+
+    def model(self, tier: str):
+        """The shared client for `tier` (built on first use)."""
+        with self._lock:
+            if tier not in self._models:
+                self._models[tier] = self.factory(self.tiers[tier])
+            return self._models[tier]
+
+    def for_task(self, task: str, **options) -> RoutedModel:
+        """The model a graph node should stream from, called with `options` (e.g. temperature=0.7)."""
+        return RoutedModel(self, self.tasks.get(task, "strong"), **options)
+
+    def _record(self, tier: str, started: float, first_token: Optional[float], tokens: int):
+        latency = time.monotonic() - started
+        with self._lock:
+            self._samples[tier].append((latency, first_token, tokens))
+        metrics.incr(f"llm.{tier}.calls")
+        metrics.incr(f"llm.{tier}.latency_ms", int(latency * 1000))
+        metrics.incr(f"llm.{tier}.completion_tokens", tokens)
+
+    def stream(self, tier: str, prompt: str, **options) -> Iterator["AIMessageChunk"]:
+        """
+        Stream a completion from `tier`, falling back on overload.
+        `options` are passed to the model's `stream` (e.g. temperature).
+
+        Raises:
+            LLMOverloadedError: if every tier in the fallback chain was
+                busy or failing
+        """
+        tried = []
+        name = tier
+        while name is not None and name not in tried:
+            tried.append(name)
+            config = self.tiers[name]
+
+            queued = time.monotonic()
+            if not self._slots[name].acquire(timeout=config.queue_timeout):
+                metrics.incr(f"llm.{name}.busy")
+                print(f"⚠️ {name} model tier busy{_fallback_note(config)}")
+                name = config.fallback
+                continue
+
+            started = time.monotonic()
+            first_token = None
+            received = []
+            # Not `current`: a generator may be resumed from another context
+            with span("llm", name, current=False, model=config.model, queued_s=round(started - queued, 3)) as s:
+                try:
+                    for chunk in self.model(name).stream(prompt, **options):
+                        if first_token is None:
+                            first_token = time.monotonic() - started
+                        elif time.monotonic() - started > config.timeout:
+                            raise LLMOverloadedError(f"{name} tier took longer than {config.timeout:.0f}s")
+                        received.append(chunk.content)
+                        yield chunk
+                    return
+                except Exception as e:
+                    metrics.incr(f"llm.{name}.errors")
+                    # Output already handed to the caller cannot be taken back
+                    if received or not is_overload(e):
+                        raise
+                    metrics.incr(f"llm.{name}.fallbacks")
+                    s.status = "error"
+                    s.set(error=str(e)[:200], fallback=config.fallback)
+                    print(f"⚠️ {name} model tier failed ({e}){_fallback_note(config)}")
+                finally:
+                    # Also runs when the caller stops reading early
+                    self._slots[name].release()
+                    completion_tokens = count_tokens("".join(received))
+                    s.set(bytes=len(prompt.encode("utf-8")), tokens=count_tokens(prompt) + completion_tokens)
+                    if received:
+                        s.set(first_token_s=round(first_token, 3))
+                        self._record(name, started, first_token, completion_tokens)
+            name = config.fallback
+
+        raise LLMOverloadedError(f"No model tier available (tried {', '.join(tried)})")
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-tier model, call counts, latency percentiles and tokens per second."""
+        counters = metrics.get_counters("llm.")
+        report = {}
+        for name, tier in self.tiers.items():
+            with self._lock:
+                samples = list(self._samples[name])
+            latencies = sorted(s[0] for s in samples)
+            firsts = sorted(s[1] for s in samples if s[1] is not None)
+            busy_time = sum(latencies)
+
+            def pct(values, q):
+                return round(values[min(int(q * len(values)), len(values) - 1)], 3) if values else None
+
+            report[name] = {
+                "model": tier.model,
+                **{key: counters.get(f"llm.{name}.{key}", 0) for key in ("calls", "errors", "fallbacks", "busy")},
+                "latency_p50_s": pct(latencies, 0.5),
+                "latency_p95_s": pct(latencies, 0.95),
+                "first_token_p50_s": pct(firsts, 0.5),
+                "tokens_per_s": round(sum(s[2] for s in samples) / busy_time, 1) if busy_time else None,
+            }
+        return report
+
+
+_router: Optional[LLMRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """Shared process-wide LLMRouter."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter()
+        return _router
+
+
+def set_router(router: Optional[LLMRouter]):
+    """Replace the shared router (e.g. with fake models in tests); None resets it."""
+    global _router
+    with _router_lock:
+        _router = router
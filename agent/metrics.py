@@ -0,0 +1,204 @@
+# agent/metrics.py
+
+import bisect
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Process-wide counters, e.g. cache hits and misses
+_lock = threading.Lock()
+_counters: Counter = Counter()
+_gauges = set()  # Counter names kept by record_max (peaks, not running totals)
+
+# Histogram bucket upper bounds by metric name (seconds unless listed here)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(256 * 4**n for n in range(10))  # 256 B .. 64 MB
+TOKENS_BUCKETS = tuple(2**n for n in range(4, 17))  # 16 .. 65536
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10)
+BUCKETS = {
+    "span_bytes": BYTES_BUCKETS,
+    "span_tokens": TOKENS_BUCKETS,
+    "span_retries": COUNT_BUCKETS,
+}
+
+# Prefix of every metric name on the Prometheus endpoint
+PROMETHEUS_NAMESPACE = "healer"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def incr(name: str, value: int = 1):
+    """Increment the counter `name` by `value`."""
+    with _lock:
+        _counters[name] += value
+
+
+def record_max(name: str, value: int):
+    """Keep the largest `value` seen under `name` (e.g. a peak size)."""
+    with _lock:
+        _gauges.add(name)
+        if value > _counters[name]:
+            _counters[name] = value
+
+
+def get_counters(prefix: str = "") -> Dict[str, int]:
+    """Snapshot of all counters whose name starts with `prefix`."""
+    with _lock:
+        return {name: value for name, value in _counters.items() if name.startswith(prefix)}
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as exported to Prometheus."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-quantile by interpolating inside its bucket (what
+        PromQL's histogram_quantile does). Values in the +Inf bucket are
+        reported as the largest finite bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+_histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+
+def observe(metric: str, value: float, **labels: str):
+    """Record `value` in the histogram `metric` for this combination of labels."""
+    key = (metric, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(BUCKETS.get(metric, SECONDS_BUCKETS))
+        histogram.observe(value)
+
+
+def get_histograms(prefix: str = "") -> List[dict]:
+    """
+    Summary of every histogram whose name starts with `prefix`: labels,
+    count, sum and estimated p50/p95/p99.
+    """
+    with _lock:
+        items = sorted(_histograms.items())
+        return [
+            {
+                "metric": metric,
+                **dict(labels),
+                "count": histogram.count,
+                "sum": round(histogram.sum, 6),
+                **{f"p{int(q * 100)}": _round(histogram.quantile(q)) for q in (0.5, 0.95, 0.99)},
+            }
+            for (metric, labels), histogram in items
+            if metric.startswith(prefix)
+        ]
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 4)
+
+
+def reset_counters():
+    """Clear all counters and histograms (mostly useful between benchmark runs)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+# --- Prometheus export ------------------------------------------------------
+
+
+def _metric_name(name: str) -> str:
+    return f"{PROMETHEUS_NAMESPACE}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+
+
+def _label_text(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escape = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+    return "{" + ",".join(f'{key}="{value.translate(escape)}"' for key, value in labels) + "}"
+
+
+def render_prometheus() -> str:
+    """All counters and histograms in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = set(_gauges)
+        histograms = sorted(
+            (name, labels, h.buckets, list(h.counts), h.count, h.sum) for (name, labels), h in _histograms.items()
+        )
+
+    lines = []
+    for name, value in counters:
+        if name in gauges:
+            metric = _metric_name(name)
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        else:
+            metric = _metric_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+
+    typed = set()
+    for name, labels, buckets, counts, count, total in histograms:
+        metric = _metric_name(name)
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            lines.append(f"{metric}_bucket{_label_text(labels + (('le', str(bound)),))} {cumulative}")
+        lines.append(f"{metric}_sum{_label_text(labels)} {total}")
+        lines.append(f"{metric}_count{_label_text(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serve `GET /metrics` (Prometheus format) from a daemon thread, for
+    processes that have no HTTP server of their own (e.g. bulk runs).
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            data = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
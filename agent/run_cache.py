@@ -0,0 +1,66 @@
+# agent/run_cache.py
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from agent.tracing import propagate
+
+# Shared pool for speculative GitHub fetches across all runs
+PREFETCH_WORKERS = 16
+MAX_TRACKED_RUNS = 64
+
+_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+
+class RunCache:
+    """
+    Per-run cache of values that are being (or have been) loaded.
+
+    Entries are futures, so a node can start a fetch and a later node picks
+    up the result, waiting only if it has not finished yet.
+    """
+
+    def __init__(self):
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, key: str, loader: Callable[[], str]) -> Future:
+        """Start loading `key` in the background unless it is already known."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                # Fetches join the trace of the node that started them
+                future = self._futures[key] = _pool.submit(propagate(loader))
+            return future
+
+    def get(self, key: str, loader: Callable[[], str]) -> str:
+        """Value for `key`, loading it now if nobody prefetched it."""
+        return self.prefetch(key, loader).result()
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._futures)
+
+
+_runs: "OrderedDict[str, RunCache]" = OrderedDict()
+_runs_lock = threading.Lock()
+
+
+def get_run_cache(repo_name: str, run_id: str) -> RunCache:
+    """
+    The RunCache for one healing run.
+
+    Only the most recent runs are kept, so caches of finished (or crashed)
+    runs are dropped without explicit cleanup.
+    """
+    key = f"{repo_name}#{run_id}"
+    with _runs_lock:
+        cache = _runs.get(key)
+        if cache is None:
+            cache = _runs[key] = RunCache()
+        _runs.move_to_end(key)
+        while len(_runs) > MAX_TRACKED_RUNS:
+            _runs.popitem(last=False)
+        return cache
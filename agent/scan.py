@@ -0,0 +1,313 @@
+# agent/scan.py
+
+import asyncio
+import json
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, TextIO, Tuple
+
+import numpy as np
+
+from agent import metrics
+from agent.bulk import DEFAULT_MAX_CONCURRENCY, DEFAULT_PER_REPO_LIMIT, heal_runs
+from agent.clustering import cause_lines, cluster, groups, simhash
+from agent.fix_cache import OFFERED, cache_key, get_fix_cache
+from agent.fix_index import pr_number
+from tools.github_tools import comment_on_pull_request, list_failed_runs, list_pull_request_comments
+
+# Scan configuration
+SCAN_RUNS_PER_REPO = int(os.getenv("SCAN_RUNS_PER_REPO", "20"))  # Most recent failed runs per repository
+SCAN_MAX_DISTANCE = int(os.getenv("SCAN_MAX_DISTANCE", "4"))  # SimHash bits two runs of one cluster may differ
+SCAN_FETCH_WORKERS = int(os.getenv("SCAN_FETCH_WORKERS", "8"))  # Runs whose logs are fetched at once
+
+# Marks the comments that link runs to a PR, so a later scan only adds new ones
+LINK_MARKER = "<!-- pipeline-healer:linked-runs -->"
+_LINKED_RUN = re.compile(r"^- Run (\d+)", re.MULTILINE)
+
+# Roles of a run in its cluster
+PRIMARY = "primary"  # Healed first; its fix is offered to the other repositories
+REPRESENTATIVE = "representative"  # Healed in its own repository, starting from the primary's fix
+LINKED = "linked"  # Not healed; linked to its repository's representative's PR
+SKIPPED = "skipped"  # Its error could not be fetched or extracted
+
+
+class FailedRun(NamedTuple):
+    """A failed workflow run and the fingerprints of its error."""
+
+    repo_name: str
+    run_id: str
+    error_fingerprint: str  # Exact fingerprint (fix cache key), see agent.fix_cache
+    simhash: int  # Near-duplicate fingerprint, see agent.clustering
+    cause: str  # Line stating the error, for reports
+    state: dict  # prepare_state's output, so healing the run does not fetch its logs again
+
+
+class Cluster(NamedTuple):
+    """Failed runs with the same error, possibly across repositories."""
+
+    label: int
+    runs: List[FailedRun]
+    primary: FailedRun
+    representatives: Dict[str, FailedRun]  # Repository -> the run healed there
+
+
+def _fingerprint(repo_name: str, run_id: str) -> FailedRun:
+    """Fetch a run's logs and fingerprint its error (no LLM)."""
+    from agent.graph import prepare_state
+    from agent.state import new_state
+
+    state = prepare_state(new_state(repo_name, run_id))
+    excerpt = state["error_excerpt"]
+    # The last cause line: the exception a traceback ends in, or pip's final verdict
+    cause = next((line.strip() for line in reversed(cause_lines(excerpt).splitlines()) if line.strip()), "")
+    return FailedRun(repo_name, str(run_id), state["error_fingerprint"], simhash(excerpt), cause[:200], state)
+
+
+def collect_failed_runs(
+    repos: Iterable[str], runs_per_repo: int = SCAN_RUNS_PER_REPO, workers: int = SCAN_FETCH_WORKERS
+) -> Tuple[List[FailedRun], List[dict]]:
+    """
+    List the most recent failed runs of each repository and fingerprint
+    their errors.
+
+    Returns:
+        (fingerprinted runs, newest first per repository, records of the
+        runs or repositories that could not be fetched)
+    """
+    repos = list(repos)
+    skipped = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as pool:
+        listings = list(pool.map(_list_runs, repos, [runs_per_repo] * len(repos)))
+        pending = []
+        for repo_name, (runs, error) in zip(repos, listings):
+            if error:
+                print(f"⚠️ Could not list the failed runs of {repo_name}: {error}")
+                skipped.append({"repo_name": repo_name, "run_id": None, "role": SKIPPED, "error": error})
+            for run in runs:
+                pending.append((repo_name, str(run["id"]), pool.submit(_fingerprint, repo_name, run["id"])))
+
+        failed_runs = []
+        for repo_name, run_id, future in pending:
+            try:
+                failed_runs.append(future.result())
+            except Exception as e:
+                skipped.append({"repo_name": repo_name, "run_id": run_id, "role": SKIPPED, "error": str(e)})
+    return failed_runs, skipped
+
+
+def _list_runs(repo_name: str, limit: int) -> Tuple[list, Optional[str]]:
+    try:
+        return list_failed_runs(repo_name, limit), None
+    except Exception as e:
+        return [], str(e)
+
+
+def plan_clusters(runs: List[FailedRun], max_distance: int = SCAN_MAX_DISTANCE) -> List[Cluster]:
+    """
+    Group runs whose errors are near-duplicates and pick the runs to heal.
+
+    A pull request only fixes its own repository, so every repository in a
+    cluster gets a representative: its newest run there. The primary is
+    the representative of the repository with the most runs in the
+    cluster; it is healed first and its fix is offered to the others.
+    """
+    if not runs:
+        return []
+    labels = cluster(np.array([run.simhash for run in runs], dtype=np.uint64), max_distance)
+
+    clusters = []
+    for label, members in enumerate(groups(labels)):
+        by_repo: Dict[str, List[FailedRun]] = defaultdict(list)
+        for index in members:
+            by_repo[runs[index].repo_name].append(runs[index])
+        representatives = {repo_name: repo_runs[0] for repo_name, repo_runs in by_repo.items()}
+        primary = representatives[max(by_repo, key=lambda repo_name: len(by_repo[repo_name]))]
+        clusters.append(Cluster(label, [runs[index] for index in members], primary, representatives))
+    return clusters
+
+
+def seed_fix(group: Cluster) -> int:
+    """
+    Offer the primary's fix to the cluster's other repositories through the
+    fix cache: their heals try it first, before its PR is merged (it is
+    checked like any cached fix), and only call the LLM if it does not
+    apply or does not validate.
+
+    Returns:
+        How many repositories it was offered to
+    """
+    cache = get_fix_cache()
+    fix = cache.get(cache_key(group.primary.repo_name, group.primary.error_fingerprint))
+    if fix is None:
+        return 0
+
+    seeded = 0
+    for run in group.representatives.values():
+        key = cache_key(run.repo_name, run.error_fingerprint)
+        if run is not group.primary and cache.get(key) is None:
+            cache.put(key, {**fix, "status": OFFERED, "pr_number": None})
+            seeded += 1
+    metrics.incr("scan.fixes_seeded", seeded)
+    return seeded
+
+
+def _link_comment(representative: FailedRun, linked: List[FailedRun], other_repos: List[str]) -> str:
+    lines = [
+        LINK_MARKER,
+        "🔗 **The same error failed other runs**",
+        "",
+        f"Pipeline Healer grouped these failed runs with run {representative.run_id}; this fix covers them too:",
+        "",
+        *[f"- Run {run.run_id}" for run in linked],
+    ]
+    if other_repos:
+        lines += ["", f"It also failed runs in {', '.join(other_repos)}."]
+    return "\n".join(lines)
+
+
+def link_runs(group: Cluster, results: Dict[Tuple[str, str], dict]) -> Dict[str, str]:
+    """
+    Comment on each pull request of the cluster with the runs it also fixes,
+    leaving out runs an earlier scan already linked.
+
+    Returns:
+        {repository: comment tool result} for the PRs commented on
+    """
+    repos = sorted(group.representatives)
+    outcomes = {}
+    for repo_name, representative in group.representatives.items():
+        result = results.get((repo_name, representative.run_id)) or {}
+        number = pr_number(result.get("pr_url"))
+        if not result.get("success") or number is None:
+            continue
+
+        linked = [run for run in group.runs if run.repo_name == repo_name and run is not representative]
+        if not linked:
+            continue
+        try:
+            already = {
+                run_id
+                for body in list_pull_request_comments(repo_name, number)
+                if LINK_MARKER in body
+                for run_id in _LINKED_RUN.findall(body)
+            }
+        except Exception as e:
+            outcomes[repo_name] = f"Error: {e}"
+            continue
+        linked = [run for run in linked if run.run_id not in already]
+        if linked:
+            body = _link_comment(representative, linked, [repo for repo in repos if repo != repo_name])
+            outcomes[repo_name] = comment_on_pull_request.invoke(
+                {"repo_name": repo_name, "number": number, "body": body}
+            )
+    return outcomes
+
+
+def _records(group: Cluster, results: Dict[Tuple[str, str], dict]) -> List[dict]:
+    """One JSON-serializable record per run of a cluster."""
+    records = []
+    for run in group.runs:
+        representative = group.representatives[run.repo_name]
+        role = PRIMARY if run is group.primary else REPRESENTATIVE if run is representative else LINKED
+        heal = results.get((run.repo_name, representative.run_id), {})
+        records.append(
+            {
+                **(heal if role != LINKED else {}),
+                "repo_name": run.repo_name,
+                "run_id": run.run_id,
+                "cluster": group.label,
+                "simhash": f"{run.simhash:016x}",
+                "role": role,
+                "healed_by": representative.run_id,
+                "pr_url": heal.get("pr_url"),
+                "success": bool(heal.get("success", False)),
+                "error": heal.get("error") if heal else None,
+            }
+        )
+    return records
+
+
+async def _heal(runs: List[FailedRun], max_concurrency: int, per_repo_limit: int) -> Dict[Tuple[str, str], dict]:
+    results = {}
+    # Runs are resumed: a run healed by an earlier scan just returns its
+    # result, one whose heal ended without a fix starts over from its state
+    prepared = {(run.repo_name, run.run_id): run.state for run in runs}
+    async for result in heal_runs(list(prepared), max_concurrency, per_repo_limit, resume=True, prepared=prepared):
+        results[(result["repo_name"], result["run_id"])] = result
+    return results
+
+
+def run_scan(
+    repos: List[str],
+    output: TextIO,
+    runs_per_repo: int = SCAN_RUNS_PER_REPO,
+    max_distance: int = SCAN_MAX_DISTANCE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    per_repo_limit: int = DEFAULT_PER_REPO_LIMIT,
+    dry_run: bool = False,
+) -> int:
+    """
+    Blocking entry point for the scan CLI: heal the recent failures of many
+    repositories once per distinct error.
+
+    The failed runs are fingerprinted and clustered (see agent.clustering).
+    The primary of every cluster is healed first; the other repositories'
+    representatives are healed next, starting from the primary's fix; the
+    remaining runs are linked to their repository's PR with a comment.
+
+    Args:
+        repos: Repositories in format 'owner/repo'
+        output: Stream that receives one JSON line per run
+        runs_per_repo: Most recent failed runs to scan per repository
+        max_distance: SimHash bits two runs of one cluster may differ in
+        max_concurrency: Maximum number of runs healed at the same time
+        per_repo_limit: Maximum number of concurrent runs per repository
+        dry_run: Only report the clusters; heal and comment nothing
+
+    Returns:
+        Number of runs that were not healed (0 for a dry run)
+    """
+    print(f"🔎 Scanning the last {runs_per_repo} failed runs of {len(repos)} repo(s)...")
+    runs, skipped = collect_failed_runs(repos, runs_per_repo)
+    clusters = plan_clusters(runs, max_distance)
+    metrics.incr("scan.runs", len(runs))
+    metrics.incr("scan.clusters", len(clusters))
+    print(f"🧩 {len(runs)} failed run(s), {len(clusters)} distinct error(s)")
+    for group in clusters:
+        print(
+            f"   #{group.label}: {len(group.runs)} run(s) in {len(group.representatives)} repo(s)"
+            f" - {group.primary.cause or '(no error line)'}"
+        )
+
+    results: Dict[Tuple[str, str], dict] = {}
+    if not dry_run and clusters:
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="heal") as pool:
+                loop.set_default_executor(pool)
+                print(f"🩹 Healing {len(clusters)} primary run(s)...")
+                results.update(await _heal([group.primary for group in clusters], max_concurrency, per_repo_limit))
+
+                followers = []
+                for group in clusters:
+                    if results[(group.primary.repo_name, group.primary.run_id)]["success"]:
+                        seed_fix(group)
+                    followers += [run for run in group.representatives.values() if run is not group.primary]
+                if followers:
+                    print(f"🩹 Healing {len(followers)} run(s) in the other repositories of their clusters...")
+                    results.update(await _heal(followers, max_concurrency, per_repo_limit))
+
+        asyncio.run(main())
+        for group in clusters:
+            for repo_name, outcome in link_runs(group, results).items():
+                print(f"🔗 {repo_name}: {outcome}")
+
+    failures = 0
+    for record in skipped + [record for group in clusters for record in _records(group, results)]:
+        output.write(json.dumps(record) + "\n")
+        failures += not record.get("success", False)
+    output.flush()
+    return 0 if dry_run else failures
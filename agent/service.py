@@ -0,0 +1,447 @@
+# agent/service.py
+
+import hashlib
+import hmac
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from agent import metrics
+from agent.fix_cache import CACHE_DIR
+from agent.llm_router import LLMOverloadedError, get_router
+from agent.single_flight import heal_coalesced
+
+# Service configuration
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+HEAL_WORKERS = int(os.getenv("HEAL_WORKERS", "4"))
+HEAL_QUEUE_PATH = os.getenv("HEAL_QUEUE_PATH", os.path.join(CACHE_DIR, "queue.sqlite3"))
+HEAL_QUEUE_MAX = int(os.getenv("HEAL_QUEUE_MAX", "1000"))
+HEAL_MAX_ATTEMPTS = int(os.getenv("HEAL_MAX_ATTEMPTS", "3"))
+HEAL_RETRY_DELAY = float(os.getenv("HEAL_RETRY_DELAY_SECONDS", "30"))
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "300"))
+MAX_PAYLOAD_BYTES = 5 * 1024 * 1024  # GitHub caps webhook payloads at 25 MB; ours are tiny
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Check GitHub's X-Hub-Signature-256 header ('sha256=<hex HMAC of body>')."""
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256=") :])
+
+
+def failed_run(payload: dict) -> Optional[Tuple[str, str, int]]:
+    """
+    The run to heal from a `workflow_run` webhook payload.
+
+    Returns:
+        (repo_name, run_id, run_attempt) for a completed run that failed,
+        otherwise None
+    """
+    run = payload.get("workflow_run") or {}
+    if payload.get("action") != "completed" or run.get("conclusion") != "failure":
+        return None
+    repo_name = (payload.get("repository") or {}).get("full_name")
+    if not repo_name or "id" not in run:
+        return None
+    return repo_name, str(run["id"]), int(run.get("run_attempt") or 1)
+
+
+def closed_fix_pr(payload: dict) -> Optional[Tuple[str, int, bool]]:
+    """
+    A closed pull request of ours from a `pull_request` webhook payload.
+
+    Returns:
+        (repo_name, PR number, merged) if one of the healer's auto-fix PRs
+        was closed, otherwise None
+    """
+    pr = payload.get("pull_request") or {}
+    if payload.get("action") != "closed" or not (pr.get("head") or {}).get("ref", "").startswith("auto-fix-"):
+        return None
+    repo_name = (payload.get("repository") or {}).get("full_name")
+    if not repo_name or "number" not in pr:
+        return None
+    return repo_name, int(pr["number"]), bool(pr.get("merged"))
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether a heal that raised `error` may succeed later: network trouble,
+    GitHub rate limits and server errors, no free LLM tier, or a locked
+    database. Anything else would fail the same way again.
+    """
+    # Imported on the first failure; both are slow to import
+    import requests
+    from github import GithubException
+
+    if isinstance(error, GithubException):
+        return error.status >= 500 or error.status in (403, 429)
+    return isinstance(
+        error, (LLMOverloadedError, ConnectionError, TimeoutError, requests.RequestException, sqlite3.OperationalError)
+    )
+
+
+class Job(NamedTuple):
+    """A queued heal claimed by a worker."""
+
+    id: int
+    repo_name: str
+    run_id: str
+    run_attempt: int  # GitHub's attempt number of the run (re-runs keep the run ID)
+    attempts: int  # Heals of this job started so far, including this one
+
+
+class HealQueue:
+    """
+    Persistent FIFO of runs to heal (SQLite).
+
+    Each attempt of a run is queued at most once, so GitHub's redeliveries
+    and duplicate events are free while a re-run that fails again is healed
+    again. Jobs that were running when the process died are put back in the
+    queue on startup; the graph's checkpoints let them resume where they
+    stopped. A heal that failed with a transient error is retried after
+    `retry_delay` times the number of attempts so far, up to
+    `max_attempts` attempts.
+    """
+
+    def __init__(
+        self,
+        path: str = HEAL_QUEUE_PATH,
+        max_attempts: int = HEAL_MAX_ATTEMPTS,
+        retry_delay: float = HEAL_RETRY_DELAY,
+    ):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+        if columns and "run_attempt" not in columns:
+            # Queues from before run attempts were tracked: first attempts
+            self._db.execute("DROP INDEX IF EXISTS jobs_status")
+            self._db.execute("ALTER TABLE jobs RENAME TO jobs_old")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, repo_name TEXT NOT NULL, run_id TEXT NOT NULL,"
+            " run_attempt INTEGER NOT NULL DEFAULT 1,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT,"
+            " enqueued REAL NOT NULL, available REAL NOT NULL, started REAL, finished REAL,"
+            " UNIQUE (repo_name, run_id, run_attempt))"
+        )
+        if columns and "run_attempt" not in columns:
+            old = ", ".join(columns)
+            self._db.execute(f"INSERT INTO jobs ({old}) SELECT {old} FROM jobs_old")
+            self._db.execute("DROP TABLE jobs_old")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self._db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        self._db.commit()
+
+    def push(self, repo_name: str, run_id: str, run_attempt: int = 1) -> bool:
+        """Queue an attempt of a run; False if it was already queued or healed."""
+        with self._lock:
+            added = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (repo_name, run_id, run_attempt, status, enqueued, available)"
+                " VALUES (?, ?, ?, 'queued', ?, ?)",
+                (repo_name, run_id, run_attempt, time.time(), time.time()),
+            ).rowcount
+            self._db.commit()
+            if added:
+                self._ready.notify()
+            return bool(added)
+
+    def claim(self, timeout: float) -> Optional[Job]:
+        """
+        Take the oldest queued run that is due, waiting up to `timeout`
+        seconds for one.
+
+        Returns:
+            The claimed job, or None
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                row = self._db.execute(
+                    "SELECT id, repo_name, run_id, run_attempt, attempts + 1 FROM jobs"
+                    " WHERE status = 'queued' AND available <= ? ORDER BY id LIMIT 1",
+                    (time.time(),),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', started = ?, attempts = attempts + 1 WHERE id = ?",
+                        (time.time(), row[0]),
+                    )
+                    self._db.commit()
+                    return Job(*row)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                # Re-check at least every second for retries coming due
+                self._ready.wait(min(remaining, 1.0))
+
+    def finish(self, job_id: int, error: Optional[str] = None, retry: bool = False):
+        """Mark a claimed job done, or failed (re-queued until max_attempts if `retry`)."""
+        with self._lock:
+            (attempts,) = self._db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if error is None:
+                status = "done"
+            else:
+                status = "queued" if retry and attempts < self.max_attempts else "failed"
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, available = ? WHERE id = ?",
+                (status, error, time.time(), time.time() + self.retry_delay * attempts, job_id),
+            )
+            self._db.commit()
+
+    def wake_all(self):
+        """Wake every waiting `claim` (used on shutdown)."""
+        with self._lock:
+            self._ready.notify_all()
+
+    def counts(self) -> dict:
+        """Number of jobs per status."""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"queued": 0, "running": 0, "done": 0, "failed": 0, **dict(rows)}
+
+    def depth(self) -> int:
+        """Jobs waiting for a worker."""
+        return self.counts()["queued"]
+
+
+def heal_run(repo_name: str, run_id: str, resume: bool = False) -> dict:
+    """
+    Heal one run through the checkpointed graph, sharing the work with
+    identical heals in flight.
+
+    Args:
+        repo_name: GitHub repo in format 'owner/repo'
+        run_id: The workflow run ID
+        resume: Continue an interrupted or failed heal of this job from
+            its checkpoint (a new attempt of the run starts over)
+    """
+    return heal_coalesced(repo_name, run_id, resume=resume)
+
+
+class HealingService:
+    """
+    Webhook receiver plus a pool of healing workers.
+
+    `POST /webhook` accepts GitHub `workflow_run` events. A signed, failed
+    run is queued (202) and picked up by the next free worker, so a heal
+    starts within moments of the failure. When `max_queue` runs are already
+    waiting, new events are refused with 503 and Retry-After (GitHub shows
+    them as failed deliveries that can be redelivered) instead of growing
+    the backlog without bound. `pull_request` events for the healer's own
+    PRs record in the fix index whether the fix was merged. `GET /health`
+    reports queue counts and per-tier LLM stats, `GET /metrics` all
+    metrics in Prometheus format.
+
+    `stop()` drains gracefully: no new events are accepted, running heals
+    finish (up to `drain_timeout`), and queued runs stay in the persistent
+    queue for the next start.
+
+    Without a `secret` the service refuses to start unless `insecure` is
+    set. It then accepts unsigned events and, unless given a `host`,
+    listens on localhost only.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: int = 8080,
+        workers: int = HEAL_WORKERS,
+        queue: Optional[HealQueue] = None,
+        secret: str = WEBHOOK_SECRET,
+        max_queue: int = HEAL_QUEUE_MAX,
+        drain_timeout: float = DRAIN_TIMEOUT,
+        heal: Callable[..., dict] = heal_run,
+        insecure: bool = False,
+    ):
+        if not secret and not insecure:
+            raise ValueError(
+                "WEBHOOK_SECRET is not set; refusing to accept unsigned webhooks (use --insecure for local testing)"
+            )
+        if host is None:
+            host = "0.0.0.0" if secret else "127.0.0.1"
+
+        self.queue = queue or HealQueue()
+        self.secret = secret
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self.heal = heal
+        self._stopping = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"healer-{n}", daemon=True) for n in range(workers)
+        ]
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass  # One line per heal is printed by the workers instead
+
+            def _reply(self, status: int, body: dict, headers: Optional[dict] = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    data = metrics.render_prometheus().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                if self.path != "/health":
+                    return self._reply(404, {"error": "not found"})
+                self._reply(
+                    200,
+                    {"stopping": service._stopping.is_set(), **service.queue.counts(), "llm": get_router().stats()},
+                )
+
+            def do_POST(self):
+                if self.path != "/webhook":
+                    return self._reply(404, {"error": "not found"})
+                try:
+                    length = int(self.headers["Content-Length"])
+                except (TypeError, ValueError):
+                    length = -1
+                if length < 0:
+                    self.close_connection = True
+                    return self._reply(400, {"error": "missing or invalid Content-Length"})
+                if length > MAX_PAYLOAD_BYTES:
+                    # The body is not read: close the connection rather than parse it as the next request
+                    self.close_connection = True
+                    return self._reply(413, {"error": f"payload larger than {MAX_PAYLOAD_BYTES} bytes"})
+                status, body, headers = service.handle_event(
+                    self.headers.get("X-GitHub-Event", ""),
+                    self.headers.get("X-Hub-Signature-256"),
+                    self.rfile.read(length),
+                )
+                self._reply(status, body, headers)
+
+        return Handler
+
+    def handle_event(self, event: str, signature: Optional[str], body: bytes) -> Tuple[int, dict, dict]:
+        """
+        Decide what to do with one webhook delivery.
+
+        Returns:
+            (HTTP status, JSON reply, extra headers)
+        """
+        if self.secret and not verify_signature(self.secret, body, signature):
+            return 401, {"error": "bad signature"}, {}
+        if self._stopping.is_set():
+            return 503, {"error": "shutting down"}, {"Retry-After": "30"}
+        if event == "ping":
+            return 200, {"status": "pong"}, {}
+        if event not in ("workflow_run", "pull_request"):
+            return 202, {"status": "ignored", "reason": f"event {event!r}"}, {}
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400, {"error": "invalid JSON"}, {}
+
+        if event == "pull_request":
+            return self._record_merge(payload)
+
+        run = failed_run(payload)
+        if run is None:
+            return 202, {"status": "ignored", "reason": "not a failed run"}, {}
+        if self.queue.depth() >= self.max_queue:
+            return 503, {"error": "queue full"}, {"Retry-After": "60"}
+
+        queued = self.queue.push(*run)
+        reply = {"status": "queued" if queued else "duplicate", "repo": run[0], "run_id": run[1], "run_attempt": run[2]}
+        return 202, reply, {}
+
+    def _record_merge(self, payload: dict) -> Tuple[int, dict, dict]:
+        """Tell the fix index and cache whether one of our PRs was merged, so merged fixes get reused."""
+        closed = closed_fix_pr(payload)
+        if closed is None:
+            return 202, {"status": "ignored", "reason": "not a closed auto-fix PR"}, {}
+        repo_name, number, merged = closed
+
+        # numpy loads with the index, on the first PR event
+        from agent.fix_cache import get_fix_cache
+        from agent.fix_index import CLOSED, MERGED, get_fix_index
+
+        status = MERGED if merged else CLOSED
+        changed = get_fix_index().set_status(repo_name, number, status)
+        changed += get_fix_cache().set_status(repo_name, number, status)
+        return 202, {"status": "recorded" if changed else "unknown PR", "repo": repo_name, "pr": number}, {}
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self.queue.claim(timeout=1.0)
+            if job is None:
+                continue
+            started = time.monotonic()
+            print(f"🩺 Healing {job.repo_name} run {job.run_id} (attempt {job.run_attempt})...")
+            retry = False
+            try:
+                # Only a retry of this job picks up where it stopped
+                final_state = self.heal(job.repo_name, job.run_id, resume=job.attempts > 1)
+                error = None if final_state.get("success") else f"heal ended at '{final_state.get('current_step')}'"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                retry = is_transient(e)
+            self.queue.finish(job.id, error, retry)
+            outcome = "✅ healed" if error is None else f"❌ {error}" + (", will retry" if retry else "")
+            print(f"{outcome} {job.repo_name} run {job.run_id} in {time.monotonic() - started:.1f}s")
+
+    def start(self):
+        """Start the workers and the HTTP server (in background threads)."""
+        if not self.secret:
+            print("⚠️ Running insecure: webhook signatures are NOT verified")
+        for worker in self._workers:
+            worker.start()
+        threading.Thread(target=self.server.serve_forever, name="webhook", daemon=True).start()
+        print(f"👂 Listening for workflow_run webhooks on port {self.port} with {len(self._workers)} workers")
+
+    def stop(self):
+        """Stop accepting events and let running heals finish."""
+        print("🛑 Draining: finishing running heals, queued runs are kept for the next start...")
+        self._stopping.set()
+        self.queue.wake_all()
+        deadline = time.monotonic() + self.drain_timeout
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.join(max(deadline - time.monotonic(), 0))
+        self.server.shutdown()
+        self.server.server_close()
+        print(f"👋 Stopped ({self.queue.counts()})")
+
+    def serve_forever(self):
+        """Run until SIGINT/SIGTERM, then drain."""
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+        self.start()
+        while not stop.wait(1.0):
+            pass
+        self.stop()
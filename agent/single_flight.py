@@ -0,0 +1,170 @@
+# agent/single_flight.py
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from agent import metrics
+
+# How long a finished heal is reused for identical requests
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW_SECONDS", "300"))
+COALESCE_MAX_RECENT = 1024
+
+
+class SingleFlight:
+    """
+    Run a function at most once per key at a time and share its result.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for the same result instead of running
+    it again. Successful results (those `succeeded` accepts) are also reused
+    for `window` seconds after they finish. Failures, raised or returned,
+    are shared with the callers that waited for them, but not remembered.
+
+    Works from threads (`do`) and coroutines (`ado`) at the same time.
+
+    Counters (see agent.metrics) are prefixed with `single_flight.`.
+    """
+
+    def __init__(
+        self,
+        window: float = COALESCE_WINDOW,
+        max_recent: int = COALESCE_MAX_RECENT,
+        succeeded: Callable[[object], bool] = lambda result: True,
+    ):
+        self.window = window
+        self.max_recent = max_recent
+        self.succeeded = succeeded
+        self._inflight: Dict[str, Future] = {}
+        self._recent: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """The future for `key` and whether the caller must produce it."""
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is not None:
+                if recent[0] > time.monotonic():
+                    metrics.incr("single_flight.recent")
+                    future = Future()
+                    future.set_result(recent[1])
+                    return future, False
+                del self._recent[key]
+
+            future = self._inflight.get(key)
+            if future is not None:
+                metrics.incr("single_flight.shared")
+                return future, False
+
+            metrics.incr("single_flight.leaders")
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _settle(self, key: str, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            del self._inflight[key]
+            if error is None and self.succeeded(result):
+                self._recent[key] = (time.monotonic() + self.window, result)
+                while len(self._recent) > self.max_recent:
+                    self._recent.popitem(last=False)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def do(self, key: str, fn: Callable[[], object]):
+        """Result of `fn()`, shared with every concurrent caller for `key`."""
+        future, leader = self._claim(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[object]]):
+        """Async version of `do`; `fn` returns an awaitable."""
+        future, leader = self._claim(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+
+# A heal that failed (e.g. validation_failed) is worth another try
+_heals = SingleFlight(succeeded=lambda final_state: bool(final_state.get("success")))
+
+
+def heal_key(state: dict) -> str:
+    """Requests with the same repo, commit and error are the same heal."""
+    return f"{state['repo_name']}@{state['head_sha']}#{state['error_fingerprint']}"
+
+
+def _for_run(final_state: dict, run_id: str) -> dict:
+    """A shared result as seen by the request for `run_id`."""
+    if final_state["run_id"] == run_id:
+        return final_state
+    return {**final_state, "run_id": run_id, "coalesced_with": final_state["run_id"]}
+
+
+def _graph():
+    # Importing the graph and building it takes a while the first time
+    from agent.graph import get_healing_graph
+
+    return get_healing_graph()
+
+
+def heal_coalesced(repo_name: str, run_id: str, resume: bool = False, prepared: Optional[dict] = None) -> dict:
+    """
+    Heal a run, sharing the work with identical concurrent or recent heals.
+
+    When one bad commit fails several workflows with the same error (or a
+    webhook is delivered twice), only the first request runs the LLM calls
+    and opens a PR; the others return its final state with their own
+    `run_id` and `coalesced_with` set to the run that did the work.
+
+    Args:
+        repo_name: GitHub repo in format 'owner/repo'
+        run_id: The workflow run ID
+        resume: Continue from the run's own checkpoint if there is one
+            (no coalescing needed: it already did the expensive part)
+        prepared: The run's `prepare_state` output, if the caller already
+            fetched its logs; used when the heal starts from scratch
+    """
+    graph = _graph()
+    from agent.graph import graph_input, prepare_state
+
+    graph_in, config = graph_input(graph, repo_name, run_id, resume)
+    if graph_in is None:
+        return graph.invoke(None, config)
+
+    graph_in = prepared or prepare_state(graph_in)
+    final_state = _heals.do(heal_key(graph_in), lambda: graph.invoke(graph_in, config))
+    return _for_run(final_state, run_id)
+
+
+async def aheal_coalesced(repo_name: str, run_id: str, resume: bool = False, prepared: Optional[dict] = None) -> dict:
+    """Async version of `heal_coalesced` (blocking steps run in threads)."""
+    # Off the event loop: the first call imports and builds the graph
+    graph = await asyncio.to_thread(_graph)
+    from agent.graph import graph_input, prepare_state
+
+    graph_in, config = await asyncio.to_thread(graph_input, graph, repo_name, run_id, resume)
+    if graph_in is None:
+        return await graph.ainvoke(None, config)
+
+    graph_in = prepared or await asyncio.to_thread(prepare_state, graph_in)
+    final_state = await _heals.ado(heal_key(graph_in), lambda: graph.ainvoke(graph_in, config))
+    return _for_run(final_state, run_id)
@@ -1,28 +1,98 @@
 # agent/state.py
 
-from typing import List, Optional, TypedDict
+import operator
+from typing import Annotated, Dict, List, Optional, TypedDict
+
+from agent.token_budget import add_usage
+
+
+def merge_dicts(left: dict, right: dict) -> dict:
+    """Reducer for per-node fields that parallel branches update under their own keys."""
+    return {**left, **right}
 
 
 class PipelineHealingState(TypedDict):
-    """State that flows through the healing workflow."""
+    """
+    State that flows through the healing workflow.
+
+    Large texts (the raw logs, fixed files) live in the blob store
+    (agent.blob_store); the state only holds their digests, so every field
+    here stays small and checkpoints stay cheap.
+
+    Fields written by the parallel fix candidates have reducers
+    (`Annotated[...]`) that combine the branches' updates.
+    """
 
     # Input
     repo_name: str  # e.g., "username/pipeline-test"
     run_id: str  # Workflow run ID
+    head_sha: str  # Commit the failed run was built from
 
     # Processing
-    error_logs: str  # Raw error logs
+    error_logs_ref: str  # Blob digest of the raw error logs
+    error_excerpt: str  # Ranked excerpts of the logs that go into prompts
+    error_fingerprint: str  # Hash of the normalized excerpt (fix cache key)
     failed_file: str  # Which file caused the error
     error_analysis: str  # AI's understanding of the error
+    prefetched_files: List[str]  # Files fetched speculatively into the run cache
 
     # Fix generation
-    proposed_fix: str  # The code fix
+    proposed_patch: str  # Unified diff produced by the LLM
+    fix_refs: Dict[str, str]  # Every file changed by the fix -> blob digest of its new content
     fix_explanation: str  # Why this fix should work
+    fix_cache_hit: bool  # Did the fix come from the fix cache?
+    fix_attempts: int  # Rounds of fix candidates generated so far in this heal
+    fix_round_size: int  # Candidates in the current round (0: the token budget ran out)
+    fix_prompt_budget: int  # Prompt tokens each candidate of the current round may use
+    candidate: int  # Index of the candidate a generate_fix branch produces (set by Send)
+    fix_candidates: Annotated[List[dict], operator.add]  # Every candidate so far: round, index, patch, refs, ...
+    ranked_candidates: List[int]  # Indexes into fix_candidates of this round's valid fixes, best first
+    validation_errors: List[str]  # Local checks the current fix fails (empty if it passed)
+    reproduction: dict  # Outcome of re-running the failing step locally with the fix
 
     # Execution
     branch_name: str  # Branch created with fix
     pr_url: Optional[str]  # Pull request URL
 
+    # Metrics
+    llm_timings: Annotated[Dict[str, dict], merge_dicts]  # Per LLM call: first_field_s, total_s, attempts
+    token_usage: Annotated[Dict[str, dict], add_usage]  # Per LLM node: prompt_tokens, completion_tokens
+
     # Status tracking
     current_step: str  # Current step in workflow
     success: bool  # Did we fix it?
+    coalesced_with: Optional[str]  # Run ID whose identical heal this one shared
+
+
+def new_state(repo_name: str, run_id: str) -> PipelineHealingState:
+    """Build the initial state for healing a single workflow run."""
+    return {
+        "repo_name": repo_name,
+        "run_id": str(run_id),
+        "head_sha": "",
+        "error_logs_ref": "",
+        "error_excerpt": "",
+        "error_fingerprint": "",
+        "failed_file": "",
+        "error_analysis": "",
+        "prefetched_files": [],
+        "proposed_patch": "",
+        "fix_refs": {},
+        "fix_explanation": "",
+        "fix_cache_hit": False,
+        "fix_attempts": 0,
+        "fix_round_size": 0,
+        "fix_prompt_budget": 0,
+        "candidate": 0,
+        "fix_candidates": [],
+        "ranked_candidates": [],
+        "validation_errors": [],
+        "reproduction": {},
+        "branch_name": "",
+        "pr_url": None,
+        "llm_timings": {},
+        "token_usage": {},
+        "current_step": "starting",
+        "success": False,
+        "coalesced_with": None,
+    }
@@ -0,0 +1,232 @@
+# agent/token_budget.py
+
+import functools
+import math
+import os
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from agent import metrics
+
+# Total prompt + completion tokens one heal may spend across all LLM nodes
+RUN_TOKEN_BUDGET = int(os.getenv("RUN_TOKEN_BUDGET", "16000"))
+
+# Share of RUN_TOKEN_BUDGET each node may have used up to and including
+# itself; whatever an earlier node leaves unused rolls over to later ones
+CUMULATIVE_SHARES = {"analyze_error": 0.3, "generate_fix": 1.0}
+
+# Tokens kept free for each node's answer
+COMPLETION_RESERVE = {"analyze_error": 400, "generate_fix": 1500}
+
+# Smallest prompt worth sending to each node (the prompt template plus the
+# minimum of its sections); with less left the call is not made
+MIN_PROMPT_TOKENS = {"analyze_error": 300, "generate_fix": 1500}
+
+# Pieces that are roughly one token each in a BPE vocabulary
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]|\n")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    """The cl100k encoding, loaded on first use (it may have to be downloaded)."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # Not installed, or the encoding cannot be downloaded
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Number of tokens in `text`.
+
+    Exact (cl100k) if tiktoken is installed. Otherwise an approximation that
+    counts words, digit groups and punctuation separately, which tracks BPE
+    tokenizers much better on logs and code than a characters/4 rule.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 6) if piece[0].isalpha() else 1 for piece in _TOKEN_PIECES.findall(text))
+
+
+def truncate_lines(text: str, max_tokens: int, keep: str = "head") -> str:
+    """
+    Cut `text` at line boundaries until it fits in `max_tokens`.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token limit for the result
+        keep: "head" keeps the beginning, "tail" the end, "both" the
+            beginning and end with the middle dropped
+
+    Returns:
+        The text itself if it fits, otherwise the kept lines with a marker
+        saying how many lines were dropped
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    lines = text.splitlines()
+    marker_cost = 12
+    costs = [count_tokens(line) + 1 for line in lines]
+    budget = max_tokens - marker_cost
+
+    if keep == "both":
+        head_budget, tail_budget = budget // 2, budget - budget // 2
+    elif keep == "tail":
+        head_budget, tail_budget = 0, budget
+    else:
+        head_budget, tail_budget = budget, 0
+
+    head = 0
+    while head < len(lines) and costs[head] <= head_budget:
+        head_budget -= costs[head]
+        head += 1
+    tail = len(lines)
+    while tail > head and costs[tail - 1] <= tail_budget:
+        tail_budget -= costs[tail - 1]
+        tail -= 1
+
+    dropped = tail - head
+    kept = lines[:head] + [f"... [{dropped} lines truncated] ..."] + lines[tail:]
+    return "\n".join(kept)
+
+
+class Section(NamedTuple):
+    """
+    One variable part of a prompt.
+
+    `priority` 0 is the most important. Every section first gets up to its
+    `min_tokens`, in priority order; what is left goes to sections in
+    priority order until each has all it wants. A section that does not get
+    everything is shrunk with `shrink(max_tokens)` if given, otherwise cut
+    with `truncate_lines` keeping its `keep` end.
+    """
+
+    name: str
+    text: str
+    priority: int
+    min_tokens: int = 0
+    keep: str = "head"
+    shrink: Optional[Callable[[int], str]] = None
+
+
+def allocate(sections: List[Section], budget: int) -> Dict[str, int]:
+    """
+    Split `budget` tokens across `sections` by priority.
+
+    Deterministic: equal priorities are served in list order.
+
+    Returns:
+        Mapping of section name to the tokens it may use
+    """
+    wanted = {section.name: count_tokens(section.text) for section in sections}
+    ordered = sorted(sections, key=lambda section: section.priority)
+    granted = {section.name: 0 for section in sections}
+    left = max(budget, 0)
+
+    for section in ordered:
+        share = min(wanted[section.name], section.min_tokens, left)
+        granted[section.name] = share
+        left -= share
+
+    for section in ordered:
+        extra = min(wanted[section.name] - granted[section.name], left)
+        granted[section.name] += extra
+        left -= extra
+
+    return granted
+
+
+def fit_sections(template: str, sections: List[Section], budget: int) -> Dict[str, str]:
+    """
+    Fit the sections of a prompt into `budget` tokens.
+
+    Args:
+        template: The fixed prompt text (counted against the budget first)
+        sections: The variable parts, see `Section`
+        budget: Token limit for the whole prompt
+
+    Returns:
+        Mapping of section name to its (possibly shortened) text
+    """
+    granted = allocate(sections, budget - count_tokens(template))
+
+    fitted = {}
+    for section in sections:
+        limit = granted[section.name]
+        text = section.text
+        if count_tokens(text) > limit:
+            if section.shrink is not None:
+                text = section.shrink(limit)
+            # The shrink function may count differently; make sure it fits
+            text = truncate_lines(text, limit, section.keep)
+        fitted[section.name] = text
+    return fitted
+
+
+def tokens_left(state: dict, node: str) -> int:
+    """Tokens `node` may still spend: its cumulative share of RUN_TOKEN_BUDGET minus the heal's usage so far."""
+    spent = sum(usage["prompt_tokens"] + usage["completion_tokens"] for usage in state["token_usage"].values())
+    return int(RUN_TOKEN_BUDGET * CUMULATIVE_SHARES.get(node, 1.0)) - spent
+
+
+def min_call_tokens(node: str) -> int:
+    """Tokens one call of `node` needs at least: its smallest useful prompt plus its answer."""
+    return MIN_PROMPT_TOKENS.get(node, 0) + COMPLETION_RESERVE.get(node, 0)
+
+
+def prompt_budget(state: dict, node: str, calls: int = 1, reserved: int = 0) -> int:
+    """
+    Prompt tokens each of `calls` parallel calls of `node` may spend in
+    this heal.
+
+    Together they may bring the run total up to the node's cumulative share
+    of RUN_TOKEN_BUDGET, less `reserved` tokens kept for later calls, minus
+    what each must keep free for its answer.
+    """
+    return max((tokens_left(state, node) - reserved) // max(calls, 1) - COMPLETION_RESERVE.get(node, 0), 0)
+
+
+def affordable_calls(state: dict, node: str, wanted: int, reserved: int = 0) -> int:
+    """
+    How many of `wanted` parallel calls of `node` the heal's budget still
+    pays for, with `reserved` tokens kept for later calls and each call
+    getting at least MIN_PROMPT_TOKENS of prompt.
+    """
+    return max(min(wanted, (tokens_left(state, node) - reserved) // max(min_call_tokens(node), 1)), 0)
+
+
+def add_usage(left: Dict[str, dict], right: Dict[str, dict]) -> Dict[str, dict]:
+    """
+    Reducer for the state's `token_usage`: sums the counts per node, so
+    parallel fix candidates and repaired fixes add to earlier usage.
+    """
+    merged = dict(left)
+    for node, usage in right.items():
+        previous = merged.get(node, {})
+        merged[node] = {key: previous.get(key, 0) + count for key, count in usage.items()}
+    return merged
+
+
+def record_usage(node: str, stats: dict) -> Dict[str, dict]:
+    """
+    Account for one node's LLM calls.
+
+    Adds the prompt and completion token counts from `stream_json`'s stats
+    to the process metrics (`tokens.prompt.<node>` and
+    `tokens.completion.<node>`).
+
+    Returns:
+        The `token_usage` update for the state (added to earlier usage by
+        `add_usage`)
+    """
+    metrics.incr(f"tokens.prompt.{node}", stats["prompt_tokens"])
+    metrics.incr(f"tokens.completion.{node}", stats["completion_tokens"])
+    return {node: {key: stats[key] for key in ("prompt_tokens", "completion_tokens")}}
@@ -0,0 +1,186 @@
+# agent/tracing.py
+
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from agent import metrics
+
+# Directory for per-heal trace files (unset: no files, histograms only)
+TRACE_DIR = os.getenv("TRACE_DIR")
+
+# Span attributes that are also recorded as histograms
+MEASURED_ATTRIBUTES = ("bytes", "tokens", "retries")
+
+_current = contextvars.ContextVar("span", default=None)
+_file_lock = threading.Lock()
+
+
+class Span:
+    """
+    One timed piece of work: a graph node, a tool call, a GitHub request
+    or an LLM completion.
+
+    `kind` and `name` become the histogram labels, so `name` must have low
+    cardinality (a node or endpoint, never a repository or run ID).
+    Attributes set with `set()` go into the trace file; the numeric
+    `bytes`, `tokens` and `retries` are also recorded as histograms.
+    """
+
+    def __init__(self, kind: str, name: str, trace_id: Optional[str], attrs: dict):
+        self.kind = kind
+        self.name = name
+        self.trace_id = trace_id
+        self.attrs = attrs
+        self.status = "ok"
+        self.started = time.time()
+        self._clock = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, name: str, value: float):
+        """Add to a numeric attribute (e.g. bytes over several chunks)."""
+        self.attrs[name] = self.attrs.get(name, 0) + value
+
+    def finish(self):
+        status = self.status
+        duration = time.perf_counter() - self._clock
+        labels = {"kind": self.kind, "name": self.name}
+
+        metrics.observe("span_seconds", duration, status=status, **labels)
+        for attribute in MEASURED_ATTRIBUTES:
+            value = self.attrs.get(attribute)
+            if isinstance(value, (int, float)):
+                metrics.observe(f"span_{attribute}", value, **labels)
+
+        if TRACE_DIR and self.trace_id:
+            _write_event(self, duration, status)
+
+
+def _trace_path(trace_id: str) -> str:
+    return os.path.join(TRACE_DIR, re.sub(r"[^\w.-]", "_", trace_id) + ".json")
+
+
+def _write_event(span: Span, duration: float, status: str):
+    """
+    Append the span to its trace file in Chrome trace-event format (open in
+    chrome://tracing or ui.perfetto.dev). The format allows leaving the
+    closing bracket out, so each span is one appended line.
+    """
+    event = {
+        "name": f"{span.kind}:{span.name}",
+        "cat": span.kind,
+        "ph": "X",
+        "ts": int(span.started * 1e6),
+        "dur": int(duration * 1e6),
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": {"status": status, **span.attrs},
+    }
+    path = _trace_path(span.trace_id)
+    line = json.dumps(event, default=str)
+    with _file_lock:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        new = not os.path.exists(path)
+        with open(path, "a") as f:
+            f.write(("[\n" if new else "") + line + ",\n")
+
+
+@contextmanager
+def span(kind: str, name: str, trace_id: Optional[str] = None, current: bool = True, **attrs):
+    """
+    Time the enclosed block as a span.
+
+    Args:
+        kind: Span category ('node', 'tool', 'github', 'llm')
+        name: What ran (node, tool or endpoint name)
+        trace_id: Trace the span belongs to (default: the enclosing span's)
+        current: Make this the span `annotate()` writes to inside the
+            block. Pass False from generators, which may be resumed in
+            another context.
+        **attrs: Initial attributes
+    """
+    parent = _current.get()
+    s = Span(kind, name, trace_id or (parent.trace_id if parent else None), attrs)
+    token = _current.set(s) if current else None
+    try:
+        yield s
+    except GeneratorExit:
+        raise  # A consumer stopped reading a stream early; not a failure
+    except BaseException:
+        s.status = "error"
+        raise
+    finally:
+        if token is not None:
+            _current.reset(token)
+        s.finish()
+
+
+def annotate(**attrs):
+    """Set attributes on the innermost current span, if there is one."""
+    s = _current.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Wrap `fn` to run in (a copy of) the caller's context, so spans started
+    in pool threads join the caller's trace.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def _payload_size(value) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+def trace_node(fn: Callable) -> Callable:
+    """
+    Run a graph node inside a 'node' span. The trace is the heal
+    ('<repo>:<run id>'); `bytes` is the size of the node's state update
+    unless the node reports a more telling payload with `annotate`.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(state, *args, **kwargs):
+        trace_id = f"{state['repo_name']}:{state['run_id']}"
+        with span("node", fn.__name__.removesuffix("_node"), trace_id) as s:
+            update = fn(state, *args, **kwargs)
+            if "bytes" not in s.attrs:
+                s.set(bytes=_payload_size(update))
+            return update
+
+    return wrapper
+
+
+def trace_tool(fn: Callable) -> Callable:
+    """Run a tool function inside a 'tool' span; `bytes` is the size of its result."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span("tool", fn.__name__) as s:
+            result = fn(*args, **kwargs)
+            s.set(bytes=_payload_size(result))
+            # Tools report failures as "Error..." strings instead of raising
+            if isinstance(result, str) and result.startswith(("Error", "GitHub API Error")):
+                s.status = "error"
+                s.set(error=result[:200])
+            return result
+
+    return wrapper
@@ -0,0 +1,7 @@
+# bench/__main__.py
+
+import sys
+
+from bench.run import main
+
+sys.exit(main())
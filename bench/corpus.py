@@ -0,0 +1,57 @@
+# bench/corpus.py
+
+import json
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+# Recorded failures replayed by the benchmark, one JSON file per case
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class Fixture(NamedTuple):
+    """
+    One recorded pipeline failure and its known fix.
+
+    `files` is the repository at the failing commit, `jobs` the run's jobs
+    (failed ones with their log lines), `llm` the answers the fake model
+    gives to the analysis and fix prompts (a list of fix answers replays a
+    repair loop), and `expected` the content every changed file must have
+    on the fix branch.
+    """
+
+    name: str
+    description: str
+    run_id: str
+    workflow: str
+    marker: str  # Substring of the error that identifies this case in a prompt
+    jobs: List[dict]
+    files: Dict[str, str]
+    llm: dict
+    expected: Dict[str, str]
+    log_noise_lines: int = 0  # Build output padded in before each job's log
+
+    @classmethod
+    def load(cls, path: str) -> "Fixture":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(name=os.path.splitext(os.path.basename(path))[0], **data)
+
+
+def load_fixtures(directory: str = FIXTURES_DIR, names: Optional[Sequence[str]] = None) -> List[Fixture]:
+    """
+    Load the fixture corpus.
+
+    Args:
+        directory: Directory with one `<name>.json` per fixture
+        names: Only these fixtures (default: all, sorted by name)
+
+    Raises:
+        ValueError: if a requested fixture does not exist
+    """
+    available = sorted(f[:-5] for f in os.listdir(directory) if f.endswith(".json"))
+    if names:
+        missing = sorted(set(names) - set(available))
+        if missing:
+            raise ValueError(f"Unknown fixtures: {', '.join(missing)} (available: {', '.join(available)})")
+        available = [name for name in available if name in names]
+    return [Fixture.load(os.path.join(directory, name + ".json")) for name in available]
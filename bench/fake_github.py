@@ -0,0 +1,494 @@
+# bench/fake_github.py
+
+import base64
+import hashlib
+import itertools
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from bench.corpus import Fixture
+
+# Quota the fake reports per token and hour; high enough that the GitHub
+# scheduler never paces a benchmark unless asked to
+DEFAULT_RATE_LIMIT = 1_000_000
+
+# Fixed identity and dates, so a fixture's git commit always has the same SHA
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_AUTHOR_DATE": "2024-05-01T12:00:00Z",
+    "GIT_COMMITTER_NAME": "Bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_DATE": "2024-05-01T12:00:00Z",
+}
+
+# Every log line starts with a timestamp, as in real job logs
+LOG_TIMESTAMP = "2024-05-01T12:00:00.0000000Z "
+
+
+def _sha(kind: str, data: bytes) -> str:
+    return hashlib.sha1(kind.encode() + b" %d\0" % len(data) + data).hexdigest()
+
+
+def _file_bytes(content) -> bytes:
+    return content if isinstance(content, bytes) else content.encode()
+
+
+def _noise(count: int) -> List[str]:
+    """Deterministic dependency-install chatter, as found before most failures."""
+    lines = [f"  Downloading pkg_{i}-1.{i % 13}.0-py3-none-any.whl ({10 + i % 900} kB)" for i in range(count)]
+    return ["##[group]Run pip install -r requirements-dev.txt", *lines, "##[endgroup]"]
+
+
+class FakeGitHubAPI:
+    """
+    In-process stand-in for the parts of the GitHub REST API the healer uses.
+
+    Each repository added with `add_repo` gets one commit on its default
+    branch (`main` unless given) with the fixture's files, and one failed
+    workflow run with its jobs and logs. Writes (blobs, trees, commits,
+    refs, pull requests) are applied to an in-memory object store, so a
+    benchmark can check what a heal committed with `branch_files()`.
+    `fail_next()` makes a route answer with an error, to test how the
+    healer copes with a request failing part-way through.
+
+    Replies carry ETags (a matching `If-None-Match` gets a 304) and
+    X-RateLimit-* headers. Every request is counted in `calls` under its
+    route, e.g. "GET /repos/{repo}/contents/{path}".
+
+    With a `git_root`, every repository is also a real bare git repository
+    at `<git_root>/<owner>/<name>.git` whose commit is the run's head SHA,
+    for the healer's local reproduction to fetch from.
+    """
+
+    def __init__(self, rate_limit: int = DEFAULT_RATE_LIMIT, latency: float = 0.0, git_root: Optional[str] = None):
+        self.rate_limit = rate_limit
+        self.latency = latency  # Seconds added to every reply
+        self.git_root = git_root
+        self.calls: Counter = Counter()
+
+        self._blobs: Dict[str, bytes] = {}
+        self._trees: Dict[str, Dict[str, tuple]] = {}  # sha -> {path: (mode, blob sha)}
+        self._commits: Dict[str, dict] = {}
+        self._repos: Dict[str, dict] = {}
+        self._logs: Dict[int, bytes] = {}
+        self._quota: Dict[str, tuple] = {}  # token -> (remaining, reset epoch)
+        self._failures: Dict[str, List[int]] = {}  # route -> statuses of its next replies
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # --- Git objects ----------------------------------------------------------
+
+    def _put_blob(self, data: bytes) -> str:
+        sha = _sha("blob", data)
+        self._blobs[sha] = data
+        return sha
+
+    def _put_tree(self, entries: Dict[str, tuple]) -> str:
+        sha = _sha("tree", json.dumps(sorted(entries.items())).encode())
+        self._trees[sha] = entries
+        return sha
+
+    def _put_commit(self, tree: str, parents: List[str], message: str, sha: Optional[str] = None) -> str:
+        sha = sha or _sha("commit", json.dumps([tree, parents, message]).encode())
+        self._commits[sha] = {
+            "sha": sha,
+            "tree": {"sha": tree},
+            "parents": [{"sha": parent} for parent in parents],
+            "message": message,
+        }
+        return sha
+
+    def _tree_of(self, sha: str) -> Optional[Dict[str, tuple]]:
+        """Entries of a tree, given its SHA or a commit's."""
+        if sha in self._commits:
+            sha = self._commits[sha]["tree"]["sha"]
+        return self._trees.get(sha)
+
+    def _git_commit(self, repo_name: str, files: Dict[str, str], message: str) -> str:
+        """Create the bare repository for `repo_name` with `files` in one commit; returns its SHA."""
+        git_dir = os.path.join(self.git_root, repo_name + ".git")
+        env = {**os.environ, **GIT_ENV}
+        with tempfile.TemporaryDirectory(prefix="bench-tree-") as tree:
+            for path, text in files.items():
+                os.makedirs(os.path.dirname(os.path.join(tree, path)), exist_ok=True)
+                with open(os.path.join(tree, path), "wb") as f:
+                    f.write(_file_bytes(text))
+            git = ["git", "--git-dir", git_dir, "--work-tree", tree]
+            subprocess.run(["git", "init", "--quiet", "--bare", git_dir], env=env, check=True)
+            subprocess.run([*git, "add", "--all"], env=env, check=True)
+            subprocess.run([*git, "commit", "--quiet", "--message", message], env=env, check=True)
+            head = subprocess.run([*git, "rev-parse", "HEAD"], env=env, check=True, capture_output=True, text=True)
+        return head.stdout.strip()
+
+    # --- Setup and inspection ---------------------------------------------------
+
+    def _add_run(self, fixture: Fixture, run_id: str, head: str, branch: str) -> tuple:
+        """(run, jobs) of a failed run of `fixture` at commit `head`; call with the lock held."""
+        jobs = []
+        for job in fixture.jobs:
+            job_id = next(self._job_ids)
+            conclusion = job.get("conclusion", "failure")
+            steps = [{"name": "Set up job", "conclusion": "success"}]
+            if conclusion == "failure":
+                steps.append({"name": job["failed_step"], "conclusion": "failure"})
+            lines = (_noise(fixture.log_noise_lines) if fixture.log_noise_lines else []) + job["log"]
+            self._logs[job_id] = "".join(LOG_TIMESTAMP + line + "\n" for line in lines).encode()
+            jobs.append({"id": job_id, "name": job["name"], "conclusion": conclusion, "steps": steps})
+
+        run = {
+            "id": int(run_id),
+            "name": "CI",
+            "path": fixture.workflow,
+            "head_sha": head,
+            "head_branch": branch,
+            "status": "completed",
+            "conclusion": "failure",
+            "head_commit": {"id": head, "message": "Break the build"},
+        }
+        return run, jobs
+
+    def add_repo(self, repo_name: str, fixture: Fixture, default_branch: str = "main"):
+        """
+        Serve `fixture` as the repository `repo_name` with one failed run on
+        `default_branch`. Files given as bytes rather than text (e.g. binary
+        files) are served as they are.
+        """
+        git_sha = self._git_commit(repo_name, fixture.files, "Break the build") if self.git_root else None
+        with self._lock:
+            files = fixture.files.items()
+            entries = {path: ("100644", self._put_blob(_file_bytes(text))) for path, text in files}
+            head = self._put_commit(self._put_tree(entries), [], "Break the build", git_sha)
+            self._repos[repo_name] = {
+                "name": repo_name,
+                "owner": repo_name.split("/")[0],
+                "default_branch": default_branch,
+                "refs": {default_branch: head},
+                "runs": {fixture.run_id: self._add_run(fixture, fixture.run_id, head, default_branch)},
+                "pulls": [],
+                "comments": {},  # PR number -> comment bodies
+            }
+
+    def add_failed_run(self, repo_name: str, fixture: Fixture, run_id: str):
+        """Another failed run of `repo_name`'s head commit, with `fixture`'s jobs and logs."""
+        with self._lock:
+            repo = self._repos[repo_name]
+            branch = repo["default_branch"]
+            repo["runs"][run_id] = self._add_run(fixture, run_id, repo["refs"][branch], branch)
+
+    def branch_files(self, repo_name: str, branch: str) -> Optional[Dict[str, str]]:
+        """{path: content} at the head of a branch, or None if it does not exist."""
+        with self._lock:
+            head = self._repos[repo_name]["refs"].get(branch)
+            if head is None:
+                return None
+            return {path: self._blobs[sha].decode() for path, (_, sha) in self._tree_of(head).items()}
+
+    def pulls(self, repo_name: str) -> List[dict]:
+        with self._lock:
+            return list(self._repos[repo_name]["pulls"])
+
+    def comments(self, repo_name: str, number: int) -> List[str]:
+        """Bodies of the comments on a pull request."""
+        with self._lock:
+            return list(self._repos[repo_name]["comments"].get(number, []))
+
+    def fail_next(self, route: str, status: int = 502, times: int = 1):
+        """Answer the next `times` requests to `route` (e.g. "POST /repos/{repo}/git/commits") with `status`."""
+        with self._lock:
+            self._failures.setdefault(route, []).extend([status] * times)
+
+    # --- Server ---------------------------------------------------------------
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGitHubAPI":
+        """Serve on a free localhost port from a daemon thread."""
+        api = self
+
+        class Handler(_Handler):
+            fake = api
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-github", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def rate_limit_headers(self, token: str, counts: bool) -> Dict[str, str]:
+        now = time.time()
+        with self._lock:
+            remaining, reset = self._quota.get(token, (self.rate_limit, int(now) + 3600))
+            if now >= reset:
+                remaining, reset = self.rate_limit, int(now) + 3600
+            if counts:
+                remaining = max(remaining - 1, 0)
+            self._quota[token] = (remaining, reset)
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(reset),
+        }
+
+    # --- Routes -----------------------------------------------------------------
+    # Each handler gets the repository, the path groups, the query and the
+    # JSON body, and returns (status, body); a str body is sent as is.
+
+    def get_repo(self, repo, query, body):
+        return 200, {"full_name": repo["name"], "default_branch": repo["default_branch"]}
+
+    def get_commit_sha(self, repo, query, body, ref):
+        sha = repo["refs"].get(ref, ref if ref in self._commits else None)
+        return (200, sha) if sha else (404, {"message": "No commit found for SHA: " + ref})
+
+    def list_runs(self, repo, query, body):
+        # Newest first, like GitHub
+        runs = [run for run, _ in reversed(repo["runs"].values())]
+        if "status" in query:
+            runs = [run for run in runs if query["status"] in (run["status"], run["conclusion"])]
+        page, per_page = int(query.get("page", 1)), int(query.get("per_page", 30))
+        return 200, {"total_count": len(runs), "workflow_runs": runs[(page - 1) * per_page : page * per_page]}
+
+    def get_run(self, repo, query, body, run_id):
+        run = repo["runs"].get(run_id)
+        return (200, run[0]) if run else (404, {"message": "Not Found"})
+
+    def get_jobs(self, repo, query, body, run_id):
+        if run_id not in repo["runs"]:
+            return 404, {"message": "Not Found"}
+        jobs = repo["runs"][run_id][1]
+        page, per_page = int(query.get("page", 1)), int(query.get("per_page", 30))
+        return 200, {"total_count": len(jobs), "jobs": jobs[(page - 1) * per_page : page * per_page]}
+
+    def get_job_log(self, repo, query, body, job_id):
+        # Like GitHub: a redirect to a pre-signed download URL
+        return 302, f"/_downloads/logs/{job_id}"
+
+    def get_contents(self, repo, query, body, path):
+        ref = query.get("ref", repo["default_branch"])
+        sha = repo["refs"].get(ref, ref)
+        entry = (self._tree_of(sha) or {}).get(path)
+        if entry is None:
+            return 404, {"message": "Not Found"}
+        content = base64.b64encode(self._blobs[entry[1]]).decode()
+        return 200, {"type": "file", "path": path, "sha": entry[1], "encoding": "base64", "content": content}
+
+    def get_blob(self, repo, query, body, sha):
+        if sha not in self._blobs:
+            return 404, {"message": "Not Found"}
+        return 200, {"sha": sha, "encoding": "base64", "content": base64.b64encode(self._blobs[sha]).decode()}
+
+    def get_git_commit(self, repo, query, body, sha):
+        return (200, self._commits[sha]) if sha in self._commits else (404, {"message": "Not Found"})
+
+    def get_tree(self, repo, query, body, sha):
+        entries = self._tree_of(sha)
+        if entries is None:
+            return 404, {"message": "Not Found"}
+        tree = [
+            {"path": path, "mode": mode, "type": "blob", "sha": blob} for path, (mode, blob) in sorted(entries.items())
+        ]
+        return 200, {"sha": sha, "tree": tree, "truncated": False}
+
+    def get_ref(self, repo, query, body, branch):
+        sha = repo["refs"].get(branch)
+        if sha is None:
+            return 404, {"message": "Not Found"}
+        return 200, {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": sha}}
+
+    def list_pulls(self, repo, query, body):
+        head = query.get("head", "")
+        return 200, [
+            pr
+            for pr in repo["pulls"]
+            if pr["state"] == query.get("state", "open")
+            and (not head or f"{repo['owner']}:{pr['head']['ref']}" == head)
+        ]
+
+    def create_blob(self, repo, query, body):
+        return 201, {"sha": self._put_blob(base64.b64decode(body["content"]))}
+
+    def create_tree(self, repo, query, body):
+        entries = dict(self._tree_of(body.get("base_tree", "")) or {})
+        for entry in body["tree"]:
+            entries[entry["path"]] = (entry["mode"], entry["sha"])
+        return 201, {"sha": self._put_tree(entries)}
+
+    def create_commit(self, repo, query, body):
+        return 201, self._commits[self._put_commit(body["tree"], body["parents"], body["message"])]
+
+    def create_ref(self, repo, query, body):
+        branch = body["ref"].removeprefix("refs/heads/")
+        if branch in repo["refs"]:
+            return 422, {"message": "Reference already exists"}
+        repo["refs"][branch] = body["sha"]
+        return 201, {"ref": body["ref"], "object": {"sha": body["sha"]}}
+
+    def update_ref(self, repo, query, body, branch):
+        if branch not in repo["refs"]:
+            return 422, {"message": "Reference does not exist"}
+        repo["refs"][branch] = body["sha"]
+        return 200, {"ref": f"refs/heads/{branch}", "object": {"sha": body["sha"]}}
+
+    def create_pull(self, repo, query, body):
+        if body["head"] not in repo["refs"]:
+            return 422, {"message": "Validation Failed"}
+        number = len(repo["pulls"]) + 1
+        pr = {
+            "number": number,
+            "state": "open",
+            "title": body["title"],
+            "body": body["body"],
+            "head": {"ref": body["head"]},
+            "base": {"ref": body["base"]},
+            "html_url": f"https://github.com/{repo['name']}/pull/{number}",
+        }
+        repo["pulls"].append(pr)
+        return 201, pr
+
+    def list_comments(self, repo, query, body, number):
+        comments = repo["comments"].get(int(number), [])
+        page, per_page = int(query.get("page", 1)), int(query.get("per_page", 30))
+        return 200, [{"body": text} for text in comments[(page - 1) * per_page : page * per_page]]
+
+    def create_comment(self, repo, query, body, number):
+        if not any(pr["number"] == int(number) for pr in repo["pulls"]):
+            return 404, {"message": "Not Found"}
+        comments = repo["comments"].setdefault(int(number), [])
+        comments.append(body["body"])
+        url = f"https://github.com/{repo['name']}/pull/{number}#issuecomment-{len(comments)}"
+        return 201, {"body": body["body"], "html_url": url}
+
+
+REPO = r"^/repos/(?P<repo>[^/]+/[^/]+)"
+
+# (method, route, path regex, FakeGitHubAPI method)
+ROUTES = [
+    ("GET", "/repos/{repo}", REPO + r"$", "get_repo"),
+    ("GET", "/repos/{repo}/commits/{ref}", REPO + r"/commits/([^/]+)$", "get_commit_sha"),
+    ("GET", "/repos/{repo}/actions/runs", REPO + r"/actions/runs$", "list_runs"),
+    ("GET", "/repos/{repo}/actions/runs/{id}", REPO + r"/actions/runs/(\d+)$", "get_run"),
+    ("GET", "/repos/{repo}/actions/runs/{id}/jobs", REPO + r"/actions/runs/(\d+)/jobs$", "get_jobs"),
+    ("GET", "/repos/{repo}/actions/jobs/{id}/logs", REPO + r"/actions/jobs/(\d+)/logs$", "get_job_log"),
+    ("GET", "/repos/{repo}/contents/{path}", REPO + r"/contents/(.+)$", "get_contents"),
+    ("GET", "/repos/{repo}/git/blobs/{sha}", REPO + r"/git/blobs/(\w+)$", "get_blob"),
+    ("GET", "/repos/{repo}/git/commits/{sha}", REPO + r"/git/commits/(\w+)$", "get_git_commit"),
+    ("GET", "/repos/{repo}/git/trees/{sha}", REPO + r"/git/trees/(\w+)$", "get_tree"),
+    ("GET", "/repos/{repo}/git/ref/heads/{branch}", REPO + r"/git/ref/heads/(.+)$", "get_ref"),
+    ("GET", "/repos/{repo}/pulls", REPO + r"/pulls$", "list_pulls"),
+    ("GET", "/repos/{repo}/issues/{number}/comments", REPO + r"/issues/(\d+)/comments$", "list_comments"),
+    ("POST", "/repos/{repo}/git/blobs", REPO + r"/git/blobs$", "create_blob"),
+    ("POST", "/repos/{repo}/git/trees", REPO + r"/git/trees$", "create_tree"),
+    ("POST", "/repos/{repo}/git/commits", REPO + r"/git/commits$", "create_commit"),
+    ("POST", "/repos/{repo}/git/refs", REPO + r"/git/refs$", "create_ref"),
+    ("PATCH", "/repos/{repo}/git/refs/heads/{branch}", REPO + r"/git/refs/heads/(.+)$", "update_ref"),
+    ("POST", "/repos/{repo}/pulls", REPO + r"/pulls$", "create_pull"),
+    ("POST", "/repos/{repo}/issues/{number}/comments", REPO + r"/issues/(\d+)/comments$", "create_comment"),
+]
+COMPILED_ROUTES = [(method, name, re.compile(pattern), handler) for method, name, pattern, handler in ROUTES]
+
+LOG_DOWNLOAD = re.compile(r"^/_downloads/logs/(\d+)$")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake: FakeGitHubAPI
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def _handle(self, method: str):
+        fake = self.fake
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        token = (self.headers.get("Authorization") or "anonymous").split()[-1]
+
+        download = LOG_DOWNLOAD.match(url.path)
+        if download and method == "GET":
+            # The download host is not the API: no token, no rate limit
+            with fake._lock:
+                fake.calls["GET {log download}"] += 1
+                data = fake._logs.get(int(download.group(1)))
+            if data is None:
+                return self._send(404, {"message": "Not Found"}, {})
+            return self._send(200, data, {"Content-Type": "text/plain"})
+
+        for route_method, name, pattern, handler in COMPILED_ROUTES:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self._send(404, {"message": f"No fake for {method} {url.path}"}, {})
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        repo_name = match.group("repo")
+        with fake._lock:
+            fake.calls[f"{method} {name}"] += 1
+            repo = fake._repos.get(repo_name)
+            failures = fake._failures.get(f"{method} {name}")
+            if failures:
+                status, reply = failures.pop(0), {"message": "Injected failure"}
+            elif repo is None:
+                status, reply = 404, {"message": "Not Found"}
+            else:
+                status, reply = getattr(fake, handler)(repo, query, body, *match.groups()[1:])
+
+        headers = {}
+        if status == 302:
+            headers["Location"] = reply
+            status, reply = 302, b""
+        elif method == "GET" and status == 200:
+            data = reply if isinstance(reply, str) else json.dumps(reply, sort_keys=True)
+            etag = '"' + hashlib.sha1(data.encode()).hexdigest() + '"'
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                # Conditional requests answered with 304 cost no quota
+                return self._send(304, b"", {**headers, **fake.rate_limit_headers(token, counts=False)})
+        headers.update(fake.rate_limit_headers(token, counts=True))
+        self._send(status, reply, headers)
+
+    def _send(self, status: int, reply, headers: Dict[str, str]):
+        if isinstance(reply, bytes):
+            data = reply
+        elif isinstance(reply, str):
+            data = reply.encode()
+            headers.setdefault("Content-Type", "text/plain")
+        else:
+            data = json.dumps(reply).encode()
+            headers.setdefault("Content-Type", "application/json")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
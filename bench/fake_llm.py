@@ -0,0 +1,50 @@
+# bench/fake_llm.py
+
+import json
+from typing import Callable, List
+
+from agent.llm_router import FakeChatModel, LLMRouter
+from bench.corpus import Fixture
+
+
+def fixture_responder(fixtures: List[Fixture]) -> Callable[[str], str]:
+    """
+    Answer each prompt with the recorded reply of the fixture it is about.
+
+    The fixture is recognized by its `marker` (a piece of its error that
+    ends up in every prompt); fix prompts are the ones asking for a patch.
+    A fixture may record several fix answers: the first prompt gets the
+    first one, and a repair prompt (quoting a rejected diff) gets the
+    answer after the rejected one.
+
+    Raises:
+        ValueError: from the returned function, for a prompt that matches
+            no fixture (the heal then fails like it would on a bad reply)
+    """
+
+    def fix_answer(fixture: Fixture, prompt: str) -> dict:
+        answers = fixture.llm["fix"] if isinstance(fixture.llm["fix"], list) else [fixture.llm["fix"]]
+        for number, answer in enumerate(answers[:-1]):
+            if answer["patch"] in prompt:
+                return answers[number + 1]
+        return answers[0] if "WAS REJECTED" not in prompt else answers[-1]
+
+    def respond(prompt: str) -> str:
+        for fixture in fixtures:
+            if fixture.marker in prompt:
+                answer = fix_answer(fixture, prompt) if '"patch"' in prompt else fixture.llm["analysis"]
+                return json.dumps(answer)
+        raise ValueError("Prompt matches no benchmark fixture")
+
+    return respond
+
+
+def fixture_router(
+    fixtures: List[Fixture], first_token_delay: float = 0.0, chunk_delay: float = 0.0, chunk_chars: int = 16
+) -> LLMRouter:
+    """
+    An LLMRouter with the default tiers, all backed by FakeChatModel
+    replaying the fixtures' answers with the given latency.
+    """
+    respond = fixture_responder(fixtures)
+    return LLMRouter(factory=lambda tier: FakeChatModel(respond, chunk_chars, first_token_delay, chunk_delay))
@@ -0,0 +1,381 @@
+# bench/run.py
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import List, Optional
+
+from bench.corpus import FIXTURES_DIR, Fixture, load_fixtures
+from bench.fake_github import DEFAULT_RATE_LIMIT, FakeGitHubAPI
+
+try:
+    import resource
+except ImportError:  # Not on Windows; peak RSS is left out there
+    resource = None
+
+# Replays the recorded failures in bench/fixtures through the healing graph
+# against an in-process fake GitHub API and a fake LLM, fully offline:
+#
+#   python -m bench                      # run, compare with bench/baseline.json
+#   python -m bench --update-baseline    # accept the current numbers
+#
+# Exit status 1 means a metric regressed past the tolerance (see `compare`).
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Relative slowdown tolerated for timing and memory metrics
+DEFAULT_TOLERANCE = 0.25
+# Absolute slack for latencies, so sub-millisecond nodes do not flap
+LATENCY_SLACK_SECONDS = 0.01
+
+# Metric -> (better direction, deterministic?). Deterministic metrics (call
+# and token counts, success rates) must not get worse at all.
+CHECKED_METRICS = {
+    "success_rate": ("higher", True),
+    "correct_fix_rate": ("higher", True),
+    "api_calls_per_heal": ("lower", True),
+    "llm_calls_per_heal": ("lower", True),
+    "tokens_per_heal": ("lower", True),
+    "throughput_heals_per_s": ("higher", False),
+    "heal_p50_s": ("lower", False),
+    "heal_p95_s": ("lower", False),
+    "peak_rss_mb": ("lower", False),
+}
+
+
+def configure_environment(api_url: str, workdir: str, git_root: str, reproduce: bool = True):
+    """
+    Point every client and store at the fake API and a scratch directory,
+    and local reproduction at the fake's bare git repositories in `git_root`.
+
+    Must run before `agent` or `tools` are imported: their settings are read
+    from the environment at import time.
+    """
+    imported = [name for name in ("agent.graph", "tools.github_cache", "agent.tracing") if name in sys.modules]
+    if imported:
+        raise RuntimeError(f"Benchmark must configure the environment before importing {', '.join(imported)}")
+
+    os.environ.update(
+        {
+            "GITHUB_API_URL": api_url,
+            "GITHUB_TOKEN": "bench-token",
+            "PIPELINE_HEALER_CACHE_DIR": workdir,
+            "FIX_CACHE_PATH": os.path.join(workdir, "fix_cache.sqlite3"),
+            "CHECKPOINT_PATH": os.path.join(workdir, "checkpoints.sqlite3"),
+            "BLOB_DIR": os.path.join(workdir, "blobs"),
+            "TRACE_DIR": os.path.join(workdir, "traces"),
+            "LLM_PROVIDER": "fake",
+            "REPRO_ENABLED": "1" if reproduce else "0",
+            "REPRO_GIT_URL": os.path.join(git_root, "{repo}.git"),
+            "REPRO_CACHE_DIR": os.path.join(workdir, "git-cache"),
+        }
+    )
+    os.environ.pop("GITHUB_TOKENS", None)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(int(q * len(values)), len(values) - 1)], 4)
+
+
+def replay(api: FakeGitHubAPI, fixtures: List[Fixture], owner: str, copies: int, concurrency: int) -> List[dict]:
+    """
+    Heal `copies` fresh copies of every fixture through the bulk runner (and
+    so `healing_graph`), `concurrency` at a time.
+
+    Every copy is its own repository, so no heal is served by the fix cache
+    or coalesced with another one.
+
+    Returns:
+        One summary per heal (see agent.bulk), with the fixture name added
+    """
+    from agent.bulk import run_bulk
+
+    runs, names = [], {}
+    for copy in range(copies):
+        for fixture in fixtures:
+            repo_name = f"{owner}/{fixture.name}-{copy}"
+            api.add_repo(repo_name, fixture)
+            runs.append((repo_name, fixture.run_id))
+            names[repo_name] = fixture.name
+
+    output = io.StringIO()
+    # The nodes' progress output would drown the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_bulk(runs, output, max_concurrency=concurrency)
+
+    summaries = [json.loads(line) for line in output.getvalue().splitlines()]
+    for summary in summaries:
+        summary["fixture"] = names[summary["repo_name"]]
+    return summaries
+
+
+def fix_is_correct(api: FakeGitHubAPI, fixture: Fixture, summary: dict) -> bool:
+    """True if the heal's branch holds exactly the fixture's expected files and has a PR."""
+    if not summary["success"]:
+        return False
+    files = api.branch_files(summary["repo_name"], summary["branch_name"]) or {}
+    has_pr = any(pr["head"]["ref"] == summary["branch_name"] for pr in api.pulls(summary["repo_name"]))
+    return has_pr and all(files.get(path) == content for path, content in fixture.expected.items())
+
+
+def read_spans(trace_dir: str) -> List[dict]:
+    """All span events from the trace files (see agent.tracing)."""
+    events = []
+    if not os.path.isdir(trace_dir):
+        return events
+    for name in os.listdir(trace_dir):
+        with open(os.path.join(trace_dir, name)) as f:
+            for line in f:
+                line = line.strip().rstrip(",")
+                if line.startswith("{"):
+                    events.append(json.loads(line))
+    return events
+
+
+def measure(
+    api: FakeGitHubAPI, fixtures: List[Fixture], summaries: List[dict], elapsed: float, trace_dir: str
+) -> dict:
+    """Benchmark results: headline metrics, per-node latencies, API calls per route and per-fixture outcomes."""
+    by_name = {fixture.name: fixture for fixture in fixtures}
+    heals = len(summaries)
+    correct = [fix_is_correct(api, by_name[s["fixture"]], s) for s in summaries]
+
+    node_durations = defaultdict(list)
+    llm_calls = 0
+    for event in read_spans(trace_dir):
+        if event["cat"] == "node":
+            if event["args"].get("bytes") == len("{}"):
+                continue  # Work already done by prepare_state; the node returned no update
+            node_durations[event["name"].split(":", 1)[1]].append(event["dur"] / 1e6)
+        elif event["cat"] == "llm":
+            llm_calls += 1
+
+    peak_rss = None
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        peak_rss = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+    durations = [s["duration_s"] for s in summaries]
+    per_fixture = {}
+    for fixture in fixtures:
+        own = [(s, ok) for s, ok in zip(summaries, correct) if s["fixture"] == fixture.name]
+        per_fixture[fixture.name] = {
+            "heals": len(own),
+            "succeeded": sum(s["success"] for s, _ in own),
+            "correct": sum(ok for _, ok in own),
+            "heal_p50_s": _percentile([s["duration_s"] for s, _ in own], 0.5),
+            "errors": sorted({s["error"] for s, _ in own if s["error"]}),
+        }
+
+    return {
+        "metrics": {
+            "heals": heals,
+            "success_rate": round(sum(s["success"] for s in summaries) / heals, 4),
+            "correct_fix_rate": round(sum(correct) / heals, 4),
+            "throughput_heals_per_s": round(heals / elapsed, 3),
+            "heal_p50_s": _percentile(durations, 0.5),
+            "heal_p95_s": _percentile(durations, 0.95),
+            "api_calls_per_heal": round(sum(api.calls.values()) / heals, 2),
+            "llm_calls_per_heal": round(llm_calls / heals, 2),
+            "tokens_per_heal": round(sum(s["tokens"] for s in summaries) / heals, 1),
+            "peak_rss_mb": peak_rss,
+        },
+        "nodes": {
+            name: {
+                "count": len(values),
+                "p50_s": _percentile(values, 0.5),
+                "p95_s": _percentile(values, 0.95),
+                "p99_s": _percentile(values, 0.99),
+            }
+            for name, values in sorted(node_durations.items())
+        },
+        "api_calls_per_heal": {route: round(count / heals, 2) for route, count in sorted(api.calls.items())},
+        "fixtures": per_fixture,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Regressions of `results` against `baseline`.
+
+    Deterministic metrics may not get worse at all; timings and memory may
+    get worse by `tolerance` (relative, plus LATENCY_SLACK_SECONDS for
+    latencies), and so may each node's median latency (its p95 is too
+    noisy over a few dozen runs).
+
+    Returns:
+        One line per regressed metric (empty if none)
+    """
+    regressions = []
+
+    def check(label: str, new, old, direction: str, exact: bool, slack: float = 0.0):
+        if new is None or old is None:
+            return
+        if direction == "lower":
+            limit = old if exact else old * (1 + tolerance) + slack
+            worse = new > limit
+        else:
+            limit = old if exact else old / (1 + tolerance)
+            worse = new < limit
+        if worse:
+            regressions.append(f"{label}: {new} vs baseline {old} (limit {round(limit, 4)})")
+
+    for metric, (direction, exact) in CHECKED_METRICS.items():
+        slack = LATENCY_SLACK_SECONDS if metric.endswith("_s") else 0.0
+        check(metric, results["metrics"].get(metric), baseline["metrics"].get(metric), direction, exact, slack)
+
+    for node, stats in results["nodes"].items():
+        old = baseline["nodes"].get(node)
+        if old is not None:
+            check(f"node {node} p50_s", stats["p50_s"], old["p50_s"], "lower", False, LATENCY_SLACK_SECONDS)
+
+    return regressions
+
+
+def print_report(results: dict):
+    metrics = results["metrics"]
+    print("=" * 60)
+    print(
+        f"Heals: {metrics['heals']}  success {metrics['success_rate']:.0%}  "
+        f"correct fix {metrics['correct_fix_rate']:.0%}"
+    )
+    print(
+        f"Throughput: {metrics['throughput_heals_per_s']} heals/s  "
+        f"(p50 {metrics['heal_p50_s']}s, p95 {metrics['heal_p95_s']}s per heal)"
+    )
+    print(
+        f"Per heal: {metrics['api_calls_per_heal']} GitHub calls, {metrics['llm_calls_per_heal']} LLM calls, "
+        f"{metrics['tokens_per_heal']} tokens"
+    )
+    memory = f"Peak RSS: {metrics['peak_rss_mb']} MB"
+    if metrics.get("python_peak_mb") is not None:
+        memory += f"  (Python heap peak {metrics['python_peak_mb']} MB)"
+    print(memory)
+    print("\nNodes:")
+    for node, stats in results["nodes"].items():
+        print(f"  {node}: {stats['count']} runs, p50 {stats['p50_s']}s, p95 {stats['p95_s']}s, p99 {stats['p99_s']}s")
+    print("\nGitHub calls per heal:")
+    for route, count in results["api_calls_per_heal"].items():
+        print(f"  {count:6}  {route}")
+    print("\nFixtures:")
+    for name, stats in results["fixtures"].items():
+        errors = f"  errors: {'; '.join(stats['errors'])}" if stats["errors"] else ""
+        print(f"  {name}: {stats['correct']}/{stats['heals']} correct, p50 {stats['heal_p50_s']}s{errors}")
+    print("=" * 60)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m bench", description="Replay recorded pipeline failures offline and measure healing"
+    )
+    parser.add_argument("--fixtures", nargs="*", metavar="NAME", help="Fixtures to replay (default: all)")
+    parser.add_argument("--fixtures-dir", default=FIXTURES_DIR, help="Directory of fixture JSON files")
+    parser.add_argument("--repeat", type=int, default=4, help="Copies of each fixture to heal (default: 4)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Heals running at once (default: 8)")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured copies of each fixture healed first")
+    parser.add_argument("--llm-first-token", type=float, default=0.2, help="Fake LLM seconds to first token")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.002, help="Fake LLM seconds between chunks")
+    parser.add_argument("--github-latency", type=float, default=0.005, help="Fake GitHub seconds per request")
+    parser.add_argument("--github-rate-limit", type=int, default=DEFAULT_RATE_LIMIT, help="Fake quota per hour")
+    parser.add_argument("--no-reproduce", action="store_true", help="Skip the local reproduction of failing steps")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report the Python heap peak (slower)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline results to compare with")
+    parser.add_argument("--update-baseline", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    try:
+        fixtures = load_fixtures(args.fixtures_dir, args.fixtures)
+    except ValueError as e:
+        parser.error(str(e))
+    config = {
+        "fixtures": [fixture.name for fixture in fixtures],
+        "repeat": args.repeat,
+        "concurrency": args.concurrency,
+        "llm_first_token_s": args.llm_first_token,
+        "llm_chunk_delay_s": args.llm_chunk_delay,
+        "github_latency_s": args.github_latency,
+        "github_rate_limit": args.github_rate_limit,
+        "reproduce": not args.no_reproduce,
+    }
+
+    workdir = tempfile.mkdtemp(prefix="healer-bench-")
+    trace_dir = os.path.join(workdir, "traces")
+    git_root = os.path.join(workdir, "remotes")
+    api = FakeGitHubAPI(rate_limit=args.github_rate_limit, latency=args.github_latency, git_root=git_root).start()
+    try:
+        configure_environment(api.url, workdir, git_root, reproduce=not args.no_reproduce)
+
+        from agent import metrics
+        from agent.llm_router import set_router
+        from bench.fake_llm import fixture_router
+
+        set_router(fixture_router(fixtures, args.llm_first_token, args.llm_chunk_delay))
+
+        print(f"🧪 Replaying {len(fixtures)} fixtures x {args.repeat} at concurrency {args.concurrency}...")
+        if args.warmup:
+            replay(api, fixtures, "warmup", args.warmup, args.concurrency)
+            api.calls.clear()
+            metrics.reset_counters()
+            shutil.rmtree(trace_dir, ignore_errors=True)
+
+        if args.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        summaries = replay(api, fixtures, "bench", args.repeat, args.concurrency)
+        elapsed = time.perf_counter() - started
+
+        results = {"config": config, **measure(api, fixtures, summaries, elapsed, trace_dir)}
+        if args.trace_memory:
+            results["metrics"]["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            tracemalloc.stop()
+    finally:
+        api.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with (create one with --update-baseline)")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["config"] != config:
+        print("⚠️ Baseline was recorded with different settings; not comparing")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("❌ Regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    print("✅ No regressions against the baseline")
+    return 0
@@ -0,0 +1,128 @@
+# bench/startup.py
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+# Checks that entry points import quickly and leave the heavy libraries for
+# the first heal:
+#
+#   python -m bench.startup
+#
+# Each module is imported in a fresh interpreter; exit status 1 means a
+# budget was exceeded or a deferred package was imported.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import-time budget per entry point, in milliseconds (cumulative, as
+# reported by `python -X importtime`); None means report only
+IMPORT_BUDGETS_MS: Dict[str, Optional[float]] = {
+    "main": 100,  # Every CLI command pays this before it does anything
+    "agent.service": 250,  # The webhook service, before it listens
+    "agent.bulk": 250,
+    "tools.log_parser": 100,  # What a log-parsing pool worker imports
+    "agent.graph": None,  # Paid once, by the first heal
+}
+
+# Packages the budgeted entry points must not import; they are loaded by
+# the first heal (graph, GitHub and LLM clients, tokenizer, fix index)
+DEFERRED_PACKAGES = (
+    "langgraph",
+    "langchain_core",
+    "langchain_groq",
+    "groq",
+    "github",
+    "requests",
+    "tiktoken",
+    "numpy",
+)
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| (\S.*)$")
+
+
+def _run(code: str, env: dict) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def measure_import(module: str, env: dict) -> dict:
+    """Cumulative import time of `module` (ms) and the deferred packages it pulled in."""
+    result = _run(f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))", env)
+    cumulative = None
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        # Top-level entries have no indentation before the name
+        if match and match.group(2) == module:
+            cumulative = int(match.group(1)) / 1000
+    loaded = {name.split(".")[0] for name in json.loads(result.stdout)}
+    return {"ms": cumulative, "deferred_loaded": sorted(loaded & set(DEFERRED_PACKAGES))}
+
+
+def check_startup(repeat: int = 5) -> List[dict]:
+    """
+    Measure every entry point in IMPORT_BUDGETS_MS `repeat` times.
+
+    Returns:
+        One row per module: median and best import time, its budget,
+        deferred packages it imported and whether it is within limits
+    """
+    # Keep the user's settings and caches out of the measurement
+    scratch = tempfile.mkdtemp(prefix="healer-startup-")
+    env = {**os.environ, "PIPELINE_HEALER_CACHE_DIR": scratch, "PYTHONDONTWRITEBYTECODE": ""}
+
+    rows = []
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        samples = [measure_import(module, env) for _ in range(repeat)]
+        times = [sample["ms"] for sample in samples]
+        deferred = samples[0]["deferred_loaded"] if budget is not None else []
+        best = min(times)
+        rows.append(
+            {
+                "module": module,
+                "median_ms": round(statistics.median(times), 1),
+                "best_ms": round(best, 1),
+                "budget_ms": budget,
+                "deferred_loaded": deferred,
+                # The best run is the least disturbed by the rest of the machine
+                "ok": (budget is None or best <= budget) and not deferred,
+            }
+        )
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.startup", description="Check import-time budgets")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    rows = check_startup(args.repeat)
+    for row in rows:
+        budget = f"budget {row['budget_ms']} ms" if row["budget_ms"] is not None else "no budget"
+        status = "✅" if row["ok"] else "❌"
+        print(f"{status} {row['module']}: {row['median_ms']} ms median, {row['best_ms']} ms best ({budget})")
+        if row["deferred_loaded"]:
+            print(f"   imports {', '.join(row['deferred_loaded'])}, which should load on first use")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+            f.write("\n")
+
+    return 0 if all(row["ok"] for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,28 @@
 # main.py
 
-from dotenv import load_dotenv
+import argparse
+import contextlib
+import json
+import sys
 
-from agent.graph import healing_graph
+from dotenv import load_dotenv
 
+# Before any agent or tools module is imported: they read their settings
+# from the environment at import time. Those imports are deferred to the
+# command that needs them, so `--help` or `serve` start without loading
+# langgraph and the GitHub and LLM clients.
 load_dotenv()
 
 
-def heal_pipeline(repo_name: str, run_id: str):
+def heal_pipeline(repo_name: str, run_id: str, resume: bool = False):
     """
     Main function to heal a failed pipeline.
 
     Args:
         repo_name: GitHub repo in format 'owner/repo'
         run_id: The workflow run ID that failed
+        resume: Continue from the run's last checkpoint instead of starting
+            over (no logs are re-fetched and no LLM call is repeated)
     """
     print("🚀 Pipeline Healer Agent Starting...")
     print("=" * 60)
@@ -21,24 +30,23 @@ def heal_pipeline(repo_name: str, run_id: str):
     print(f"Run ID: {run_id}")
     print("=" * 60)
 
-    # Initial state
-    initial_state = {
-        "repo_name": repo_name,
-        "run_id": run_id,
-        "error_logs": "",
-        "failed_file": "",
-        "error_analysis": "",
-        "proposed_fix": "",
-        "fix_explanation": "",
-        "branch_name": "",
-        "pr_url": None,
-        "current_step": "starting",
-        "success": False,
-    }
-
     # Run the healing workflow
     try:
-        final_state = healing_graph.invoke(initial_state)
+        from agent.graph import get_healing_graph, graph_input
+
+        healing_graph = get_healing_graph()
+
+        # Initial state (or None to continue from the last checkpoint)
+        initial_state, config = graph_input(healing_graph, repo_name, run_id, resume)
+        final_state = healing_graph.invoke(initial_state, config)
+
+        if final_state.get("current_step") in ("validation_failed", "reproduction_failed"):
+            print("\n" + "=" * 60)
+            print("❌ NO WORKING FIX FOUND, NO PULL REQUEST OPENED")
+            print("=" * 60)
+            for error in final_state["validation_errors"]:
+                print(f"- {error}")
+            return final_state
 
         print("\n" + "=" * 60)
         print("✅ HEALING COMPLETE!")
@@ -58,10 +66,127 @@ def heal_pipeline(repo_name: str, run_id: str):
         traceback.print_exc()
 
 
-if __name__ == "__main__":
-    # Example usage
-    # Replace with your actual repo and run ID
+def heal_bulk(args) -> int:
+    """Heal every run listed in a file (or stdin) and stream JSON-lines results."""
+    from agent import metrics
+    from agent.bulk import parse_run_list, run_bulk
+    from agent.llm_router import get_router
+
+    if args.runs == "-":
+        runs = parse_run_list(sys.stdin)
+    else:
+        with open(args.runs) as f:
+            runs = parse_run_list(f)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    if args.metrics_port:
+        metrics.serve_metrics(args.metrics_port)
+
+    # Node progress output goes to stderr so stdout stays valid JSON lines
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            failures = run_bulk(runs, output, args.concurrency, args.per_repo, args.resume)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Healed {len(runs) - failures}/{len(runs)} runs", file=sys.stderr)
+    for stage in metrics.get_histograms("span_seconds"):
+        if stage["kind"] == "node" and stage["status"] == "ok":
+            print(
+                f"  {stage['name']}: {stage['count']} runs, "
+                f"p50 {stage['p50']}s, p95 {stage['p95']}s, p99 {stage['p99']}s",
+                file=sys.stderr,
+            )
+    for tier, stats in get_router().stats().items():
+        if stats["calls"]:
+            print(
+                f"  {tier} ({stats['model']}): {stats['calls']} calls, "
+                f"p50 {stats['latency_p50_s']}s, p95 {stats['latency_p95_s']}s, "
+                f"{stats['tokens_per_s']} tokens/s, {stats['fallbacks']} fallbacks",
+                file=sys.stderr,
+            )
+    return 1 if failures else 0
+
+
+def scan(args) -> int:
+    """Heal the recent failed runs of many repositories once per distinct error."""
+    from agent.scan import SCAN_MAX_DISTANCE, SCAN_RUNS_PER_REPO, run_scan
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    # Progress output goes to stderr so stdout stays valid JSON lines
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            failures = run_scan(
+                args.repos,
+                output,
+                runs_per_repo=args.runs or SCAN_RUNS_PER_REPO,
+                max_distance=SCAN_MAX_DISTANCE if args.max_distance is None else args.max_distance,
+                max_concurrency=args.concurrency,
+                per_repo_limit=args.per_repo,
+                dry_run=args.dry_run,
+            )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failures else 0
+
+
+def serve(args) -> int:
+    """Run the webhook service until interrupted."""
+    from agent.service import HealingService, HealQueue
+
+    # Options left out fall back to the HEAL_* environment variables
+    options = {"workers": args.workers, "max_queue": args.max_queue}
+    options = {name: value for name, value in options.items() if value is not None}
+    queue = HealQueue(args.queue) if args.queue else None
 
+    try:
+        service = HealingService(host=args.host, port=args.port, queue=queue, insecure=args.insecure, **options)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    service.serve_forever()
+    return 0
+
+
+def fix_index(args) -> int:
+    """Maintain the index of past fixes used as examples by generate_fix."""
+    from agent.fix_index import CLOSED, MERGED, get_fix_index
+
+    index = get_fix_index()
+    if args.action == "sync":
+        # For PRs whose webhook never reached us (or when not running the service)
+        from agent.fix_cache import get_fix_cache
+        from tools.github_tools import get_pull_request
+
+        cache = get_fix_cache()
+        prs = sorted(set(index.open_prs()) | set(cache.open_prs()))
+        counts = {MERGED: 0, CLOSED: 0}
+        for repo_name, number in prs:
+            try:
+                pr = get_pull_request(repo_name, number)
+            except Exception as e:
+                print(f"⚠️ {repo_name}#{number}: {e}")
+                continue
+            if pr.get("merged") or pr.get("merged_at"):
+                status = MERGED
+            elif pr.get("state") == "closed":
+                status = CLOSED
+            else:
+                continue
+            index.set_status(repo_name, number, status)
+            cache.set_status(repo_name, number, status)
+            counts[status] += 1
+        print(f"🔄 Checked {len(prs)} open PR(s): {counts[MERGED]} merged, {counts[CLOSED]} closed")
+    elif args.action == "compact":
+        print(f"🧹 Dropped {index.compact()} entries of closed PRs")
+    print(json.dumps(index.stats(), indent=2))
+    return 0
+
+
+def interactive():
+    """Prompt for a single repo and run ID, then heal it."""
     print("Enter your repository (format: username/repo-name):")
     repo = input("> ").strip()
 
@@ -70,3 +195,74 @@ if __name__ == "__main__":
     run_id = input("> ").strip()
 
     heal_pipeline(repo, run_id)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Pipeline Healer Agent")
+    commands = parser.add_subparsers(dest="command")
+
+    bulk = commands.add_parser("bulk", help="Heal many failed runs concurrently")
+    bulk.add_argument(
+        "runs",
+        nargs="?",
+        default="-",
+        help="File with one 'owner/repo RUN_ID' per line ('-' for stdin)",
+    )
+    bulk.add_argument("--concurrency", type=int, default=8, help="Max runs healed at once")
+    bulk.add_argument("--per-repo", type=int, default=2, help="Max concurrent runs per repository")
+    bulk.add_argument("--output", "-o", help="Write JSON-lines results here instead of stdout")
+    bulk.add_argument("--resume", action="store_true", help="Continue runs from their last checkpoint")
+    bulk.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port while running")
+
+    scan = commands.add_parser("scan", help="Cluster recent failed runs across repositories and heal each error once")
+    scan.add_argument("repos", nargs="+", help="Repositories in format 'owner/repo'")
+    scan.add_argument("--runs", type=int, help="Recent failed runs per repository (default: SCAN_RUNS_PER_REPO or 20)")
+    scan.add_argument(
+        "--max-distance", type=int, help="SimHash bits runs of one cluster may differ (default: SCAN_MAX_DISTANCE or 4)"
+    )
+    scan.add_argument("--concurrency", type=int, default=8, help="Max runs healed at once")
+    scan.add_argument("--per-repo", type=int, default=2, help="Max concurrent runs per repository")
+    scan.add_argument("--output", "-o", help="Write JSON-lines results here instead of stdout")
+    scan.add_argument("--dry-run", action="store_true", help="Only report the clusters; heal nothing")
+
+    serve = commands.add_parser("serve", help="Heal failed runs as workflow_run webhooks arrive")
+    serve.add_argument("--host", help="Interface to listen on (default: all, or localhost with --insecure)")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--workers", type=int, help="Runs healed at once (default: HEAL_WORKERS or 4)")
+    serve.add_argument("--max-queue", type=int, help="Refuse webhooks (503) beyond this many waiting runs")
+    serve.add_argument("--queue", help="Path of the persistent queue database")
+    serve.add_argument(
+        "--insecure",
+        action="store_true",
+        help="Accept unsigned webhooks when WEBHOOK_SECRET is not set (local testing)",
+    )
+
+    resume = commands.add_parser("resume", help="Continue an interrupted heal from its last checkpoint")
+    resume.add_argument("repo", help="Repository in format 'owner/repo'")
+    resume.add_argument("run_id", help="The workflow run ID")
+
+    index = commands.add_parser("index", help="Maintain the index of past fixes shown to the LLM as examples")
+    index.add_argument(
+        "action",
+        choices=["stats", "sync", "compact"],
+        help="stats: show counts; sync: fetch the merge status of open PRs; compact: drop closed PRs' fixes",
+    )
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+
+    if args.command == "bulk":
+        sys.exit(heal_bulk(args))
+    elif args.command == "scan":
+        sys.exit(scan(args))
+    elif args.command == "serve":
+        sys.exit(serve(args))
+    elif args.command == "resume":
+        heal_pipeline(args.repo, args.run_id, resume=True)
+    elif args.command == "index":
+        sys.exit(fix_index(args))
+    else:
+        interactive()
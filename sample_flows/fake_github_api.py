@@ -0,0 +1,87 @@
+# fake_github_api.py
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A tiny stand-in for the GitHub REST API with a deliberately small rate
+# limit, to watch the GitHub scheduler pace, prioritize and spread requests
+# across tokens without spending real quota:
+#
+#   python sample_flows/fake_github_api.py --limit 10 --window 30
+#
+# then, in another shell, fire more requests than one token allows:
+#
+#   GITHUB_API_URL=http://localhost:8081 GITHUB_TOKENS=token-a,token-b python -c "
+#   from tools.github_tools import list_recent_workflow_runs
+#   for _ in range(30): print(list_recent_workflow_runs.invoke({'repo_name': 'octo/demo'}))"
+#
+# Each token gets `--limit` requests per `--window` seconds; every reply
+# carries X-RateLimit-* headers, exhausted tokens get 403, and every
+# `--secondary-every`th request gets a 429 with Retry-After.
+
+parser = argparse.ArgumentParser(description="Serve a rate-limited fake GitHub API")
+parser.add_argument("--port", type=int, default=8081)
+parser.add_argument("--limit", type=int, default=10, help="Requests per token per window")
+parser.add_argument("--window", type=int, default=30, help="Rate-limit window in seconds")
+parser.add_argument("--secondary-every", type=int, default=0, help="Answer every Nth request with 429 (0 = never)")
+args = parser.parse_args()
+
+RUNS = re.compile(r"^/repos/([^/]+)/([^/]+)/actions/runs(\?.*)?$")
+
+quota = {}  # token -> (remaining, reset epoch)
+served = 0
+lock = threading.Lock()
+
+
+class FakeGitHub(BaseHTTPRequestHandler):
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        global served
+        token = (self.headers.get("Authorization") or "anonymous").split()[-1]
+        now = time.time()
+
+        with lock:
+            served += 1
+            remaining, reset = quota.get(token, (args.limit, int(now) + args.window))
+            if now >= reset:
+                remaining, reset = args.limit, int(now) + args.window
+
+            if args.secondary_every and served % args.secondary_every == 0:
+                body = {"message": "You have exceeded a secondary rate limit."}
+                status, extra = 429, {"Retry-After": "2"}
+            elif remaining <= 0:
+                status, body, extra = 403, {"message": "API rate limit exceeded"}, {}
+            else:
+                remaining -= 1
+                status, body, extra = self._route()
+            quota[token] = (remaining, reset)
+
+        print(f"{status} {self.path} token={token[:8]} remaining={remaining}")
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-RateLimit-Limit", str(args.limit))
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset", str(reset))
+        for name, value in extra.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        if RUNS.match(self.path):
+            run = {"id": 1, "name": "CI", "conclusion": "failure", "head_commit": {"message": "Break the build"}}
+            return 200, {"total_count": 1, "workflow_runs": [run]}, {}
+        return 404, {"message": "Not Found"}, {}
+
+
+server = ThreadingHTTPServer(("", args.port), FakeGitHub)
+print(f"🧪 Fake GitHub API on http://localhost:{args.port} ({args.limit} requests/{args.window}s per token)")
+server.serve_forever()
@@ -0,0 +1,43 @@
+# post_webhook.py
+
+import argparse
+import hashlib
+import hmac
+import os
+import uuid
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Send a fixture payload to a running `python main.py serve`, signed the way
+# GitHub signs webhook deliveries, to test the service end to end:
+#
+#   python sample_flows/post_webhook.py sample_flows/webhooks/workflow_run_failed.json
+#
+# Edit the repository and run ID in the fixture to point at a real failed run.
+
+parser = argparse.ArgumentParser(description="Post a workflow_run fixture to the healing service")
+parser.add_argument("payload", help="JSON payload file")
+parser.add_argument("--url", default="http://localhost:8080/webhook")
+parser.add_argument("--event", default="workflow_run", help="X-GitHub-Event header")
+args = parser.parse_args()
+
+with open(args.payload, "rb") as f:
+    body = f.read()
+
+headers = {
+    "Content-Type": "application/json",
+    "X-GitHub-Event": args.event,
+    "X-GitHub-Delivery": str(uuid.uuid4()),
+}
+
+# Sign with the same secret the service verifies against
+secret = os.getenv("WEBHOOK_SECRET")
+if secret:
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    headers["X-Hub-Signature-256"] = f"sha256={digest}"
+
+response = requests.post(args.url, data=body, headers=headers, timeout=10)
+print(response.status_code, response.text)
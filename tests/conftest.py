@@ -0,0 +1,79 @@
+# tests/conftest.py
+
+import itertools
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import pytest
+
+from bench.corpus import Fixture, load_fixtures
+from bench.fake_github import FakeGitHubAPI
+from bench.run import configure_environment
+
+# The agent and tools read their settings from the environment at import
+# time, so the fake GitHub API and a scratch directory are set up before
+# any test module imports them
+WORKDIR = tempfile.mkdtemp(prefix="healer-tests-")
+GIT_ROOT = os.path.join(WORKDIR, "remotes")
+API = FakeGitHubAPI(git_root=GIT_ROOT).start()
+configure_environment(API.url, WORKDIR, GIT_ROOT, reproduce=False)
+
+_repo_numbers = itertools.count(1)
+
+
+def pytest_unconfigure(config):
+    API.stop()
+
+
+def make_fixture(
+    files: Dict[str, str],
+    log: Optional[List[str]] = None,
+    run_id: str = "1001",
+    workflow: str = ".github/workflows/ci.yml",
+) -> Fixture:
+    """A one-job failed run of a repository holding `files`."""
+    log = log or ["Traceback (most recent call last):", "NameError: name 'x' is not defined"]
+    return Fixture(
+        name="test",
+        description="",
+        run_id=run_id,
+        workflow=workflow,
+        marker=log[-1],
+        jobs=[{"name": "test", "failed_step": "Run tests", "log": log}],
+        files=files,
+        llm={},
+        expected={},
+    )
+
+
+def fixed_state(repo_name: str, run_id: str = "1001") -> dict:
+    """A heal's state just before `apply_fix`, fixing make_fixture's default error in app/main.py."""
+    from agent.blob_store import put_blob
+    from agent.state import new_state
+
+    return {
+        **new_state(repo_name, run_id),
+        "failed_file": "app/main.py",
+        "error_analysis": "x is not defined",
+        "fix_explanation": "Define x",
+        "proposed_patch": "--- a/app/main.py\n+++ b/app/main.py\n@@ -1 +1 @@\n-print(x)\n+print(1)\n",
+        "fix_refs": {"app/main.py": put_blob("print(1)\n")},
+    }
+
+
+@pytest.fixture
+def api() -> FakeGitHubAPI:
+    return API
+
+
+@pytest.fixture
+def repo_name() -> str:
+    """A repository name no other test uses (the caches are shared)."""
+    return f"tests/repo-{next(_repo_numbers)}"
+
+
+@pytest.fixture(scope="session")
+def fixtures() -> Dict[str, Fixture]:
+    """The benchmark's recorded failures by name."""
+    return {fixture.name: fixture for fixture in load_fixtures()}
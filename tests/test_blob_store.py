@@ -0,0 +1,59 @@
+# tests/test_blob_store.py
+
+import os
+import time
+
+import pytest
+
+from agent.blob_store import BlobStore
+
+
+def _age(store: BlobStore, digest: str, seconds: float):
+    then = time.time() - seconds
+    os.utime(store._file(digest), (then, then))
+
+
+def test_gc_deletes_blobs_unused_for_max_age(tmp_path):
+    store = BlobStore(str(tmp_path), memory_bytes=0, max_age=3600)
+    old, recent = store.put("old log"), store.put("recent log")
+    _age(store, old, 7200)
+
+    assert store.gc() == 1
+    with pytest.raises(KeyError):
+        store.get(old)
+    assert store.get(recent) == "recent log"
+
+
+def test_gc_keeps_the_store_under_max_bytes(tmp_path):
+    store = BlobStore(str(tmp_path), memory_bytes=0)
+    digests = [store.put(f"log {n}\n" * 1000) for n in range(4)]
+    for age, digest in zip([40, 30, 20, 10], digests):
+        _age(store, digest, age)
+    size = os.path.getsize(store._file(digests[0]))
+    store.max_bytes = size * 2
+
+    assert store.gc() == 2
+    assert [os.path.exists(store._file(digest)) for digest in digests] == [False, False, True, True]
+
+
+def test_reading_or_storing_a_blob_again_keeps_it(tmp_path):
+    store = BlobStore(str(tmp_path), memory_bytes=0, max_age=3600)
+    read, stored = store.put("read"), store.put("stored")
+    _age(store, read, 7200)
+    _age(store, stored, 7200)
+
+    store.get(read)
+    store.put("stored")
+
+    assert store.gc() == 0
+
+
+def test_writes_trigger_gc(tmp_path):
+    store = BlobStore(str(tmp_path), memory_bytes=0, max_age=3600, gc_interval=2)
+    old = store.put("old")
+    _age(store, old, 7200)
+
+    store.put("second")
+    assert os.path.exists(store._file(old))
+    store.put("third")
+    assert not os.path.exists(store._file(old))
@@ -0,0 +1,43 @@
+# tests/test_code_fixer.py
+
+import pytest
+
+from tools.code_fixer import PatchError, apply_patch
+
+
+def _apply(patch: str, content: str) -> str:
+    return apply_patch(patch, {"f.txt": content}, "f.txt")["f.txt"]
+
+
+def test_insertion_goes_after_the_named_line():
+    assert _apply("@@ -2,0 +3 @@\n+X\n", "a\nb\nc\n") == "a\nb\nX\nc\n"
+
+
+def test_insertion_at_the_top_and_bottom():
+    assert _apply("@@ -0,0 +1 @@\n+X\n", "a\nb\n") == "X\na\nb\n"
+    assert _apply("@@ -2,0 +3 @@\n+X\n", "a\nb\n") == "a\nb\nX\n"
+
+
+def test_insertion_after_an_earlier_hunk_moved_the_lines():
+    patch = "@@ -1 +1,2 @@\n-a\n+a1\n+a2\n@@ -3,0 +4 @@\n+X\n"
+    assert _apply(patch, "a\nb\nc\nd\n") == "a1\na2\nb\nc\nX\nd\n"
+
+
+def test_shifted_hunk_is_found_near_its_line():
+    assert _apply("@@ -1,2 +1,2 @@\n b\n-c\n+C\n", "a\nb\nc\n") == "a\nb\nC\n"
+
+
+def test_hunk_that_matches_nothing_is_rejected():
+    with pytest.raises(PatchError):
+        _apply("@@ -1 +1 @@\n-something else entirely\n+x\n", "a\nb\nc\n")
+
+
+def test_removed_and_added_lines_that_look_like_file_headers():
+    patch = (
+        "--- a/f.sql\n+++ b/f.sql\n@@ -1,2 +1,2 @@\n"
+        "--- old comment\n+++ new comment\n SELECT 1;\n"
+        "diff --git a/g.sql b/g.sql\n--- a/g.sql\n+++ b/g.sql\n@@ -1 +1 @@\n-SELECT 2;\n+SELECT 3;\n"
+    )
+    files = {"f.sql": "-- old comment\nSELECT 1;\n", "g.sql": "SELECT 2;\n"}
+
+    assert apply_patch(patch, files, "f.sql") == {"f.sql": "++ new comment\nSELECT 1;\n", "g.sql": "SELECT 3;\n"}
@@ -0,0 +1,93 @@
+# tests/test_commit_files.py
+
+from conftest import make_fixture
+
+from tools.github_tools import create_branch_with_files
+
+FILES = {"app/main.py": "print(1)\n", "requirements.txt": "requests==2.32.3\n"}
+WRITES = [
+    "POST /repos/{repo}/git/blobs",
+    "POST /repos/{repo}/git/trees",
+    "POST /repos/{repo}/git/commits",
+    "POST /repos/{repo}/git/refs",
+    "PATCH /repos/{repo}/git/refs/heads/{branch}",
+]
+
+
+def _commit(repo_name: str, files: dict) -> str:
+    return create_branch_with_files.invoke(
+        {"repo_name": repo_name, "files": files, "branch_name": "auto-fix-1001", "commit_message": "Fix"}
+    )
+
+
+def _writes(api) -> dict:
+    return {route: api.calls[route] for route in WRITES}
+
+
+def _repo(api, repo_name: str):
+    api.add_repo(repo_name, make_fixture({"app/main.py": "print(x)\n", "requirements.txt": "requests\n"}))
+
+
+def test_commits_every_file_in_one_commit(api, repo_name):
+    _repo(api, repo_name)
+    before = _writes(api)
+
+    assert _commit(repo_name, FILES).startswith("✓ Created branch")
+
+    assert api.branch_files(repo_name, "auto-fix-1001") == FILES
+    after = _writes(api)
+    assert [after[route] - before[route] for route in WRITES] == [2, 1, 1, 1, 0]
+
+
+def test_committing_the_same_files_again_writes_nothing(api, repo_name):
+    _repo(api, repo_name)
+    _commit(repo_name, FILES)
+    before = _writes(api)
+
+    assert _commit(repo_name, FILES).startswith("✓ Branch 'auto-fix-1001' already has the changes")
+
+    assert _writes(api) == before
+
+
+def test_new_content_updates_the_branch(api, repo_name):
+    _repo(api, repo_name)
+    _commit(repo_name, FILES)
+
+    assert _commit(repo_name, {"app/main.py": "print(2)\n"}).startswith("✓ Updated branch")
+
+    assert api.branch_files(repo_name, "auto-fix-1001") == {**FILES, "app/main.py": "print(2)\n"}
+
+
+def test_a_failed_commit_leaves_no_branch_and_can_be_retried(api, repo_name):
+    _repo(api, repo_name)
+    api.fail_next("POST /repos/{repo}/git/commits")
+
+    assert _commit(repo_name, FILES).startswith("Error")
+    assert api.branch_files(repo_name, "auto-fix-1001") is None
+
+    assert _commit(repo_name, FILES).startswith("✓ Created branch")
+    assert api.branch_files(repo_name, "auto-fix-1001") == FILES
+
+
+def test_a_failed_blob_upload_stops_before_the_tree(api, repo_name):
+    _repo(api, repo_name)
+    api.fail_next("POST /repos/{repo}/git/blobs")
+    before = _writes(api)
+
+    assert _commit(repo_name, FILES).startswith("Error")
+
+    after = _writes(api)
+    assert after["POST /repos/{repo}/git/trees"] == before["POST /repos/{repo}/git/trees"]
+    assert api.branch_files(repo_name, "auto-fix-1001") is None
+
+
+def test_a_failed_branch_update_keeps_the_old_head_until_retried(api, repo_name):
+    _repo(api, repo_name)
+    _commit(repo_name, FILES)
+    api.fail_next("PATCH /repos/{repo}/git/refs/heads/{branch}")
+
+    assert _commit(repo_name, {"app/main.py": "print(2)\n"}).startswith("Error")
+    assert api.branch_files(repo_name, "auto-fix-1001") == FILES
+
+    assert _commit(repo_name, {"app/main.py": "print(2)\n"}).startswith("✓ Updated branch")
+    assert api.branch_files(repo_name, "auto-fix-1001")["app/main.py"] == "print(2)\n"
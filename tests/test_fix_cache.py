@@ -0,0 +1,50 @@
+# tests/test_fix_cache.py
+
+from conftest import fixed_state, make_fixture
+
+from agent.fix_cache import CLOSED, MERGED, OPEN, FixCache, cache_key, get_fix_cache
+from agent.fix_index import pr_number
+from agent.graph import apply_fix_node, create_pr_node, lookup_fix_node
+
+FIX = {"failed_file": "app/main.py", "error_analysis": "", "proposed_patch": "", "fix_explanation": ""}
+
+
+def test_merged_fixes_are_kept_and_closed_ones_dropped():
+    cache = FixCache(":memory:")
+    cache.put(cache_key("o/a", "1"), {**FIX, "status": OPEN, "pr_number": 7})
+    cache.put(cache_key("o/a", "2"), {**FIX, "status": OPEN, "pr_number": 8})
+    cache.put(cache_key("o/ab", "3"), {**FIX, "status": OPEN, "pr_number": 7})
+
+    assert cache.open_prs() == [("o/a", 7), ("o/a", 8), ("o/ab", 7)]
+    assert cache.set_status("o/a", 7, MERGED) == 1
+    assert cache.set_status("o/a", 8, CLOSED) == 1
+
+    assert cache.get(cache_key("o/a", "1"))["status"] == MERGED
+    assert cache.get(cache_key("o/a", "2")) is None
+    assert cache.get(cache_key("o/ab", "3"))["status"] == OPEN
+    assert cache.open_prs() == [("o/ab", 7)]
+
+
+def test_a_fix_is_only_reused_once_its_pr_is_merged(api, repo_name):
+    api.add_repo(repo_name, make_fixture({"app/main.py": "print(x)\n"}))
+    state = {**fixed_state(repo_name), "error_fingerprint": "f" * 32}
+    state.update(apply_fix_node(state))
+    update = create_pr_node(state)
+
+    key = cache_key(repo_name, state["error_fingerprint"])
+    assert get_fix_cache().get(key)["status"] == OPEN
+    assert lookup_fix_node(state) == {"fix_cache_hit": False}
+
+    get_fix_cache().set_status(repo_name, pr_number(update["pr_url"]), MERGED)
+    assert lookup_fix_node(state)["fix_cache_hit"] is True
+
+
+def test_a_fix_whose_pr_was_closed_is_forgotten(api, repo_name):
+    api.add_repo(repo_name, make_fixture({"app/main.py": "print(x)\n"}))
+    state = {**fixed_state(repo_name), "error_fingerprint": "e" * 32}
+    state.update(apply_fix_node(state))
+    update = create_pr_node(state)
+
+    get_fix_cache().set_status(repo_name, pr_number(update["pr_url"]), CLOSED)
+
+    assert get_fix_cache().get(cache_key(repo_name, state["error_fingerprint"])) is None
@@ -0,0 +1,26 @@
+# tests/test_fix_validator.py
+
+from tools.fix_validator import validate_file
+
+WORKFLOW = """\
+on: [push]
+jobs:
+  test:
+    runs-on: ubuntu-latest
+    steps:
+      - run: pytest
+"""
+
+
+def test_a_multi_document_manifest_is_valid():
+    manifest = "apiVersion: v1\nkind: Service\n---\napiVersion: apps/v1\nkind: Deployment\n"
+
+    assert validate_file("k8s/deploy.yaml", manifest) == []
+    assert validate_file("k8s/deploy.yaml", "a: 1\n---\nb: [2\n") != []
+
+
+def test_a_workflow_is_one_document():
+    assert validate_file(".github/workflows/ci.yml", WORKFLOW) == []
+    assert validate_file(".github/workflows/ci.yml", WORKFLOW + "---\n" + WORKFLOW) == [
+        ".github/workflows/ci.yml: a workflow must be a single YAML document"
+    ]
@@ -0,0 +1,29 @@
+# tests/test_github_tools.py
+
+from conftest import make_fixture
+
+from tools.github_tools import get_file_content, list_repo_files, read_file
+
+
+def test_read_file_uses_the_default_branch(api, repo_name):
+    api.add_repo(repo_name, make_fixture({"app/main.py": "print('hi')\n"}), default_branch="trunk")
+
+    assert read_file(repo_name, "app/main.py") == "print('hi')\n"
+    assert "print('hi')" in get_file_content.invoke({"repo_name": repo_name, "file_path": "app/main.py"})
+    assert list_repo_files(repo_name) == {"app/main.py"}
+
+
+def test_read_file_at_a_branch(api, repo_name):
+    api.add_repo(repo_name, make_fixture({"README.md": "trunk\n"}), default_branch="trunk")
+
+    assert read_file(repo_name, "README.md", "trunk") == "trunk\n"
+    assert read_file(repo_name, "missing.txt") is None
+
+
+def test_binary_files_are_not_text(api, repo_name):
+    api.add_repo(repo_name, make_fixture({"logo.png": b"\x89PNG\r\n\x1a\n\xff\xfe"}))
+
+    assert read_file(repo_name, "logo.png") is None
+    assert get_file_content.invoke({"repo_name": repo_name, "file_path": "logo.png"}) == (
+        "Error: logo.png is not a UTF-8 text file"
+    )
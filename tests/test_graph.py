@@ -0,0 +1,63 @@
+# tests/test_graph.py
+
+from conftest import fixed_state, make_fixture
+
+from agent.graph import FIX_CANDIDATES, apply_fix_node, create_pr_node, route_after_apply
+from agent.llm_router import set_router
+from agent.single_flight import heal_coalesced
+from agent.token_budget import RUN_TOKEN_BUDGET
+from bench.fake_llm import fixture_router
+
+
+def test_opens_the_pr_against_the_default_branch(api, repo_name):
+    api.add_repo(repo_name, make_fixture({"app/main.py": "print(x)\n"}), default_branch="trunk")
+    state = fixed_state(repo_name)
+
+    state.update(apply_fix_node(state))
+    assert route_after_apply(state) == "create_pr"
+    update = create_pr_node(state)
+
+    assert update["success"] is True
+    assert update["current_step"] == "completed"
+    (pr,) = api.pulls(repo_name)
+    assert pr["base"]["ref"] == "trunk"
+    assert api.branch_files(repo_name, "auto-fix-1001")["app/main.py"] == "print(1)\n"
+
+
+def test_a_failed_pull_request_is_not_a_success(api, repo_name):
+    api.add_repo(repo_name, make_fixture({"app/main.py": "print(x)\n"}))
+    # The fake refuses a PR whose head branch does not exist
+    state = {**fixed_state(repo_name), "branch_name": "auto-fix-missing"}
+
+    update = create_pr_node(state)
+
+    assert update == {"pr_url": None, "success": False, "current_step": "pr_failed"}
+    assert api.pulls(repo_name) == []
+
+
+def test_no_pull_request_when_the_branch_was_not_written(api, repo_name):
+    # Never added to the fake: every write answers 404
+    state = fixed_state(repo_name)
+
+    state.update(apply_fix_node(state))
+
+    assert state["current_step"] == "apply_failed"
+    assert route_after_apply(state) == "give_up"
+
+
+def test_a_heal_with_the_default_settings_makes_one_candidate_per_round(api, repo_name, fixtures):
+    # Best-of-N is opt-in
+    assert FIX_CANDIDATES == 1
+
+    api.add_repo(repo_name, fixtures["name_error"])
+    set_router(fixture_router([fixtures["name_error"]]))
+    try:
+        final_state = heal_coalesced(repo_name, fixtures["name_error"].run_id)
+    finally:
+        set_router(None)
+
+    assert final_state["success"] is True
+    assert len(final_state["fix_candidates"]) == 1
+    assert final_state["ranked_candidates"] == [0]
+    used = sum(usage["prompt_tokens"] + usage["completion_tokens"] for usage in final_state["token_usage"].values())
+    assert used <= RUN_TOKEN_BUDGET
@@ -0,0 +1,111 @@
+# tests/test_llm_router.py
+
+import threading
+import time
+
+import pytest
+
+from agent import metrics
+from agent.llm_router import FakeChatModel, LLMOverloadedError, LLMRouter, Tier
+
+
+def _tiers(concurrency: int = 4, queue_timeout: float = 5.0):
+    return [
+        Tier("primary", "big", concurrency, timeout=60, queue_timeout=queue_timeout, fallback="backup"),
+        Tier("backup", "small", concurrency, timeout=60, queue_timeout=queue_timeout),
+    ]
+
+
+def _router(replies: dict, **tier_options) -> LLMRouter:
+    """A router whose tiers answer with `replies[tier]`: a string, or an exception to raise."""
+
+    def respond(tier: str, prompt: str) -> str:
+        reply = replies[tier]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    return LLMRouter(
+        _tiers(**tier_options), lambda tier: FakeChatModel(lambda prompt: respond(tier.name, prompt), chunk_chars=2)
+    )
+
+
+def _text(router: LLMRouter, tier: str = "primary") -> str:
+    return "".join(chunk.content for chunk in router.stream(tier, "prompt"))
+
+
+def _counter(name: str) -> int:
+    return metrics.get_counters("llm.").get(name, 0)
+
+
+def test_overloaded_tier_falls_back():
+    router = _router({"primary": LLMOverloadedError("rate limited"), "backup": "from backup"})
+    fallbacks = _counter("llm.primary.fallbacks")
+
+    assert _text(router) == "from backup"
+    assert _counter("llm.primary.fallbacks") == fallbacks + 1
+
+
+def test_other_errors_do_not_fall_back():
+    router = _router({"primary": ValueError("bad request"), "backup": "from backup"})
+
+    with pytest.raises(ValueError):
+        _text(router)
+    assert router.model("backup").prompts == []
+
+
+def test_no_fallback_once_output_was_streamed():
+    class CutOff:
+        def stream(self, prompt, **options):
+            from langchain_core.messages import AIMessageChunk
+
+            yield AIMessageChunk(content="partial")
+            raise ConnectionError("connection reset")
+
+    router = LLMRouter(_tiers(), lambda tier: CutOff() if tier.name == "primary" else FakeChatModel(lambda p: "x"))
+
+    with pytest.raises(ConnectionError):
+        _text(router)
+    assert router.model("backup").prompts == []
+
+
+def test_every_tier_overloaded():
+    router = _router({"primary": TimeoutError(), "backup": LLMOverloadedError("busy")})
+
+    with pytest.raises(LLMOverloadedError, match="tried primary, backup"):
+        _text(router)
+
+
+def test_a_busy_tier_falls_back_and_frees_its_slot_when_the_caller_stops_reading():
+    router = _router({"primary": "from primary", "backup": "from backup"}, concurrency=1, queue_timeout=0.05)
+
+    held = router.stream("primary", "prompt")
+    next(held)  # Holds primary's only slot
+    assert _text(router) == "from backup"
+
+    held.close()
+    assert _text(router) == "from primary"
+
+
+def test_concurrency_is_limited_per_tier():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def respond(prompt: str) -> str:
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return "ok"
+
+    router = LLMRouter(_tiers(concurrency=2), lambda tier: FakeChatModel(respond))
+    threads = [threading.Thread(target=_text, args=(router,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert len(router.model("primary").prompts) == 6
@@ -0,0 +1,82 @@
+# tests/test_reproduce.py
+
+import os
+import subprocess
+
+import pytest
+from conftest import GIT_ROOT, make_fixture
+
+from agent import graph
+from agent.blob_store import put_blob
+from agent.graph import extract_errors_node, fetch_logs_node, prepare_state, reproduce_fix_node
+from agent.state import new_state
+
+WORKFLOW = """\
+name: CI
+on: [push]
+jobs:
+  test:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - name: Run tests
+        run: python app/main.py
+"""
+
+
+def _candidate(content: str) -> dict:
+    return {
+        "index": 0,
+        "patch": "--- a/app/main.py\n+++ b/app/main.py\n@@ -1 +1 @@\n-print(x)\n+" + content,
+        "refs": {"app/main.py": put_blob(content)},
+        "explanation": "Define x",
+    }
+
+
+@pytest.fixture
+def failed_run(api, repo_name, monkeypatch):
+    """A run of a bare repository whose `Run tests` step fails here too, as fetched by the graph itself."""
+    monkeypatch.setattr(graph, "REPRO_ENABLED", True)
+    api.add_repo(repo_name, make_fixture({"app/main.py": "print(x)\n", ".github/workflows/ci.yml": WORKFLOW}))
+    state = new_state(repo_name, "1001")
+    state.update(fetch_logs_node(state))
+    state.update(extract_errors_node(state))
+    return state
+
+
+def test_fetch_logs_records_the_run_head_sha(failed_run):
+    git_dir = os.path.join(GIT_ROOT, failed_run["repo_name"] + ".git")
+    head_sha = subprocess.run(
+        ["git", "--git-dir", git_dir, "rev-parse", "HEAD"], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+    assert failed_run["head_sha"] == head_sha
+    assert prepare_state(new_state(failed_run["repo_name"], "1001"))["head_sha"] == head_sha
+
+
+def test_reproduces_the_failure_at_the_run_head(failed_run):
+    state = {**failed_run, "fix_candidates": [_candidate("print(1)\n")], "ranked_candidates": [0]}
+
+    update = reproduce_fix_node(state)
+
+    assert update["reproduction"]["status"] == "verified"
+    assert update["current_step"] == "fix_verified"
+
+
+def test_a_fix_that_still_fails_goes_back(failed_run):
+    state = {**failed_run, "fix_candidates": [_candidate("print(y)\n")], "ranked_candidates": [0]}
+
+    update = reproduce_fix_node(state)
+
+    assert update["reproduction"]["status"] == "failed"
+    assert "still fails" in update["validation_errors"][0]
+
+
+def test_an_unknown_head_sha_skips_reproduction(failed_run):
+    # A state checkpointed before fetch_logs recorded the head SHA
+    state = {**failed_run, "head_sha": "", "fix_candidates": [_candidate("print(1)\n")], "ranked_candidates": [0]}
+
+    update = reproduce_fix_node(state)
+
+    assert update["reproduction"] == {"status": "skipped", "detail": "the run's head commit is unknown"}
+    assert update["validation_errors"] == []
@@ -0,0 +1,58 @@
+# tests/test_scan.py
+
+import io
+import json
+
+import pytest
+
+from agent.llm_router import set_router
+from agent.scan import run_scan
+from bench.fake_llm import fixture_router
+
+
+@pytest.fixture
+def answer_with(fixtures):
+    """Make the LLM answer with the name_error fixture's replies, or with a fix that does not compile."""
+
+    def answer(fix_compiles: bool = True):
+        fixture = fixtures["name_error"]
+        if not fix_compiles:
+            fix = fixture.llm["fix"]
+            patch = fix["patch"].replace("+    return round(total, 2)", "+    return round(total, 2")
+            fixture = fixture._replace(llm={**fixture.llm, "fix": {**fix, "patch": patch}})
+        set_router(fixture_router([fixture]))
+
+    yield answer
+    set_router(None)
+
+
+def _scan(repo_name: str) -> dict:
+    output = io.StringIO()
+    run_scan([repo_name], output)
+    (record,) = [json.loads(line) for line in output.getvalue().splitlines()]
+    return record
+
+
+def test_a_scanned_run_is_healed_without_fetching_its_logs_again(api, repo_name, fixtures, answer_with):
+    api.add_repo(repo_name, fixtures["name_error"])
+    answer_with()
+    downloads = api.calls["GET {log download}"]
+
+    record = _scan(repo_name)
+
+    assert record["success"] is True
+    assert api.calls["GET {log download}"] - downloads == 1
+
+
+def test_a_heal_that_ended_without_a_fix_is_retried_by_the_next_scan(api, repo_name, fixtures, answer_with):
+    api.add_repo(repo_name, fixtures["name_error"])
+    answer_with(fix_compiles=False)
+    assert _scan(repo_name)["current_step"] == "validation_failed"
+
+    answer_with()
+    record = _scan(repo_name)
+
+    assert record["success"] is True
+    assert api.branch_files(repo_name, f"auto-fix-{record['run_id']}")["app/billing.py"] == (
+        fixtures["name_error"].expected["app/billing.py"]
+    )
@@ -0,0 +1,178 @@
+# tests/test_service.py
+
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import sqlite3
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+from github import GithubException
+
+from agent.service import MAX_PAYLOAD_BYTES, HealingService, HealQueue
+
+SECRET = "test-secret"
+WEBHOOKS = os.path.join(os.path.dirname(__file__), "..", "sample_flows", "webhooks")
+
+
+def _payload(name: str, **run) -> bytes:
+    with open(os.path.join(WEBHOOKS, name)) as f:
+        payload = json.load(f)
+    payload["workflow_run"].update(run)
+    return json.dumps(payload).encode()
+
+
+def _post(service: HealingService, body: bytes, event: str = "workflow_run", secret: str = SECRET):
+    signature = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{service.port}/webhook",
+        data=body,
+        headers={"X-GitHub-Event": event, "X-Hub-Signature-256": signature, "Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def _wait_for(queue: HealQueue, **counts):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if all(queue.counts()[status] == n for status, n in counts.items()):
+            return
+        time.sleep(0.02)
+    raise AssertionError(f"queue counts {queue.counts()}, wanted {counts}")
+
+
+@pytest.fixture
+def heals():
+    """What the service's heal function returns (or raises), in order, and the calls it got."""
+    return {"results": [], "calls": []}
+
+
+@pytest.fixture
+def service(heals):
+    def heal(repo_name, run_id, resume=False):
+        heals["calls"].append((repo_name, run_id, resume))
+        result = heals["results"].pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    service = HealingService(
+        host="127.0.0.1", port=0, workers=1, queue=HealQueue(":memory:", retry_delay=0), secret=SECRET, heal=heal
+    )
+    service.start()
+    yield service
+    service.stop()
+
+
+def test_refuses_to_start_without_a_secret():
+    with pytest.raises(ValueError, match="WEBHOOK_SECRET"):
+        HealingService(port=0, queue=HealQueue(":memory:"), secret="")
+
+    service = HealingService(port=0, queue=HealQueue(":memory:"), secret="", insecure=True)
+    try:
+        assert service.server.server_address[0] == "127.0.0.1"
+    finally:
+        service.server.server_close()
+
+
+def test_unsigned_and_wrongly_signed_events_are_rejected(service):
+    body = _payload("workflow_run_failed.json")
+
+    assert _post(service, body, secret="wrong")[0] == 401
+    assert service.queue.counts()["queued"] == 0
+
+
+def _post_headers(service: HealingService, headers: dict) -> int:
+    """Status of a POST that sends only `headers`, without a body."""
+    connection = http.client.HTTPConnection("127.0.0.1", service.port, timeout=5)
+    try:
+        connection.putrequest("POST", "/webhook")
+        for name, value in headers.items():
+            connection.putheader(name, value)
+        connection.endheaders()
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def test_oversized_and_unsized_payloads_are_refused_unread(service):
+    assert _post_headers(service, {"Content-Length": str(MAX_PAYLOAD_BYTES + 1)}) == 413
+    assert _post_headers(service, {}) == 400
+    assert _post_headers(service, {"Content-Length": "lots"}) == 400
+    assert service.queue.counts()["queued"] == 0
+
+
+def test_failed_runs_are_queued_once_per_attempt(service, heals):
+    heals["results"] = [{"success": True}, {"success": True}]
+
+    status, reply = _post(service, _payload("workflow_run_failed.json"))
+    assert (status, reply["status"], reply["run_attempt"]) == (202, "queued", 1)
+    assert _post(service, _payload("workflow_run_failed.json"))[1]["status"] == "duplicate"
+    _wait_for(service.queue, done=1)
+
+    # A re-run keeps the run ID; it is healed again, from scratch
+    assert _post(service, _payload("workflow_run_failed.json", run_attempt=2))[1]["status"] == "queued"
+    _wait_for(service.queue, done=2)
+    assert heals["calls"] == [("myusername/my-failing-project", "1234567890", False)] * 2
+
+
+def test_successful_runs_and_other_events_are_ignored(service):
+    assert _post(service, _payload("workflow_run_succeeded.json"))[1]["status"] == "ignored"
+    assert _post(service, b"{}", event="issues")[1]["status"] == "ignored"
+    assert _post(service, b"{}", event="ping")[1]["status"] == "pong"
+
+
+def test_a_heal_that_fails_validation_is_not_retried(service, heals):
+    heals["results"] = [{"success": False, "current_step": "validation_failed"}]
+
+    _post(service, _payload("workflow_run_failed.json"))
+
+    _wait_for(service.queue, failed=1)
+    assert len(heals["calls"]) == 1
+
+
+def test_transient_errors_are_retried_and_resume(service, heals):
+    heals["results"] = [GithubException(502, {"message": "Bad Gateway"}, None), {"success": True}]
+
+    _post(service, _payload("workflow_run_failed.json"))
+
+    _wait_for(service.queue, done=1)
+    assert [resume for _, _, resume in heals["calls"]] == [False, True]
+
+
+def test_other_errors_are_not_retried(service, heals):
+    heals["results"] = [KeyError("head_sha")]
+
+    _post(service, _payload("workflow_run_failed.json"))
+
+    _wait_for(service.queue, failed=1)
+    assert len(heals["calls"]) == 1
+
+
+def test_queues_from_before_run_attempts_are_migrated(tmp_path):
+    path = str(tmp_path / "queue.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE jobs ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT, repo_name TEXT NOT NULL, run_id TEXT NOT NULL,"
+        " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT,"
+        " enqueued REAL NOT NULL, available REAL NOT NULL, started REAL, finished REAL,"
+        " UNIQUE (repo_name, run_id))"
+    )
+    db.execute("INSERT INTO jobs (repo_name, run_id, status, enqueued, available) VALUES ('o/r', '1', 'done', 0, 0)")
+    db.commit()
+    db.close()
+
+    queue = HealQueue(path)
+
+    assert queue.counts()["done"] == 1
+    assert queue.push("o/r", "1") is False
+    assert queue.push("o/r", "1", run_attempt=2) is True
@@ -0,0 +1,63 @@
+# tests/test_single_flight.py
+
+import threading
+
+import pytest
+
+from agent.single_flight import SingleFlight
+
+
+def _flight() -> SingleFlight:
+    return SingleFlight(window=300, succeeded=lambda result: result["success"])
+
+
+def test_concurrent_callers_share_one_call():
+    flight = _flight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def heal():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"success": True}
+
+    leader = threading.Thread(target=flight.do, args=("key", heal))
+    leader.start()
+    started.wait(5)
+    follower = []
+    waiting = threading.Thread(target=lambda: follower.append(flight.do("key", heal)))
+    waiting.start()
+    release.set()
+    leader.join()
+    waiting.join()
+
+    assert calls == [1]
+    assert follower == [{"success": True}]
+
+
+def test_successes_are_remembered():
+    flight = _flight()
+    results = iter([{"success": True}, {"success": False}])
+
+    assert flight.do("key", lambda: next(results)) == {"success": True}
+    assert flight.do("key", lambda: next(results)) == {"success": True}
+
+
+def test_failures_are_not_remembered():
+    flight = _flight()
+    results = iter([{"success": False}, {"success": True}])
+
+    assert flight.do("key", lambda: next(results)) == {"success": False}
+    assert flight.do("key", lambda: next(results)) == {"success": True}
+
+
+def test_errors_are_not_remembered():
+    flight = _flight()
+
+    def heal():
+        raise RuntimeError("GitHub is down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", heal)
+    assert flight.do("key", lambda: {"success": True}) == {"success": True}
@@ -0,0 +1,65 @@
+# tests/test_token_budget.py
+
+from conftest import fixed_state, make_fixture
+
+from agent import graph
+from agent.graph import generate_fix_node, plan_fixes_node, route_fix_candidates
+from agent.llm_router import FakeChatModel, LLMRouter, set_router
+from agent.token_budget import (
+    COMPLETION_RESERVE,
+    MIN_PROMPT_TOKENS,
+    RUN_TOKEN_BUDGET,
+    affordable_calls,
+    min_call_tokens,
+    prompt_budget,
+)
+
+
+def _spent(tokens: int) -> dict:
+    return {"token_usage": {"analyze_error": {"prompt_tokens": tokens, "completion_tokens": 0}}, "fix_attempts": 0}
+
+
+def test_calls_share_what_is_left_minus_the_reserve():
+    state = _spent(RUN_TOKEN_BUDGET - 10000)
+
+    assert prompt_budget(state, "generate_fix") == 10000 - COMPLETION_RESERVE["generate_fix"]
+    assert prompt_budget(state, "generate_fix", calls=2, reserved=2000) == 4000 - COMPLETION_RESERVE["generate_fix"]
+    assert affordable_calls(state, "generate_fix", 5) == 10000 // min_call_tokens("generate_fix")
+    assert affordable_calls(_spent(RUN_TOKEN_BUDGET), "generate_fix", 1) == 0
+
+
+def test_every_round_keeps_a_minimal_prompt_for_the_next(monkeypatch):
+    monkeypatch.setattr(graph, "FIX_CANDIDATES", 3)
+    state = _spent(2000)
+
+    for _ in range(graph.FIX_MAX_ATTEMPTS):
+        update = plan_fixes_node(state)
+        assert update["fix_round_size"] >= 1
+        assert update["fix_prompt_budget"] >= MIN_PROMPT_TOKENS["generate_fix"]
+        # The round spends everything it was given
+        spent = update["fix_round_size"] * (update["fix_prompt_budget"] + COMPLETION_RESERVE["generate_fix"])
+        usage = {**state["token_usage"], f"round {update['fix_attempts']}": {"prompt_tokens": spent}}
+        state = {**state, **update, "token_usage": {k: {"completion_tokens": 0, **v} for k, v in usage.items()}}
+
+
+def test_an_exhausted_budget_ends_the_heal_without_a_prompt():
+    state = {**_spent(RUN_TOKEN_BUDGET - 100), "fix_attempts": 1}
+
+    update = plan_fixes_node(state)
+
+    assert update["current_step"] == "validation_failed"
+    assert route_fix_candidates({**state, **update}) == "give_up"
+
+
+def test_a_failed_candidate_still_counts_its_tokens(api, repo_name):
+    api.add_repo(repo_name, make_fixture({"app/main.py": "print(x)\n"}))
+    state = {**fixed_state(repo_name), "error_excerpt": "NameError: name 'x' is not defined"}
+    state.update(plan_fixes_node(state))
+    set_router(LLMRouter(factory=lambda tier: FakeChatModel(lambda prompt: "not JSON")))
+    try:
+        update = generate_fix_node({**state, "candidate": 0})
+    finally:
+        set_router(None)
+
+    assert "error" in update["fix_candidates"][0]
+    assert update["token_usage"]["generate_fix"]["prompt_tokens"] > 0
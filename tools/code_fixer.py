@@ -0,0 +1,225 @@
+# tools/code_fixer.py
+
+import difflib
+import re
+from typing import Dict, List, Optional
+
+# "@@ -12,7 +12,8 @@ optional section header"
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# How similar a block of lines must be to count as a fuzzy match
+FUZZY_THRESHOLD = 0.8
+
+
+class PatchError(ValueError):
+    """A patch could not be parsed or applied."""
+
+
+class Hunk:
+    """One @@ section of a unified diff."""
+
+    def __init__(self, old_start: int):
+        self.old_start = old_start  # 1-based, as written in the header
+        self.ops: List[tuple] = []  # (" " | "-" | "+", text) in diff order
+
+    @property
+    def old(self) -> List[str]:
+        """Context and removed lines, i.e. what the file should contain."""
+        return [text for tag, text in self.ops if tag != "+"]
+
+    def replacement(self, actual: List[str]) -> List[str]:
+        """
+        New lines for the block `actual` this hunk was matched against.
+
+        Context lines are taken from the file rather than the diff, so a
+        fuzzy match does not rewrite lines the model merely misquoted.
+        """
+        lines, index = [], 0
+        for tag, text in self.ops:
+            if tag == "+":
+                lines.append(text)
+                continue
+            if tag == " ":
+                lines.append(actual[index])
+            index += 1
+        return lines
+
+
+def _strip_prefix(path: str) -> str:
+    path = path.split("\t")[0].strip()
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+def parse_unified_diff(patch: str, default_path: str = "") -> Dict[str, List[Hunk]]:
+    """
+    Parse a unified diff into hunks per file.
+
+    Hunk line counts in the headers do not end a hunk (models often get
+    them wrong); a hunk simply runs until the next header. They only decide
+    whether a "--- "/"+++ " line is a file header or a removed "-- ..." /
+    added "++ ..." line: it is a header once the open hunk's counts are
+    used up (or a "diff " line closed it). A diff without ---/+++ lines is
+    taken to be for `default_path`.
+
+    Returns:
+        Mapping of file path to its hunks; a new file maps to hunks with
+        `old_start == 0`
+    """
+    files: Dict[str, List[Hunk]] = {}
+    path = default_path
+    hunk: Optional[Hunk] = None
+    old_path = None
+    old_left = new_left = 0  # Lines the open hunk's header still announces
+
+    for line in patch.splitlines():
+        in_hunk = old_left > 0 or new_left > 0
+        if line.startswith("diff "):
+            # "diff --git": the next file's preamble, whatever the counts said
+            hunk, old_left, new_left = None, 0, 0
+            continue
+        if line.startswith("--- ") and not in_hunk:
+            old_path = _strip_prefix(line[4:])
+            hunk = None
+            continue
+        if line.startswith("+++ ") and not in_hunk:
+            new_path = _strip_prefix(line[4:])
+            path = old_path if new_path == "/dev/null" else new_path
+            files.setdefault(path, [])
+            hunk = None
+            continue
+
+        header = HUNK_HEADER.match(line)
+        if header:
+            hunk = Hunk(int(header.group(1)))
+            files.setdefault(path, []).append(hunk)
+            old_left = int(header.group(2) or 1)
+            new_left = int(header.group(4) or 1)
+            continue
+
+        if hunk is None or line.startswith("\\"):
+            continue  # Preamble ("index ...") or "\ No newline"
+
+        tag, text = (line[:1], line[1:]) if line else (" ", "")
+        if tag not in " -+":
+            # Models sometimes drop the leading space on context lines
+            tag, text = " ", line
+        hunk.ops.append((tag, text))
+        old_left -= tag != "+"
+        new_left -= tag != "-"
+
+    if not any(files.values()):
+        raise PatchError("no hunks found in patch")
+    if "" in files:
+        raise PatchError("patch has hunks but no file name")
+
+    return files
+
+
+def _matches(lines: List[str], pos: int, block: List[str], normalize) -> bool:
+    if pos < 0 or pos + len(block) > len(lines):
+        return False
+    return all(normalize(a) == normalize(b) for a, b in zip(lines[pos : pos + len(block)], block))
+
+
+def _locate(lines: List[str], block: List[str], expected: int) -> int:
+    """
+    Find where `block` occurs in `lines`, preferring positions near `expected`.
+
+    Tries an exact match, then one that ignores whitespace differences, then
+    the most similar block of lines (difflib ratio >= FUZZY_THRESHOLD).
+    """
+    # Candidate positions ordered by distance from where the hunk claims to be
+    order = sorted(range(len(lines) - len(block) + 1), key=lambda pos: (abs(pos - expected), pos))
+
+    for normalize in (lambda s: s, lambda s: " ".join(s.split())):
+        for pos in order:
+            if _matches(lines, pos, block, normalize):
+                return pos
+
+    best, best_ratio = -1, FUZZY_THRESHOLD
+    wanted = "\n".join(line.strip() for line in block)
+    for pos in order:
+        candidate = "\n".join(line.strip() for line in lines[pos : pos + len(block)])
+        matcher = difflib.SequenceMatcher(None, wanted, candidate, autojunk=False)
+        # Cheap upper bounds first; the full ratio is expensive
+        if matcher.real_quick_ratio() <= best_ratio or matcher.quick_ratio() <= best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best, best_ratio = pos, ratio
+
+    if best < 0:
+        raise PatchError("hunk does not match the file:\n" + "\n".join(block[:5]))
+    return best
+
+
+def apply_hunks(content: str, hunks: List[Hunk]) -> str:
+    """
+    Apply hunks to `content`, tolerating shifted line numbers, whitespace
+    differences and slightly wrong context lines.
+    """
+    lines = content.splitlines()
+    trailing_newline = content.endswith("\n") or not content
+    offset = 0  # How far earlier hunks moved the following lines
+
+    for hunk in hunks:
+        expected = max(hunk.old_start - 1 + offset, 0)
+        old = hunk.old
+
+        if not old:
+            # Pure insertion: nothing to match, trust the line number. An
+            # empty old range names the line to insert after (0: the top)
+            pos = min(max(hunk.old_start + offset, 0), len(lines))
+        else:
+            pos = _locate(lines, old, expected)
+
+        new = hunk.replacement(lines[pos : pos + len(old)])
+        lines[pos : pos + len(old)] = new
+        offset += len(new) - len(old)
+
+    result = "\n".join(lines)
+    return result + "\n" if trailing_newline and lines else result
+
+
+def apply_patch(patch: str, originals: Dict[str, Optional[str]], default_path: str) -> Dict[str, str]:
+    """
+    Apply a (possibly multi-file) unified diff.
+
+    Args:
+        patch: Unified diff text
+        originals: Current content of each file the patch may touch (None
+            if the file does not exist yet)
+        default_path: File a diff without ---/+++ headers applies to
+
+    Returns:
+        Mapping of path to new full content for every file the patch changes
+
+    Raises:
+        PatchError: if the patch is malformed or a hunk cannot be located
+    """
+    results = {}
+    for path, hunks in parse_unified_diff(patch, default_path).items():
+        if path not in originals:
+            raise PatchError(f"patch touches {path}, which was not provided")
+        results[path] = apply_hunks(originals[path] or "", hunks)
+    return results
+
+
+def patched_paths(patch: str, default_path: str) -> List[str]:
+    """Files a patch touches (empty if it cannot be parsed)."""
+    try:
+        return list(parse_unified_diff(patch, default_path))
+    except PatchError:
+        return []
+
+
+def make_patch(path: str, old: str, new: str) -> str:
+    """Unified diff between two versions of a file."""
+    return "".join(
+        difflib.unified_diff(
+            old.splitlines(keepends=True),
+            new.splitlines(keepends=True),
+            fromfile=f"a/{path}",
+            tofile=f"b/{path}",
+        )
+    )
@@ -0,0 +1,203 @@
+# tools/context_builder.py
+
+import ast
+import os
+from typing import List, Optional, Tuple
+
+from tools.error_extractor import estimate_tokens
+
+# Default prompt budget for a failed file's content
+DEFAULT_TOKEN_BUDGET = int(os.getenv("FILE_CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Lines kept around a focus line when its enclosing block is too big
+NARROW_WINDOW = 15
+
+Span = Tuple[int, int]  # 1-based, inclusive
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _python_blocks(source: str) -> Optional[Tuple[List[Span], List[Tuple[Span, str]]]]:
+    """
+    Import statements and def/class blocks of a Python module.
+
+    Returns:
+        (import spans, [(block span, kind)]) or None if the file does not parse
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    imports, blocks = [], []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)) and node.col_offset == 0:
+            imports.append((node.lineno, node.end_lineno))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            # Decorators belong to the block
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            kind = "class" if isinstance(node, ast.ClassDef) else "def"
+            blocks.append(((start, node.end_lineno), kind))
+
+    return imports, blocks
+
+
+def _indented_block(lines: List[str], line: int) -> Span:
+    """
+    Block enclosing `line` by indentation: up to the nearest less-indented
+    parent line, down to where the indentation drops back to the parent's.
+
+    Works for YAML, for Python that does not parse, and most other files.
+    """
+    index = min(max(line - 1, 0), len(lines) - 1)
+    while index > 0 and not lines[index].strip():
+        index -= 1
+    own = _indent(lines[index])
+
+    start = index
+    while start > 0:
+        start -= 1
+        if lines[start].strip() and _indent(lines[start]) < own:
+            break
+    parent = _indent(lines[start]) if lines[start].strip() else 0
+
+    end = index
+    while end + 1 < len(lines):
+        following = lines[end + 1]
+        if following.strip() and _indent(following) <= parent:
+            break
+        end += 1
+
+    return start + 1, end + 1
+
+
+def _ancestors(lines: List[str], line: int) -> List[Span]:
+    """Less-indented header lines above `line` (e.g. `jobs:` > `build:` > `steps:`)."""
+    spans = []
+    index = min(line - 1, len(lines) - 1)
+    level = _indent(lines[index]) if lines[index].strip() else 0
+    while index > 0 and level > 0:
+        index -= 1
+        if lines[index].strip() and _indent(lines[index]) < level:
+            spans.append((index + 1, index + 1))
+            level = _indent(lines[index])
+    return spans
+
+
+def _cost(lines: List[str], span: Span) -> int:
+    return estimate_tokens("\n".join(lines[span[0] - 1 : span[1]])) + 2 * (span[1] - span[0] + 1)
+
+
+def _render(lines: List[str], spans: List[Span]) -> str:
+    """Numbered slices of `lines`, with '...' where lines were left out."""
+    merged: List[List[int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    width = len(str(len(lines)))
+    out = []
+    for number, (start, end) in enumerate(merged):
+        if start > 1 and (number == 0 or start > merged[number - 1][1] + 1):
+            out.append(f"{'.' * width}| ...")
+        for n in range(start, end + 1):
+            out.append(f"{n:>{width}}| {lines[n - 1]}")
+    if merged and merged[-1][1] < len(lines):
+        out.append(f"{'.' * width}| ...")
+    return "\n".join(out)
+
+
+def build_file_context(
+    file_path: str,
+    content: str,
+    focus_lines: List[int],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+) -> str:
+    """
+    Select the parts of a file that matter for a fix, within a token budget.
+
+    Small files are returned whole. For larger ones the blocks enclosing the
+    `focus_lines` (from the traceback) are kept: the enclosing function or
+    class for Python (found with `ast`), the enclosing indentation block
+    plus its parent keys for YAML and everything else. Python imports come
+    next, then function/class signatures as an outline. Every line keeps
+    its original line number as an anchor.
+
+    Args:
+        file_path: Path of the file (its extension picks the strategy)
+        content: Full file content
+        focus_lines: 1-based line numbers mentioned in the error, most
+            relevant first
+        token_budget: Approximate maximum size of the result in tokens
+
+    Returns:
+        The selected lines, each prefixed with '<line number>| '
+    """
+    lines = content.splitlines()
+    if not lines:
+        return ""
+
+    everything = (1, len(lines))
+    if _cost(lines, everything) <= token_budget:
+        return _render(lines, [everything])
+
+    focus_lines = [n for n in focus_lines if 1 <= n <= len(lines)]
+    python = _python_blocks(content) if file_path.endswith(".py") else None
+
+    share = token_budget // max(len(focus_lines), 1)
+    candidates: List[List[Span]] = []  # Groups in priority order
+    for line in focus_lines:
+        if python is not None:
+            enclosing = [span for span, _ in python[1] if span[0] <= line <= span[1]]
+            enclosing.sort(key=lambda span: span[1] - span[0])
+            # Innermost def/class, plus the header lines of its parents
+            group = enclosing[:1] or [(max(line - NARROW_WINDOW, 1), min(line + NARROW_WINDOW, len(lines)))]
+            group += [(span[0], span[0]) for span in enclosing[1:]]
+        else:
+            group = [_indented_block(lines, line)]
+            if file_path.endswith((".yml", ".yaml")):
+                # A key inside a step: take the whole step (`- name: ...`)
+                wider = _indented_block(lines, group[0][0])
+                if _cost(lines, wider) <= share:
+                    group[0] = wider
+            group += _ancestors(lines, group[0][0])
+
+        # A huge enclosing block shrinks to a window around the focus line
+        start, end = group[0]
+        if _cost(lines, group[0]) > share:
+            group[0] = (max(start, line - NARROW_WINDOW), min(end, line + NARROW_WINDOW))
+        candidates.append(group)
+
+    if python is not None:
+        candidates.append(python[0])
+    elif not focus_lines:
+        candidates.append([(1, min(len(lines), NARROW_WINDOW * 4))])
+
+    chosen: List[Span] = []
+    used = 0
+    for group in candidates:
+        for span in group:
+            cost = _cost(lines, span)
+            if used + cost > token_budget:
+                continue
+            chosen.append(span)
+            used += cost
+
+    if python is not None:
+        # Signatures of the other defs/classes as an outline of the module,
+        # nearest the error first, limited so they cannot crowd out the code
+        # that matters
+        anchor = focus_lines[0] if focus_lines else 1
+        outline_budget = min(token_budget - used, token_budget // 4)
+        for span, _ in sorted(python[1], key=lambda block: abs(block[0][0] - anchor)):
+            cost = _cost(lines, (span[0], span[0]))
+            if cost > outline_budget:
+                break
+            chosen.append((span[0], span[0]))
+            outline_budget -= cost
+
+    return _render(lines, chosen)
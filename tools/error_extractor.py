@@ -0,0 +1,246 @@
+# tools/error_extractor.py
+
+import os
+import re
+from typing import List, NamedTuple, Tuple
+
+# Default prompt budget for the extracted excerpts
+DEFAULT_TOKEN_BUDGET = int(os.getenv("ERROR_EXCERPT_TOKEN_BUDGET", "1500"))
+DEFAULT_MAX_EXCERPTS = 5
+
+
+class Signature(NamedTuple):
+    """A known error pattern and how much context to keep around it."""
+
+    name: str
+    pattern: str
+    weight: int  # Higher = more likely to be the root cause
+    before: int  # Lines of context before the match
+    after: int  # Lines of context after the match
+
+
+# Known error patterns, strongest signals first
+SIGNATURES = [
+    Signature(
+        "pip_resolver",
+        r"ResolutionImpossible|Could not find a version that satisfies"
+        r"|No matching distribution found|conflicting dependencies"
+        r"|pip's dependency resolver",
+        10,
+        4,
+        8,
+    ),
+    Signature("python_traceback", r"Traceback \(most recent call last\)", 10, 1, 3),
+    # Frames chain the traceback header to the exception line below them
+    Signature("traceback_frame", r'^\s*File "[^"]+", line \d+', 5, 0, 3),
+    Signature(
+        "python_exception",
+        r"^\s*(?:E\s+)?[A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt)\b:?",
+        9,
+        6,
+        2,
+    ),
+    Signature(
+        "yaml_error",
+        r"yaml\.(?:scanner|parser|constructor)\.|mapping values are not allowed"
+        r"|while (?:parsing|scanning) a|Invalid workflow file",
+        9,
+        3,
+        6,
+    ),
+    Signature(
+        "pytest_failure",
+        r"^(?:FAILED|ERROR) \S+::|^_{3,} \S.* _{3,}$|^=+ .*\b\d+ (?:failed|error)",
+        8,
+        2,
+        12,
+    ),
+    Signature("npm_error", r"npm ERR!|ERR_PNPM_|error Command failed with exit code", 7, 2, 10),
+    Signature("compiler_error", r"\berror(?:\[\w+\])?: |^\S+:\d+:\d+: error\b", 6, 2, 6),
+    Signature(
+        "exit_code",
+        r"Process completed with exit code [1-9]|exited with (?:code|status) [1-9]"
+        r"|##\[error\]",
+        3,
+        5,
+        0,
+    ),
+]
+
+# One combined regex with a named group per signature, so each line is
+# scanned once regardless of how many signatures exist
+SIGNATURE_INDEX = re.compile(
+    "|".join(f"(?P<{sig.name}>{sig.pattern})" for sig in SIGNATURES), re.MULTILINE
+)
+SIGNATURES_BY_NAME = {sig.name: sig for sig in SIGNATURES}
+
+# Summary lines written by get_workflow_run_logs; always kept
+PINNED_LINES = re.compile(r"^(?:JOB: |❌ FAILED STEP: |Failing commands: )")
+
+
+class Excerpt(NamedTuple):
+    """A ranked slice of the log."""
+
+    start: int  # First line (0-based)
+    end: int  # Last line, exclusive
+    score: float
+    signatures: Tuple[str, ...]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/code)."""
+    return len(text) // 4 + 1
+
+
+def find_excerpts(lines: List[str]) -> List[Excerpt]:
+    """
+    Find and rank the windows of `lines` that match known error signatures.
+
+    Overlapping windows are merged; a merged window scores its strongest
+    signature plus a small bonus for every additional hit.
+    """
+    windows = []
+    for number, line in enumerate(lines):
+        match = SIGNATURE_INDEX.search(line)
+        if match is None:
+            continue
+
+        sig = SIGNATURES_BY_NAME[match.lastgroup]
+        start = max(number - sig.before, 0)
+        end = min(number + sig.after + 1, len(lines))
+        windows.append((start, end, sig))
+
+    merged = []
+    for start, end, sig in windows:
+        if merged and start <= merged[-1][1]:
+            prev_start, prev_end, sigs = merged[-1]
+            merged[-1] = (prev_start, max(prev_end, end), sigs + [sig])
+        else:
+            merged.append((start, end, [sig]))
+
+    excerpts = []
+    for start, end, sigs in merged:
+        score = max(sig.weight for sig in sigs) + 0.5 * (len(sigs) - 1)
+        names = tuple(dict.fromkeys(sig.name for sig in sigs))
+        excerpts.append(Excerpt(start, end, score, names))
+
+    # Highest score first; among equals, the later one (closer to the failure)
+    return sorted(excerpts, key=lambda e: (-e.score, -e.start))
+
+
+def _fit_lines(lines: List[str], budget: int) -> List[str]:
+    """Longest prefix of `lines` that fits in `budget` tokens."""
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def extract_error_excerpt(
+    logs: str,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    max_excerpts: int = DEFAULT_MAX_EXCERPTS,
+) -> str:
+    """
+    Cut CI logs down to a few ranked excerpts within a token budget.
+
+    Deterministic: the same logs and budget always give the same excerpt.
+
+    Args:
+        logs: Log text (usually the output of get_workflow_run_logs)
+        token_budget: Approximate maximum size of the result in tokens
+        max_excerpts: Maximum number of excerpts to keep
+
+    Returns:
+        The pinned summary lines followed by the ranked excerpts
+    """
+    lines = logs.splitlines()
+
+    pinned = list(dict.fromkeys(line for line in lines if PINNED_LINES.match(line)))
+    parts = ["\n".join(pinned)] if pinned else []
+    remaining = token_budget - estimate_tokens(parts[0]) if parts else token_budget
+
+    excerpts = find_excerpts(lines)
+    if not excerpts:
+        # Nothing recognizable: the end of the log is the best guess
+        tail = _fit_lines(lines[::-1], remaining)[::-1]
+        parts.append("\n".join(tail))
+        return "\n\n".join(part for part in parts if part)
+
+    seen = set()
+    for excerpt in excerpts:
+        if len(seen) >= max_excerpts:
+            break
+
+        body = "\n".join(lines[excerpt.start : excerpt.end])
+        if body in seen:  # Matrix jobs often fail identically
+            continue
+        seen.add(body)
+
+        header = f"[{len(seen)}] {', '.join(excerpt.signatures)} (lines {excerpt.start + 1}-{excerpt.end})"
+        text = f"{header}\n{body}"
+        cost = estimate_tokens(text)
+
+        if cost > remaining:
+            kept = _fit_lines(text.splitlines(), remaining)
+            if len(kept) < 3:
+                break
+            text = "\n".join(kept)
+            cost = estimate_tokens(text)
+
+        parts.append(text)
+        remaining -= cost
+        if remaining <= 0:
+            break
+
+    return "\n\n".join(parts)
+
+
+# File references in tracebacks, pytest output and compiler-style messages
+_FILE_REFERENCES = re.compile(
+    r'File "(?P<py_path>[^"]+)", line (?P<py_line>\d+)'
+    r"|(?P<path>(?:[\w.-]+/)*[\w.-]+\.(?:py|pyi|js|jsx|ts|tsx|ya?ml|toml|cfg|json|go|rs|java|rb))"
+    r":(?P<line>\d+)\b"
+)
+
+# Runner checkout prefix: /home/runner/work/<repo>/<repo>/src/x.py -> src/x.py
+_WORKSPACE_PREFIX = re.compile(r"^(?:/home/runner/work|/__w|[A-Za-z]:\\a)/[^/]+/[^/]+/")
+
+# Paths that belong to the runner, not the repository
+_EXTERNAL_PATH = re.compile(r"(?:^|/)(?:site-packages|dist-packages|node_modules|lib/python\d)/|^<|^/(?:usr|opt|tmp)/")
+
+
+def referenced_files(logs: str, limit: int = 10) -> List[Tuple[str, List[int]]]:
+    """
+    Repository files mentioned in error output, most recently mentioned first.
+
+    The innermost traceback frame is the last one printed, so later mentions
+    are more likely to be the culprit.
+
+    Args:
+        logs: Log text or an error excerpt
+        limit: Maximum number of files to return
+
+    Returns:
+        List of (repo-relative path, line numbers mentioned) pairs
+    """
+    files = {}
+    for match in _FILE_REFERENCES.finditer(logs):
+        path = match.group("py_path") or match.group("path")
+        line = int(match.group("py_line") or match.group("line"))
+
+        path = _WORKSPACE_PREFIX.sub("", path)
+        if _EXTERNAL_PATH.search(path) or path.startswith("/"):
+            continue
+        path = path[2:] if path.startswith("./") else path
+
+        lines = files.pop(path, [])
+        if line not in lines:
+            lines.append(line)
+        files[path] = lines  # Re-insert so the latest mention sorts last
+
+    return list(reversed(files.items()))[:limit]
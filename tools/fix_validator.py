@@ -0,0 +1,186 @@
+# tools/fix_validator.py
+
+import json
+import os
+import re
+from typing import Dict, List
+
+import yaml
+
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+except ImportError:  # pragma: no cover - requirement lines are then not checked
+    Requirement = None
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: TOML files are not checked
+    tomllib = None
+
+# Workflow files GitHub Actions picks up
+WORKFLOW_PATH = re.compile(r"^\.github/workflows/[^/]+\.ya?ml$")
+
+# Top-level keys a workflow may have, and the ones it must have
+WORKFLOW_KEYS = {"name", "run-name", "on", "permissions", "env", "defaults", "concurrency", "jobs"}
+WORKFLOW_REQUIRED = ("on", "jobs")
+
+# pip options that may stand in for, or follow, a requirement on its line
+REQUIREMENT_OPTION = re.compile(r"(?:^|\s)--?[a-zA-Z]")
+
+# Requirement lines that are a URL or path instead of "name[extras] specifier"
+LOCAL_OR_URL = re.compile(r"^(?:[\w+.-]+://|\.|/|~)")
+
+
+def validate_python(path: str, content: str) -> List[str]:
+    """Compile the module (a superset of `ast.parse`: also catches e.g. `return` outside a function)."""
+    try:
+        compile(content, path, "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return [f"{path}:{e.lineno}: {type(e).__name__}: {e.msg}"]
+    except ValueError as e:  # e.g. null bytes in the source
+        return [f"{path}: {e}"]
+    return []
+
+
+def _load_yaml(path: str, content: str):
+    """(documents, errors): a file may hold several documents separated by `---` (e.g. Kubernetes manifests)."""
+    try:
+        return list(yaml.safe_load_all(content)), []
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        where = f"{path}:{mark.line + 1}" if mark else path
+        return None, [f"{where}: invalid YAML: {getattr(e, 'problem', None) or e}"]
+
+
+def _check_step(where: str, step) -> List[str]:
+    if not isinstance(step, dict):
+        return [f"{where}: a step must be a mapping"]
+    actions = [key for key in ("uses", "run") if key in step]
+    if len(actions) != 1:
+        return [f"{where}: a step needs exactly one of 'uses' or 'run'"]
+    if "with" in step and not isinstance(step["with"], dict):
+        return [f"{where}: 'with' must be a mapping"]
+    return []
+
+
+def validate_workflow(path: str, content: str) -> List[str]:
+    """
+    Parse a GitHub Actions workflow and check its overall shape: the
+    top-level keys, every job's runner (or reusable workflow), its `needs`
+    and the form of each step.
+    """
+    documents, errors = _load_yaml(path, content)
+    if errors:
+        return errors
+    if len(documents) > 1:
+        return [f"{path}: a workflow must be a single YAML document"]
+    workflow = documents[0] if documents else None
+    if not isinstance(workflow, dict):
+        return [f"{path}: a workflow must be a mapping"]
+
+    # YAML 1.1 reads a bare `on:` key as the boolean True
+    if True in workflow:
+        workflow["on"] = workflow.pop(True)
+
+    errors = [f"{path}: unknown top-level key {key!r}" for key in workflow if key not in WORKFLOW_KEYS]
+    errors += [f"{path}: missing top-level key {key!r}" for key in WORKFLOW_REQUIRED if key not in workflow]
+
+    jobs = workflow.get("jobs")
+    if "jobs" in workflow and (not isinstance(jobs, dict) or not jobs):
+        return errors + [f"{path}: 'jobs' must be a non-empty mapping"]
+
+    for job_id, job in (jobs or {}).items():
+        where = f"{path}: job {job_id!r}"
+        if not isinstance(job, dict):
+            errors.append(f"{where} must be a mapping")
+            continue
+        if "uses" not in job and "runs-on" not in job:
+            errors.append(f"{where} needs 'runs-on' (or 'uses' for a reusable workflow)")
+        needs = job.get("needs", [])
+        for needed in [needs] if isinstance(needs, str) else needs:
+            if needed not in jobs:
+                errors.append(f"{where} needs unknown job {needed!r}")
+        steps = job.get("steps", [])
+        if not isinstance(steps, list):
+            errors.append(f"{where}: 'steps' must be a list")
+            continue
+        for number, step in enumerate(steps, start=1):
+            errors += _check_step(f"{where} step {number}", step)
+
+    return errors
+
+
+def validate_requirements(path: str, content: str) -> List[str]:
+    """Parse every requirement specifier (PEP 508); pip options and includes are skipped."""
+    if Requirement is None:
+        return []
+
+    errors = []
+    lines = content.splitlines()
+    number = 0
+    while number < len(lines):
+        start = number + 1
+        line = lines[number]
+        # A trailing backslash continues the requirement on the next line
+        while line.endswith("\\") and number + 1 < len(lines):
+            number += 1
+            line = line[:-1] + " " + lines[number]
+        number += 1
+
+        line = line.split(" #", 1)[0].strip()
+        if not line or line.startswith("#"):
+            continue
+        option = REQUIREMENT_OPTION.search(line)
+        if option is not None:
+            # "-r other.txt", "-e .", "--index-url ...", or "pkg==1.0 --hash=..."
+            line = line[: option.start()].strip()
+            if not line:
+                continue
+        if LOCAL_OR_URL.match(line):
+            continue  # An archive, VCS URL or local path rather than a specifier
+        try:
+            Requirement(line)
+        except InvalidRequirement as e:
+            reason = str(e).splitlines()[0]
+            errors.append(f"{path}:{start}: invalid requirement {line!r}: {reason}")
+    return errors
+
+
+def validate_file(path: str, content: str) -> List[str]:
+    """
+    Fast local checks for one changed file, picked by its path.
+
+    Returns:
+        Error messages ("path:line: problem"); empty if the file looks valid
+        or is of a kind that is not checked
+    """
+    name = os.path.basename(path)
+    extension = os.path.splitext(name)[1].lower()
+
+    if extension in (".py", ".pyi"):
+        return validate_python(path, content)
+    if WORKFLOW_PATH.match(path):
+        return validate_workflow(path, content)
+    if extension in (".yml", ".yaml"):
+        return _load_yaml(path, content)[1]
+    if name.startswith("requirements") and extension in (".txt", ".in"):
+        return validate_requirements(path, content)
+    if extension == ".toml" and tomllib is not None:
+        try:
+            tomllib.loads(content)
+        except tomllib.TOMLDecodeError as e:
+            return [f"{path}: invalid TOML: {e}"]
+    if extension == ".json":
+        try:
+            json.loads(content)
+        except ValueError as e:
+            return [f"{path}:{getattr(e, 'lineno', '?')}: invalid JSON: {e}"]
+    return []
+
+
+def validate_fix(files: Dict[str, str]) -> List[str]:
+    """Errors in any of the files a fix changes ({path: new content})."""
+    errors = []
+    for path, content in files.items():
+        errors.extend(validate_file(path, content))
+    return errors
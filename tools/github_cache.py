@@ -0,0 +1,227 @@
+# tools/github_cache.py
+
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+import requests
+from github import GithubException
+
+from agent.tracing import span
+from tools.github_scheduler import WRITE, Credential, GitHubScheduler
+
+# GitHub REST API location (GitHub Enterprise, or a local stub server in tests)
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+CACHE_DIR = os.path.expanduser(os.getenv("PIPELINE_HEALER_CACHE_DIR", "~/.cache/pipeline-healer"))
+
+# A full commit SHA; anything else (branch, tag) is a mutable ref
+COMMIT_SHA = re.compile(r"^[0-9a-f]{40}$")
+
+# Path parts replaced by placeholders in span names
+ROUTE_PATTERNS = [
+    (re.compile(r"^/repos/[^/]+/[^/]+"), "/repos/{repo}"),
+    (re.compile(r"/contents/.*"), "/contents/{path}"),
+    (re.compile(r"/git/(refs?)/heads/.*"), r"/git/\1/heads/{branch}"),
+    (re.compile(r"/[0-9a-f]{40}\b"), "/{sha}"),
+    (re.compile(r"/commits/[^/{]+$"), "/commits/{ref}"),
+    (re.compile(r"/\d+\b"), "/{id}"),
+]
+
+
+def route(path: str) -> str:
+    """An API path with repository, refs and IDs replaced by placeholders."""
+    for pattern, placeholder in ROUTE_PATTERNS:
+        path = pattern.sub(placeholder, path)
+    return path
+
+
+class GitHubCache:
+    """
+    Caching HTTP layer for GitHub REST calls.
+
+    Every request goes through a GitHubScheduler, which picks the token and
+    paces requests by rate limit and priority. Writes (`post_json`,
+    `patch_json`) always run at WRITE priority and are never cached. Two kinds of read data are cached on disk:
+
+    - Immutable data: anything addressed by a commit, tree or blob SHA (file
+      contents at a commit, trees, blobs) never changes, so it is stored
+      forever and served without a request.
+    - Mutable data: branch heads and repository metadata are revalidated
+      with `If-None-Match`. A `304 Not Modified` reply costs no rate limit
+      and no payload, and the cached body is reused.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        base_url: str = GITHUB_API_URL,
+        cache_dir: str = os.path.join(CACHE_DIR, "github"),
+        session: Optional[requests.Session] = None,
+        scheduler: Optional[GitHubScheduler] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.scheduler = scheduler or GitHubScheduler([Credential(token)], session)
+        self.scheduler.session.headers["Accept"] = "application/vnd.github+json"
+
+        self.stats = {"immutable_hits": 0, "revalidated": 0, "fetched": 0}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(cache_dir, "immutable"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "etag"), exist_ok=True)
+
+    # --- Disk storage -----------------------------------------------------
+
+    def _path(self, kind: str, key: str) -> str:
+        digest = hashlib.sha256(f"{self.base_url}|{key}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, kind, digest + ".json")
+
+    def _load(self, kind: str, key: str) -> Optional[dict]:
+        try:
+            with open(self._path(kind, key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, kind: str, key: str, value: dict):
+        # Write-then-rename so concurrent readers never see a partial file
+        path = self._path(kind, key)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    # --- HTTP ---------------------------------------------------------------
+
+    def _request(self, method: str, path: str, priority: Optional[int] = None, **kwargs):
+        # Installation tokens are picked by the owner of the repository
+        owner = path.split("/")[2] if path.startswith("/repos/") else None
+        kwargs.setdefault("timeout", 30)
+        with span("github", f"{method} {route(path)}") as s:
+            response = self.scheduler.request(method, f"{self.base_url}{path}", priority, owner, **kwargs)
+            size = response.headers.get("Content-Length") if kwargs.get("stream") else len(response.content)
+            s.set(status_code=response.status_code, bytes=int(size or 0))
+        if response.status_code >= 400:
+            try:
+                data = response.json()
+            except ValueError:
+                data = {"message": response.text}
+            raise GithubException(response.status_code, data, dict(response.headers))
+        return response
+
+    def _get(self, path: str, params: Optional[dict] = None, headers: Optional[dict] = None):
+        return self._request("GET", path, params=params, headers=headers)
+
+    def post_json(self, path: str, payload: dict) -> dict:
+        """POST a JSON payload (never cached) and return the JSON reply."""
+        return self._request("POST", path, WRITE, json=payload).json()
+
+    def patch_json(self, path: str, payload: dict) -> dict:
+        """PATCH a JSON payload (never cached) and return the JSON reply."""
+        return self._request("PATCH", path, WRITE, json=payload).json()
+
+    def stream(self, path: str) -> requests.Response:
+        """
+        GET a large body (e.g. a job log) without reading it; redirects to
+        the download location are followed. Close the reply when done.
+        """
+        return self._request("GET", path, stream=True, timeout=(10, 300))
+
+    def get_immutable(self, path: str, params: Optional[dict] = None) -> dict:
+        """GET a SHA-addressed resource, served from disk once fetched."""
+        key = path + "?" + json.dumps(params or {}, sort_keys=True)
+        cached = self._load("immutable", key)
+        if cached is not None:
+            self._count("immutable_hits")
+            return cached
+
+        body = self._get(path, params).json()
+        self._count("fetched")
+        self._store("immutable", key, body)
+        return body
+
+    def get_revalidated(self, path: str, params: Optional[dict] = None, accept: Optional[str] = None):
+        """GET a mutable resource, revalidating any cached copy with its ETag."""
+        key = f"{path}?{json.dumps(params or {}, sort_keys=True)}|{accept}"
+        cached = self._load("etag", key)
+
+        headers = {"Accept": accept} if accept else {}
+        if cached is not None:
+            headers["If-None-Match"] = cached["etag"]
+
+        response = self._get(path, params, headers)
+        if response.status_code == 304 and cached is not None:
+            self._count("revalidated")
+            return cached["body"]
+
+        self._count("fetched")
+        body = response.text if accept and not accept.endswith("json") else response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            self._store("etag", key, {"etag": etag, "body": body})
+        return body
+
+    # --- GitHub resources ---------------------------------------------------
+
+    def get_repo_metadata(self, repo_name: str) -> dict:
+        """Repository metadata (default branch, etc.), revalidated on each call."""
+        return self.get_revalidated(f"/repos/{repo_name}")
+
+    def resolve_ref(self, repo_name: str, ref: str) -> str:
+        """Resolve a branch, tag or SHA to the commit SHA it points at right now."""
+        if COMMIT_SHA.match(ref):
+            return ref
+        sha = self.get_revalidated(
+            f"/repos/{repo_name}/commits/{ref}", accept="application/vnd.github.sha"
+        )
+        return sha.strip()
+
+    def get_file(self, repo_name: str, file_path: str, ref: str) -> Tuple[str, str]:
+        """
+        Get a file's text as of `ref`.
+
+        The ref is resolved to a commit SHA first (one conditional request),
+        after which the content lookup is immutable and cached forever.
+
+        Returns:
+            (content, blob_sha)
+
+        Raises:
+            GithubException: 404 if there is no such file, 415 if it is not
+                UTF-8 text (e.g. an image)
+        """
+        commit_sha = self.resolve_ref(repo_name, ref)
+        body = self.get_immutable(f"/repos/{repo_name}/contents/{file_path}", {"ref": commit_sha})
+
+        if isinstance(body, list) or body.get("type") != "file":
+            raise GithubException(400, {"message": f"{file_path} is not a file"}, None)
+
+        content = body.get("content")
+        if content is None or body.get("encoding") != "base64":
+            # Files over 1 MB come back without inline content
+            blob = self.get_immutable(f"/repos/{repo_name}/git/blobs/{body['sha']}")
+            content = blob["content"]
+
+        try:
+            return base64.b64decode(content).decode("utf-8"), body["sha"]
+        except UnicodeDecodeError:
+            raise GithubException(415, {"message": f"{file_path} is not a UTF-8 text file"}, None) from None
+
+    def get_commit(self, repo_name: str, commit_sha: str) -> dict:
+        """Git commit object (tree SHA, parents, message); immutable."""
+        return self.get_immutable(f"/repos/{repo_name}/git/commits/{commit_sha}")
+
+    def get_tree(self, repo_name: str, ref: str) -> list:
+        """Recursive file listing of the repository at `ref`."""
+        commit_sha = self.resolve_ref(repo_name, ref)
+        body = self.get_immutable(f"/repos/{repo_name}/git/trees/{commit_sha}", {"recursive": "1"})
+        return body.get("tree", [])
@@ -0,0 +1,339 @@
+# tools/github_scheduler.py
+
+import contextvars
+import itertools
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from github import GithubException, RateLimitExceededException
+
+from agent.tracing import annotate
+
+# Request priorities (lower goes first)
+WRITE = 0  # Branch and PR creation on a heal's critical path
+READ = 1  # Lookups a heal is waiting for
+BACKGROUND = 2  # Speculative prefetches and listings nobody is blocked on
+
+PRIORITY_NAMES = {WRITE: "write", READ: "read", BACKGROUND: "background"}
+
+# Scheduler configuration
+GITHUB_BURST = int(os.getenv("GITHUB_BURST", "100"))
+GITHUB_BACKGROUND_RESERVE = float(os.getenv("GITHUB_BACKGROUND_RESERVE", "0.2"))
+GITHUB_MAX_WAIT = float(os.getenv("GITHUB_MAX_WAIT_SECONDS", "900"))
+GITHUB_MAX_RETRIES = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+
+# GitHub's advice when a secondary rate limit reply has no Retry-After
+SECONDARY_LIMIT_WAIT = 60.0
+
+_priority = contextvars.ContextVar("github_priority", default=READ)
+
+
+@contextmanager
+def github_priority(priority: int):
+    """Send the GitHub requests made inside this block at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Credential:
+    """
+    Rate-limit state of one token (a personal access token or a GitHub App
+    installation token).
+
+    `remaining`, `limit` and `reset` mirror the X-RateLimit-* headers of the
+    token's latest reply and are None until the first reply arrives. On top
+    of that a token bucket paces requests so the remaining quota lasts until
+    the window resets: it refills at remaining / seconds-to-reset and holds
+    at most `burst` requests.
+    """
+
+    def __init__(self, token: Optional[str], owner: Optional[str] = None, burst: int = GITHUB_BURST):
+        self.token = token
+        self.owner = owner  # Installation tokens only work for one owner's repos
+        self.burst = max(burst, 1)
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset = 0.0
+        self.blocked_until = 0.0
+        self.bucket = float(self.burst)
+        self.refilled = time.time()
+
+    def __repr__(self) -> str:
+        label = f"{self.owner}=" if self.owner else ""
+        hint = f"{self.token[:4]}…" if self.token else "anonymous"
+        return f"Credential({label}{hint}, remaining={self.remaining})"
+
+    def _rate(self, now: float) -> float:
+        return max(self.remaining, 0) / max(self.reset - now, 1.0)
+
+    def _refill(self, now: float):
+        if self.remaining is not None and now >= self.reset:
+            # New window: quota is unknown (and almost certainly back) until the next reply
+            self.remaining = None
+        if self.remaining is None:
+            self.bucket = float(self.burst)
+        else:
+            self.bucket = min(self.burst, self.bucket + (now - self.refilled) * self._rate(now))
+        self.refilled = now
+
+    def wait_time(self, priority: int, now: float) -> float:
+        """Seconds until this token may send a request at `priority` (0 = now)."""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                return self.reset - now
+            if priority == BACKGROUND and self.limit and self.remaining <= self.limit * GITHUB_BACKGROUND_RESERVE:
+                # The rest of the window is kept for heals that are waiting
+                return self.reset - now
+        # Writes may overdraw the bucket; later reads pay it back
+        if priority == WRITE or self.bucket >= 1:
+            return 0.0
+        return (1 - self.bucket) / self._rate(now)
+
+    def take(self):
+        self.bucket -= 1
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def score(self) -> Tuple[bool, float, float]:
+        """Higher is a better pick: installation tokens first, then the most quota left."""
+        left = self.remaining / self.limit if self.remaining is not None and self.limit else 1.0
+        return self.owner is not None, left, self.bucket
+
+    def update(self, response: requests.Response, now: float) -> Optional[float]:
+        """
+        Record the rate-limit headers of a reply.
+
+        Returns:
+            Seconds to wait before retrying if the reply was a rate-limit
+            rejection, otherwise None
+        """
+        # Redirected replies (job logs) carry the headers on the API hop
+        source = response.history[0] if response.history else response
+        headers = source.headers
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            remaining, reset = int(remaining), float(reset)
+            if self.remaining is None or reset > self.reset:
+                self.remaining = remaining
+            else:
+                # Replies to concurrent requests arrive out of order
+                self.remaining = min(self.remaining, remaining)
+            self.reset = reset
+            limit = headers.get("X-RateLimit-Limit")
+            self.limit = int(limit) if limit else self.limit
+
+        if source.status_code not in (403, 429):
+            return None
+
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                wait = float(retry_after)
+            except ValueError:
+                wait = SECONDARY_LIMIT_WAIT
+        elif remaining == 0:
+            wait = reset - now
+        elif source.status_code == 429 or "rate limit" in source.text.lower():
+            wait = SECONDARY_LIMIT_WAIT
+        else:
+            return None  # A plain permission error
+
+        # At least a second: our clock may run ahead of GitHub's reset time
+        wait = max(wait, 1.0)
+        self.blocked_until = max(self.blocked_until, now + wait)
+        return wait
+
+
+def parse_tokens(value: Optional[str]) -> List[Credential]:
+    """
+    Credentials from a comma-separated list of tokens.
+
+    An entry is either `token` (usable for any repository) or `owner=token`
+    (a GitHub App installation token, used only for that owner's repos).
+    """
+    credentials = []
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        owner, _, token = entry.rpartition("=")
+        credentials.append(Credential(token.strip(), owner.strip() or None))
+    return credentials
+
+
+class GitHubScheduler:
+    """
+    Single gate for GitHub REST calls.
+
+    Every request waits for a token that has quota left, going by the
+    X-RateLimit-* headers of earlier replies and a per-token bucket that
+    spreads the remaining quota over the rest of the window. When several
+    tokens are configured each request takes the one with the most quota
+    left (installation tokens before shared ones), so work is spread
+    across them.
+
+    Waiting requests are served in priority order: writes (WRITE) before
+    lookups (READ) before background work (BACKGROUND), and background work
+    also leaves the last `GITHUB_BACKGROUND_RESERVE` of a token's quota for
+    the other two. Replies rejected by a primary or secondary rate limit
+    (403/429 with Retry-After or an exhausted quota) park their token until
+    it may be used again and are retried, on another token if one is free.
+
+    Counters are kept in `stats`.
+    """
+
+    def __init__(
+        self,
+        credentials: Optional[List[Credential]] = None,
+        session: Optional[requests.Session] = None,
+        max_wait: float = GITHUB_MAX_WAIT,
+        max_retries: int = GITHUB_MAX_RETRIES,
+    ):
+        self.credentials = credentials or [Credential(None)]
+        self.session = session or requests.Session()
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.stats: Counter = Counter()
+        self._cond = threading.Condition()
+        self._waiting: Dict[Tuple[int, int], List[Credential]] = {}
+        self._seq = itertools.count()
+
+    def _eligible(self, owner: Optional[str]) -> List[Credential]:
+        eligible = [c for c in self.credentials if c.owner is None or c.owner == owner]
+        if not eligible:
+            raise GithubException(401, {"message": f"No GitHub token configured for '{owner}'"}, None)
+        return eligible
+
+    def _pick(self, ticket, priority: int, eligible: List[Credential], now: float):
+        """The best token `ticket` may use now, or (None, seconds to wait)."""
+        ready = []
+        wait = math.inf
+        for credential in eligible:
+            delay = credential.wait_time(priority, now)
+            if delay > 0:
+                wait = min(wait, delay)
+            elif not any(
+                other < ticket and credential in others for other, others in self._waiting.items()
+            ):
+                ready.append(credential)
+        if ready:
+            return max(ready, key=Credential.score), 0.0
+        return None, wait
+
+    def acquire(self, priority: int = READ, owner: Optional[str] = None) -> Credential:
+        """
+        Wait for a token that may send one request at `priority`.
+
+        Raises:
+            RateLimitExceededException: if no token frees up within `max_wait`
+        """
+        eligible = self._eligible(owner)
+        deadline = time.time() + self.max_wait
+
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            self._waiting[ticket] = eligible
+            try:
+                while True:
+                    now = time.time()
+                    credential, wait = self._pick(ticket, priority, eligible, now)
+                    if credential is not None:
+                        credential.take()
+                        self.stats[f"requests.{PRIORITY_NAMES[priority]}"] += 1
+                        return credential
+
+                    # (An infinite wait only means a better-placed request goes first)
+                    if now >= deadline or math.isfinite(wait) and now + wait > deadline:
+                        raise RateLimitExceededException(
+                            403, {"message": f"No GitHub token has quota left within {self.max_wait:.0f}s"}, None
+                        )
+                    self.stats["waits"] += 1
+                    self._cond.wait(min(wait, deadline - now, 1.0))
+            finally:
+                del self._waiting[ticket]
+                self._cond.notify_all()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        priority: Optional[int] = None,
+        owner: Optional[str] = None,
+        headers: Optional[dict] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send one request through the scheduler.
+
+        Args:
+            method: HTTP method
+            url: Full URL of the GitHub API endpoint
+            priority: WRITE, READ or BACKGROUND (default: the enclosing
+                `github_priority` block, else READ)
+            owner: Owner of the repository the request is about (selects
+                installation tokens)
+            headers: Extra request headers
+            **kwargs: Passed on to `requests.Session.request`
+
+        Returns:
+            The reply (after retrying rate-limit rejections up to
+            `max_retries` times)
+        """
+        priority = _priority.get() if priority is None else priority
+        queued = 0.0
+
+        for attempt in range(self.max_retries + 1):
+            waiting = time.monotonic()
+            credential = self.acquire(priority, owner)
+            queued += time.monotonic() - waiting
+            request_headers = dict(headers or {})
+            if credential.token:
+                request_headers["Authorization"] = f"Bearer {credential.token}"
+
+            response = self.session.request(method, url, headers=request_headers, **kwargs)
+
+            with self._cond:
+                retry_after = credential.update(response, time.time())
+                self._cond.notify_all()
+
+            if retry_after is None or attempt == self.max_retries:
+                annotate(retries=attempt, queued_s=round(queued, 3))
+                return response
+
+            self.stats["rate_limited"] += 1
+            response.close()
+            print(f"⏳ GitHub rate limit hit; retrying (token free again in {retry_after:.0f}s)")
+
+        return response
+
+
+_scheduler: Optional[GitHubScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> GitHubScheduler:
+    """
+    Shared process-wide scheduler for the tokens in `GITHUB_TOKENS`
+    (falling back to `GITHUB_TOKEN`).
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GitHubScheduler(
+                parse_tokens(os.getenv("GITHUB_TOKENS") or os.getenv("GITHUB_TOKEN"))
+            )
+        return _scheduler
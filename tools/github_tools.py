@@ -0,0 +1,537 @@
+# tools/github_tools.py
+
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+from github import GithubException
+from langchain_core.tools import tool
+
+from agent.tracing import propagate, trace_tool
+from tools.github_cache import GitHubCache
+from tools.github_scheduler import BACKGROUND, WRITE, get_scheduler, github_priority
+from tools.log_parser import (
+    IncrementalLogParser,
+    get_parse_pool,
+    parse_log_file,
+    summarize,
+)
+
+_content_cache = None
+
+# Job logs larger than this are spooled to disk and parsed in a process pool
+LOG_POOL_THRESHOLD = int(os.getenv("LOG_POOL_THRESHOLD_BYTES", str(20 * 1024 * 1024)))
+LOG_CHUNK_SIZE = 1 << 16
+LOG_DOWNLOAD_WORKERS = 4
+BLOB_UPLOAD_WORKERS = 8
+
+# Default branches are remembered this long instead of being revalidated
+# for every file read
+DEFAULT_BRANCH_TTL = float(os.getenv("DEFAULT_BRANCH_TTL_SECONDS", "300"))
+_default_branches: Dict[str, Tuple[str, float]] = {}  # repo -> (branch, expiry)
+_default_branches_lock = threading.Lock()
+
+
+def get_content_cache() -> GitHubCache:
+    """
+    Shared client for all GitHub REST calls (created on first use).
+
+    Requests go through the shared GitHubScheduler, so they are spread over
+    the tokens in `GITHUB_TOKENS` (or the single `GITHUB_TOKEN`).
+    """
+    global _content_cache
+    if _content_cache is None:
+        _content_cache = GitHubCache(scheduler=get_scheduler())
+    return _content_cache
+
+
+def default_branch(repo_name: str) -> str:
+    """
+    The repository's default branch, the ref file reads and fix branches
+    start from (remembered for DEFAULT_BRANCH_TTL seconds).
+    """
+    now = time.monotonic()
+    with _default_branches_lock:
+        branch, expires = _default_branches.get(repo_name, (None, 0.0))
+    if branch is None or expires < now:
+        branch = get_content_cache().get_repo_metadata(repo_name)["default_branch"]
+        with _default_branches_lock:
+            _default_branches[repo_name] = (branch, now + DEFAULT_BRANCH_TTL)
+    return branch
+
+
+def read_file(repo_name: str, file_path: str, branch: Optional[str] = None):
+    """
+    Raw text of a file at `branch` (the default branch if omitted).
+
+    Returns:
+        The file content, or None if the file does not exist or is not text
+    """
+    try:
+        content, _ = get_content_cache().get_file(repo_name, file_path, branch or default_branch(repo_name))
+        return content
+    except GithubException as e:
+        if e.status in (404, 415):
+            return None
+        raise
+
+
+def get_workflow_run_info(repo_name: str, run_id: str) -> dict:
+    """
+    Workflow run metadata (workflow file path, head SHA and branch).
+
+    Returns:
+        The run object from the GitHub REST API
+    """
+    return get_content_cache().get_revalidated(f"/repos/{repo_name}/actions/runs/{run_id}")
+
+
+def get_pull_request(repo_name: str, number: int) -> dict:
+    """
+    A pull request's current state (`state`, `merged`, `merged_at`, ...).
+
+    Returns:
+        The pull request object from the GitHub REST API
+    """
+    with github_priority(BACKGROUND):
+        return get_content_cache().get_revalidated(f"/repos/{repo_name}/pulls/{number}")
+
+
+def list_failed_runs(repo_name: str, limit: int = 20) -> list:
+    """
+    The most recent failed workflow runs, newest first, following
+    pagination up to `limit` runs.
+
+    Returns:
+        Workflow run objects from the GitHub REST API
+    """
+    cache = get_content_cache()
+    runs = []
+    page = 1
+    with github_priority(BACKGROUND):
+        while len(runs) < limit:
+            body = cache.get_revalidated(
+                f"/repos/{repo_name}/actions/runs",
+                {"status": "failure", "per_page": min(limit, 100), "page": page},
+            )
+            runs.extend(body["workflow_runs"])
+            if not body["workflow_runs"] or len(runs) >= body["total_count"]:
+                break
+            page += 1
+    return runs[:limit]
+
+
+def list_pull_request_comments(repo_name: str, number: int) -> list:
+    """Bodies of all comments on a pull request, oldest first, following pagination."""
+    cache = get_content_cache()
+    bodies = []
+    page = 1
+    with github_priority(BACKGROUND):
+        while True:
+            comments = cache.get_revalidated(
+                f"/repos/{repo_name}/issues/{number}/comments", {"per_page": 100, "page": page}
+            )
+            bodies.extend(comment["body"] for comment in comments)
+            if len(comments) < 100:
+                return bodies
+            page += 1
+
+
+def list_repo_files(repo_name: str, ref: str = None) -> set:
+    """Paths of all files in the repository at `ref` (default branch if omitted)."""
+    ref = ref or default_branch(repo_name)
+    return {entry["path"] for entry in get_content_cache().get_tree(repo_name, ref) if entry["type"] == "blob"}
+
+
+def list_run_jobs(repo_name: str, run_id: str) -> list:
+    """All jobs of a workflow run (latest attempt), following pagination."""
+    cache = get_content_cache()
+    jobs = []
+    page = 1
+    while True:
+        body = cache.get_revalidated(
+            f"/repos/{repo_name}/actions/runs/{run_id}/jobs", {"per_page": 100, "page": page}
+        )
+        jobs.extend(body["jobs"])
+        if not body["jobs"] or len(jobs) >= body["total_count"]:
+            return jobs
+        page += 1
+
+
+def _stream_job_log(repo_name: str, job: dict) -> dict:
+    """
+    Stream one job's log and reduce it to failure excerpts.
+
+    The log is never held in memory: small logs are parsed chunk by chunk as
+    they arrive, large ones are spooled to a temp file and parsed in the
+    shared process pool so the caller's thread (or event loop) stays free.
+    """
+    # The logs endpoint redirects to a short-lived, pre-signed download URL
+    with get_content_cache().stream(f"/repos/{repo_name}/actions/jobs/{job['id']}/logs") as response:
+        size = int(response.headers.get("Content-Length") or 0)
+        chunks = response.iter_content(chunk_size=LOG_CHUNK_SIZE)
+
+        if size <= LOG_POOL_THRESHOLD:
+            parser = IncrementalLogParser()
+            for chunk in chunks:
+                parser.feed(chunk)
+            return summarize(parser.close())
+
+        with tempfile.NamedTemporaryFile(suffix=".log", delete=False) as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+
+    try:
+        return get_parse_pool().submit(parse_log_file, spool.name).result()
+    finally:
+        os.unlink(spool.name)
+
+
+def _format_job_log(repo_name: str, job: dict) -> str:
+    """Job header, failed steps and the parsed log excerpt for one job."""
+    logs = [f"\n{'=' * 60}", f"JOB: {job['name']}", f"{'=' * 60}"]
+
+    # Get steps
+    for step in job.get("steps") or []:
+        if step["conclusion"] == "failure":
+            logs.append(f"\n❌ FAILED STEP: {step['name']}")
+            logs.append(f"Status: {step['conclusion']}")
+
+    try:
+        parsed = _stream_job_log(repo_name, job)
+    except Exception as e:
+        logs.append(f"\n(Could not download job log: {str(e)})")
+        return "\n".join(logs)
+
+    if parsed["failed_steps"]:
+        logs.append(f"\nFailing commands: {', '.join(parsed['failed_steps'])}")
+    logs.append(f"\nLOG EXCERPT ({parsed['lines']} lines scanned):")
+    logs.append(parsed["excerpt"])
+
+    return "\n".join(logs)
+
+
+@tool
+@trace_tool
+def get_workflow_run_logs(repo_name: str, run_id: str) -> str:
+    """
+    Fetch logs from a failed GitHub Actions workflow run.
+
+    Args:
+        repo_name: Repository in format 'owner/repo' (e.g., 'your-username/pipeline-test')
+        run_id: The workflow run ID (number)
+
+    Returns:
+        The failed jobs and steps with excerpts of their logs around failures
+    """
+    try:
+        # Get failed jobs for this run
+        failed_jobs = [job for job in list_run_jobs(repo_name, run_id) if job["conclusion"] == "failure"]
+
+        # Matrix builds fail many jobs at once; download their logs in parallel
+        with ThreadPoolExecutor(max_workers=LOG_DOWNLOAD_WORKERS) as pool:
+            logs = list(pool.map(propagate(partial(_format_job_log, repo_name)), failed_jobs))
+
+        if not logs:
+            return "No failed jobs found in this run"
+
+        return "\n".join(logs)
+
+    except GithubException as e:
+        return f"GitHub API Error: {e.data.get('message', str(e))}"
+    except Exception as e:
+        return f"Error fetching logs: {str(e)}"
+
+
+@tool
+@trace_tool
+def get_file_content(repo_name: str, file_path: str, branch: Optional[str] = None) -> str:
+    """
+    Get the content of a file from a GitHub repository.
+
+    Args:
+        repo_name: Repository in format 'owner/repo'
+        file_path: Path to the file (e.g., '.github/workflows/ci.yml')
+        branch: Branch name (default: the repository's default branch)
+
+    Returns:
+        The file content
+    """
+    try:
+        content, _ = get_content_cache().get_file(repo_name, file_path, branch or default_branch(repo_name))
+
+        return f"File: {file_path}\n{'=' * 60}\n{content}"
+
+    except GithubException as e:
+        return f"Error: {e.data.get('message', 'File not found')}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@tool
+@trace_tool
+def create_pull_request(
+    repo_name: str, title: str, body: str, head_branch: str, base_branch: str = "main"
+) -> str:
+    """
+    Create a pull request with fixes.
+
+    Args:
+        repo_name: Repository in format 'owner/repo'
+        title: PR title
+        body: PR description
+        head_branch: Branch with the fix
+        base_branch: Target branch (default: main)
+
+    Returns:
+        URL of the created PR (or of the open PR that already exists for
+        `head_branch`)
+    """
+    try:
+        cache = get_content_cache()
+
+        with github_priority(WRITE):
+            # Never open a second PR for the same branch (e.g. a resumed heal)
+            owner = repo_name.split("/")[0]
+            existing = cache.get_revalidated(
+                f"/repos/{repo_name}/pulls",
+                {"state": "open", "head": f"{owner}:{head_branch}", "base": base_branch},
+            )
+            if existing:
+                return f"✓ Pull request already exists: {existing[0]['html_url']}"
+
+            pr = cache.post_json(
+                f"/repos/{repo_name}/pulls",
+                {"title": title, "body": body, "head": head_branch, "base": base_branch},
+            )
+
+        return f"✓ Pull request created: {pr['html_url']}"
+
+    except GithubException as e:
+        return f"Error creating PR: {e.data.get('message', str(e))}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@tool
+@trace_tool
+def comment_on_pull_request(repo_name: str, number: int, body: str) -> str:
+    """
+    Add a comment to a pull request.
+
+    Args:
+        repo_name: Repository in format 'owner/repo'
+        number: Pull request number
+        body: Comment text (Markdown)
+
+    Returns:
+        URL of the comment
+    """
+    try:
+        # Pull request comments are issue comments in the REST API
+        comment = get_content_cache().post_json(f"/repos/{repo_name}/issues/{number}/comments", {"body": body})
+        return f"✓ Comment added: {comment['html_url']}"
+
+    except GithubException as e:
+        return f"Error commenting on PR: {e.data.get('message', str(e))}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def git_blob_sha(content: str) -> str:
+    """The SHA git gives a blob with this content (no upload needed)."""
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def get_branch_sha(repo_name: str, branch_name: str) -> Optional[str]:
+    """Head commit of a branch, or None if the branch does not exist."""
+    try:
+        ref = get_content_cache().get_revalidated(f"/repos/{repo_name}/git/ref/heads/{branch_name}")
+    except GithubException as e:
+        if e.status == 404:
+            return None
+        raise
+    return ref["object"]["sha"]
+
+
+def commit_files_to_branch(
+    repo_name: str, files: Dict[str, str], branch_name: str, commit_message: str
+) -> Tuple[str, str]:
+    """
+    Commit any number of files to a branch, creating it off the default
+    branch if it does not exist yet.
+
+    Uses the Git Data API: all blobs are uploaded concurrently, then one
+    tree, one commit and the branch ref are created. Reads (default branch,
+    head SHA, base commit, base tree) come from the content cache, so a warm
+    run costs len(files) parallel blob uploads plus three sequential writes.
+
+    Safe to repeat: if the branch already holds exactly these file contents
+    (e.g. a resumed run committing the same fix again), nothing is written.
+
+    Returns:
+        (SHA of the branch head, "created" | "updated" | "unchanged")
+    """
+    cache = get_content_cache()
+    base = f"/repos/{repo_name}"
+
+    # Base commit and its tree (head is revalidated, the commit is immutable)
+    branch_sha = get_branch_sha(repo_name, branch_name)
+    if branch_sha is None:
+        base_sha = cache.resolve_ref(repo_name, default_branch(repo_name))
+    else:
+        base_sha = branch_sha
+    base_tree = cache.get_commit(repo_name, base_sha)["tree"]["sha"]
+
+    # Existing file modes (e.g. executable scripts) are kept
+    entries = {entry["path"]: entry for entry in cache.get_tree(repo_name, base_sha)}
+    if branch_sha is not None and all(
+        path in entries and entries[path]["sha"] == git_blob_sha(content) for path, content in files.items()
+    ):
+        return branch_sha, "unchanged"
+
+    def upload_blob(content: str) -> str:
+        payload = {"content": base64.b64encode(content.encode("utf-8")).decode(), "encoding": "base64"}
+        return cache.post_json(f"{base}/git/blobs", payload)["sha"]
+
+    with ThreadPoolExecutor(max_workers=BLOB_UPLOAD_WORKERS) as pool:
+        blob_shas = dict(zip(files, pool.map(propagate(upload_blob), files.values())))
+
+    tree = cache.post_json(
+        f"{base}/git/trees",
+        {
+            "base_tree": base_tree,
+            "tree": [
+                {
+                    "path": path,
+                    "mode": entries[path]["mode"] if path in entries else "100644",
+                    "type": "blob",
+                    "sha": sha,
+                }
+                for path, sha in blob_shas.items()
+            ],
+        },
+    )
+    commit = cache.post_json(
+        f"{base}/git/commits",
+        {"message": commit_message, "tree": tree["sha"], "parents": [base_sha]},
+    )
+
+    if branch_sha is None:
+        cache.post_json(f"{base}/git/refs", {"ref": f"refs/heads/{branch_name}", "sha": commit["sha"]})
+        return commit["sha"], "created"
+
+    cache.patch_json(f"{base}/git/refs/heads/{branch_name}", {"sha": commit["sha"]})
+    return commit["sha"], "updated"
+
+
+@tool
+@trace_tool
+def create_branch_with_files(
+    repo_name: str, files: Dict[str, str], branch_name: str, commit_message: str
+) -> str:
+    """
+    Create a branch with one commit that updates several files at once.
+
+    Running it again with the same files is a no-op, so a retried or
+    resumed heal does not create duplicate commits.
+
+    Args:
+        repo_name: Repository in format 'owner/repo'
+        files: Mapping of file path to its new full content
+        branch_name: Name for the new branch
+        commit_message: Commit message
+
+    Returns:
+        Success message with branch name
+    """
+    try:
+        # Everything here is on the critical path to the PR
+        with github_priority(WRITE):
+            _, status = commit_files_to_branch(repo_name, files, branch_name, commit_message)
+
+        if status == "unchanged":
+            return f"✓ Branch '{branch_name}' already has the changes to {', '.join(files)}"
+        if status == "updated":
+            return f"✓ Updated branch '{branch_name}' with {', '.join(files)}"
+        return f"✓ Created branch '{branch_name}' and updated {', '.join(files)}"
+
+    except GithubException as e:
+        return f"Error: {e.data.get('message', str(e))}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@tool
+@trace_tool
+def create_branch_and_update_file(
+    repo_name: str,
+    file_path: str,
+    new_content: str,
+    branch_name: str,
+    commit_message: str,
+) -> str:
+    """
+    Create a new branch and update a file with a fix.
+
+    Args:
+        repo_name: Repository in format 'owner/repo'
+        file_path: Path to the file to update
+        new_content: New file content
+        branch_name: Name for the new branch
+        commit_message: Commit message
+
+    Returns:
+        Success message with branch name
+    """
+    try:
+        with github_priority(WRITE):
+            commit_files_to_branch(repo_name, {file_path: new_content}, branch_name, commit_message)
+
+        return f"✓ Created branch '{branch_name}' and updated {file_path}"
+
+    except GithubException as e:
+        return f"Error: {e.data.get('message', str(e))}"
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+@tool
+@trace_tool
+def list_recent_workflow_runs(repo_name: str, limit: int = 5) -> str:
+    """
+    List recent workflow runs for a repository.
+
+    Args:
+        repo_name: Repository in format 'owner/repo'
+        limit: Number of runs to return (default: 5)
+
+    Returns:
+        List of recent workflow runs with their status
+    """
+    try:
+        # Nobody is blocked on a listing; it yields to running heals
+        with github_priority(BACKGROUND):
+            runs = get_content_cache().get_revalidated(
+                f"/repos/{repo_name}/actions/runs", {"per_page": limit}
+            )["workflow_runs"]
+
+        results = []
+        for run in runs[:limit]:
+            status_emoji = "✓" if run["conclusion"] == "success" else "✗"
+            results.append(
+                f"{status_emoji} Run #{run['id']} - {run['name']} - "
+                f"{run['conclusion']} - {run['head_commit']['message'][:50]}"
+            )
+
+        return "\n".join(results) if results else "No workflow runs found"
+
+    except Exception as e:
+        return f"Error: {str(e)}"
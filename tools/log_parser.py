@@ -0,0 +1,233 @@
+# tools/log_parser.py
+
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Iterable, List, Optional
+
+# GitHub prefixes every log line with an ISO timestamp
+TIMESTAMP_PREFIX = re.compile(rb"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?Z ")
+
+# Lines that usually mean something went wrong
+FAILURE_MARKERS = re.compile(
+    rb"##\[error\]"
+    rb"|Traceback \(most recent call last\)"
+    rb"|\b(?:Error|ERROR|FAILED|FAILURE|Fatal|FATAL)\b"
+    rb"|npm ERR!"
+    rb"|\berror(?:\[\w+\])?:"
+    rb"|Process completed with exit code [1-9]"
+)
+
+# Literal substrings every marker contains; scanning for these with `in` is
+# far cheaper than running the regex over every chunk
+MARKER_KEYWORDS = (
+    b"##[error]",
+    b"Traceback",
+    b"Error",
+    b"ERROR",
+    b"FAIL",
+    b"Fatal",
+    b"FATAL",
+    b"npm ERR!",
+    b"error",
+    b"exit code",
+)
+
+# "##[group]Run pytest -q" marks the start of a step's command output
+STEP_GROUP = re.compile(rb"^##\[group\]Run (.*)$")
+
+# Defaults, tuned so a parser never holds more than a few hundred lines
+DEFAULT_BEFORE = 20
+DEFAULT_AFTER = 30
+DEFAULT_MAX_WINDOWS = 8
+DEFAULT_MAX_WINDOW_LINES = 200
+DEFAULT_TAIL = 40
+MAX_LINE_BYTES = 2000
+
+
+class LogWindow:
+    """A contiguous excerpt of log lines around one or more failure markers."""
+
+    def __init__(self, start_line: int, step: str, lines: List[str]):
+        self.start_line = start_line
+        self.step = step
+        self.lines = lines
+
+    def render(self) -> str:
+        header = f"--- line {self.start_line}"
+        if self.step:
+            header += f" (step: {self.step})"
+        return header + " ---\n" + "\n".join(self.lines)
+
+
+class IncrementalLogParser:
+    """
+    Line-oriented parser that can be fed a log in arbitrary byte chunks.
+
+    Only bounded buffers are kept: a ring buffer of the last few lines (the
+    context *before* a marker), the window currently being collected, the
+    last `max_windows` finished windows and the tail of the log. Memory use
+    therefore stays flat no matter how large the log is.
+    """
+
+    def __init__(
+        self,
+        before: int = DEFAULT_BEFORE,
+        after: int = DEFAULT_AFTER,
+        max_windows: int = DEFAULT_MAX_WINDOWS,
+        max_window_lines: int = DEFAULT_MAX_WINDOW_LINES,
+        tail: int = DEFAULT_TAIL,
+    ):
+        self.after = after
+        self.max_window_lines = max_window_lines
+
+        self._pending = b""
+        self._recent: Deque[str] = deque(maxlen=before)
+        self._tail: Deque[str] = deque(maxlen=tail)
+        self._windows: Deque[LogWindow] = deque(maxlen=max_windows)
+        self._current: Optional[LogWindow] = None
+        self._remaining_after = 0
+
+        self.line_count = 0
+        self.byte_count = 0
+        self.marker_count = 0
+        self.step = ""
+        self.failed_steps: List[str] = []
+
+    def feed(self, chunk: bytes):
+        """Feed the next chunk of raw log bytes."""
+        self.byte_count += len(chunk)
+        data = self._pending + chunk
+        lines = data.split(b"\n")
+        self._pending = lines.pop()
+
+        # Guard against a single enormous line with no newline in sight
+        if len(self._pending) > MAX_LINE_BYTES * 4:
+            lines.append(self._pending)
+            self._pending = b""
+
+        # Fast path: most chunks contain no marker and no step header, so only
+        # the lines that can still end up in the ring buffers need processing
+        if (
+            self._current is None
+            and b"##[group]" not in data
+            and not any(keyword in data for keyword in MARKER_KEYWORDS)
+        ):
+            keep = max(self._recent.maxlen, self._tail.maxlen)
+            self.line_count += max(len(lines) - keep, 0)
+            lines = lines[-keep:]
+
+        for line in lines:
+            self._process(line)
+
+    def close(self) -> "IncrementalLogParser":
+        """Flush the last partial line and finish the open window."""
+        if self._pending:
+            self._process(self._pending)
+            self._pending = b""
+        self._finish_window()
+        return self
+
+    def _process(self, raw: bytes):
+        self.line_count += 1
+        raw = TIMESTAMP_PREFIX.sub(b"", raw.rstrip(b"\r"), count=1)
+
+        group = STEP_GROUP.match(raw)
+        if group:
+            self.step = group.group(1)[:200].decode("utf-8", errors="replace")
+
+        is_marker = FAILURE_MARKERS.search(raw) is not None
+        line = raw[:MAX_LINE_BYTES].decode("utf-8", errors="replace")
+
+        if is_marker:
+            self.marker_count += 1
+            if self.step and self.step not in self.failed_steps:
+                self.failed_steps.append(self.step)
+                del self.failed_steps[:-DEFAULT_MAX_WINDOWS]
+
+            if self._current is None:
+                self._current = LogWindow(
+                    self.line_count - len(self._recent), self.step, list(self._recent)
+                )
+            self._remaining_after = self.after
+
+        if self._current is not None:
+            self._current.lines.append(line)
+            if not is_marker:
+                self._remaining_after -= 1
+            if self._remaining_after <= 0 or len(self._current.lines) >= self.max_window_lines:
+                self._finish_window()
+
+        self._recent.append(line)
+        self._tail.append(line)
+
+    def _finish_window(self):
+        if self._current is not None:
+            self._windows.append(self._current)
+            self._current = None
+
+    @property
+    def windows(self) -> List[LogWindow]:
+        return list(self._windows)
+
+    def render(self) -> str:
+        """Render the kept windows (or the tail if nothing matched) as text."""
+        parts = [window.render() for window in self._windows]
+
+        if not parts and self._tail:
+            parts.append("--- last lines ---\n" + "\n".join(self._tail))
+
+        return "\n\n".join(parts)
+
+
+def parse_log_chunks(chunks: Iterable[bytes], **options) -> IncrementalLogParser:
+    """Run a parser over an iterable of byte chunks."""
+    parser = IncrementalLogParser(**options)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+def parse_log_file(path: str, chunk_size: int = 1 << 16, **options) -> dict:
+    """
+    Parse a log file from disk.
+
+    Top-level and returning plain data so it can run in a process pool.
+
+    Returns:
+        Dict with the rendered excerpt, failed steps and counters
+    """
+
+    def chunks():
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    return summarize(parse_log_chunks(chunks(), **options))
+
+
+def summarize(parser: IncrementalLogParser) -> dict:
+    """Plain-data summary of a finished parser."""
+    return {
+        "excerpt": parser.render(),
+        "failed_steps": list(parser.failed_steps),
+        "lines": parser.line_count,
+        "bytes": parser.byte_count,
+        "markers": parser.marker_count,
+    }
+
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Shared process pool for parsing very large logs off the main thread."""
+    global _parse_pool
+    if _parse_pool is None:
+        workers = int(os.getenv("LOG_PARSE_WORKERS", "2"))
+        _parse_pool = ProcessPoolExecutor(max_workers=workers)
+    return _parse_pool
@@ -0,0 +1,255 @@
+# tools/sandbox.py
+
+import base64
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+
+from tools.github_cache import CACHE_DIR
+from tools.workflow_steps import SHELL_COMMANDS, WorkflowStep
+
+# Where repositories are fetched from; "{repo}" is "owner/name". Point it at
+# local bare repositories (e.g. "/srv/git/{repo}.git") to heal offline
+REPRO_GIT_URL = os.getenv("REPRO_GIT_URL", "https://github.com/{repo}.git")
+REPRO_CACHE_DIR = os.getenv("REPRO_CACHE_DIR", os.path.join(CACHE_DIR, "git"))
+REPRO_FETCH_DEPTH = int(os.getenv("REPRO_FETCH_DEPTH", "1"))
+REPRO_GIT_TIMEOUT = float(os.getenv("REPRO_GIT_TIMEOUT_SECONDS", "120"))
+
+# Limits for the reproduced step (0: no limit)
+REPRO_TIMEOUT = float(os.getenv("REPRO_TIMEOUT_SECONDS", "300"))
+REPRO_MEMORY_MB = int(os.getenv("REPRO_MEMORY_MB", "2048"))
+REPRO_MAX_FILE_MB = int(os.getenv("REPRO_MAX_FILE_MB", "256"))
+REPRO_MAX_OPEN_FILES = int(os.getenv("REPRO_MAX_OPEN_FILES", "1024"))
+
+# Step output kept for the report (the end, where the failure usually is)
+OUTPUT_TAIL_BYTES = 16 * 1024
+
+# Sets the limits, then replaces itself with the step. A separate process
+# because preexec_fn is not safe in a multi-threaded healer.
+_LIMITS_LAUNCHER = """
+import os, resource, sys
+limits = (resource.RLIMIT_CPU, resource.RLIMIT_AS, resource.RLIMIT_FSIZE, resource.RLIMIT_NOFILE)
+for limit, value in zip(limits, sys.argv[1:5]):
+    if int(value) > 0:
+        resource.setrlimit(limit, (int(value), int(value)))
+os.execvp(sys.argv[5], sys.argv[5:])
+"""
+
+# Variables the step inherits from the healer (locale and what locates the
+# toolchain, plus any listed in REPRO_PASS_ENV); everything else, tokens and
+# API keys included, stays out of the sandbox
+INHERITED_ENV = ("PATH", "LANG", "LC_ALL", "TZ", "TMPDIR", "PYENV_ROOT", "PYENV_VERSION", "VIRTUAL_ENV")
+REPRO_PASS_ENV = [name.strip() for name in os.getenv("REPRO_PASS_ENV", "").split(",") if name.strip()]
+
+
+class SandboxError(Exception):
+    """Git could not provide the commit to reproduce on."""
+
+
+class StepResult(NamedTuple):
+    """Outcome of running one workflow step locally."""
+
+    exit_code: Optional[int]  # None if the step timed out
+    output: str  # The last OUTPUT_TAIL_BYTES of stdout and stderr
+    duration: float  # Seconds
+
+    @property
+    def passed(self) -> bool:
+        return self.exit_code == 0
+
+
+def _git_auth_env() -> Dict[str, str]:
+    """
+    Config that authenticates HTTPS fetches with the GitHub token, passed
+    through the environment so it never shows up in a process list.
+    """
+    token = (os.getenv("GITHUB_TOKENS") or os.getenv("GITHUB_TOKEN") or "").split(",")[0].strip()
+    if not token:
+        return {}
+    credentials = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+    return {
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": "http.extraHeader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}",
+    }
+
+
+class GitCache:
+    """
+    Shallow bare copies of the repositories being healed, one per
+    repository and reused across runs: each run fetches only its commit
+    (depth REPRO_FETCH_DEPTH) and checks it out into a throwaway worktree.
+    """
+
+    def __init__(self, root: str = REPRO_CACHE_DIR, url: str = REPRO_GIT_URL, depth: int = REPRO_FETCH_DEPTH):
+        self.root = root
+        self.url = url
+        self.depth = depth
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, repo_name: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(repo_name, threading.Lock())
+
+    def _git(self, location: List[str], command: str, *args: str) -> str:
+        """Run `git <location> <command> <args>`; `location` is --git-dir or -C and a path."""
+        env = {**os.environ, "GIT_TERMINAL_PROMPT": "0", **_git_auth_env()}
+        try:
+            result = subprocess.run(
+                ["git", *location, command, *args],
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=REPRO_GIT_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise SandboxError(f"git {command} failed: {e}") from None
+        if result.returncode != 0:
+            raise SandboxError(f"git {command} failed: {result.stderr.strip()[-500:]}")
+        return result.stdout
+
+    def git_dir(self, repo_name: str) -> str:
+        return os.path.join(self.root, repo_name + ".git")
+
+    def fetch(self, repo_name: str, sha: str) -> str:
+        """
+        Make sure the cache has commit `sha` of `repo_name`.
+
+        Returns:
+            The cache's git directory
+
+        Raises:
+            SandboxError: if the commit cannot be fetched
+        """
+        git_dir = self.git_dir(repo_name)
+        where = ["--git-dir", git_dir]
+        with self._lock(repo_name):
+            if not os.path.exists(os.path.join(git_dir, "HEAD")):
+                os.makedirs(git_dir, exist_ok=True)
+                self._git(where, "init", "--quiet", "--bare")
+            try:
+                self._git(where, "cat-file", "-e", f"{sha}^{{commit}}")
+                return git_dir
+            except SandboxError:
+                pass
+            # A ref per commit keeps it from being garbage-collected
+            self._git(
+                where,
+                "fetch",
+                "--quiet",
+                "--no-tags",
+                "--no-write-fetch-head",
+                f"--depth={self.depth}",
+                self.url.format(repo=repo_name),
+                f"{sha}:refs/healer/{sha}",
+            )
+        return git_dir
+
+    @contextmanager
+    def worktree(self, repo_name: str, sha: str):
+        """
+        Check out `sha` into a temporary directory, removed afterwards.
+
+        Yields:
+            The worktree's path
+
+        Raises:
+            SandboxError: if the commit cannot be fetched or checked out
+        """
+        git_dir = self.fetch(repo_name, sha)
+        path = tempfile.mkdtemp(prefix="healer-worktree-")
+        with self._lock(repo_name):
+            self._git(["--git-dir", git_dir], "worktree", "add", "--force", "--detach", path, sha)
+        try:
+            yield path
+        finally:
+            with self._lock(repo_name):
+                try:
+                    self._git(["--git-dir", git_dir], "worktree", "remove", "--force", path)
+                except SandboxError:
+                    shutil.rmtree(path, ignore_errors=True)
+                    self._git(["--git-dir", git_dir], "worktree", "prune")
+
+    def reset(self, path: str):
+        """Discard every change and untracked file in a worktree."""
+        self._git(["-C", path], "reset", "--quiet", "--hard")
+        self._git(["-C", path], "clean", "--quiet", "-ffdx")
+
+
+def write_files(root: str, files: Dict[str, str]):
+    """Write {path: content} into a worktree."""
+    for path, content in files.items():
+        target = os.path.realpath(os.path.join(root, path))
+        if not target.startswith(os.path.realpath(root) + os.sep):
+            raise SandboxError(f"{path} is outside the repository")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "w") as f:
+            f.write(content)
+
+
+def _command(step: WorkflowStep) -> List[str]:
+    megabyte = 1024 * 1024
+    limits = [
+        int(REPRO_TIMEOUT),
+        REPRO_MEMORY_MB * megabyte,
+        REPRO_MAX_FILE_MB * megabyte,
+        REPRO_MAX_OPEN_FILES,
+    ]
+    return [sys.executable, "-c", _LIMITS_LAUNCHER, *map(str, limits), *SHELL_COMMANDS[step.shell], step.run]
+
+
+def run_step(step: WorkflowStep, worktree: str, timeout: float = REPRO_TIMEOUT) -> StepResult:
+    """
+    Run a workflow step in a worktree under resource limits.
+
+    The step gets the healer's PATH, locale and toolchain variables but no
+    others (so no tokens), a scratch HOME, CI=true and the step's literal
+    env. CPU time, address space, file size and open files are capped; the
+    whole process group is killed after `timeout` seconds.
+    """
+    home = tempfile.mkdtemp(prefix="healer-home-")
+    env = {key: os.environ[key] for key in (*INHERITED_ENV, *REPRO_PASS_ENV) if key in os.environ}
+    env.update(HOME=home, CI="true", **step.env)
+    cwd = os.path.join(worktree, step.working_directory)
+
+    started = time.monotonic()
+    try:
+        with tempfile.TemporaryFile() as output:
+            try:
+                process = subprocess.Popen(
+                    _command(step), cwd=cwd, env=env, stdout=output, stderr=subprocess.STDOUT, start_new_session=True
+                )
+            except OSError as e:
+                return StepResult(127, f"could not start the step: {e}", 0.0)
+            try:
+                exit_code = process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                exit_code = None
+            size = output.seek(0, os.SEEK_END)
+            output.seek(max(size - OUTPUT_TAIL_BYTES, 0))
+            tail = output.read().decode("utf-8", errors="replace")
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    return StepResult(exit_code, tail, round(time.monotonic() - started, 3))
+
+
+_git_cache: Optional[GitCache] = None
+
+
+def get_git_cache() -> GitCache:
+    """Shared GitCache in REPRO_CACHE_DIR (created on first use)."""
+    global _git_cache
+    if _git_cache is None:
+        _git_cache = GitCache()
+    return _git_cache
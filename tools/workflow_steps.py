@@ -0,0 +1,126 @@
+# tools/workflow_steps.py
+
+import re
+from typing import Dict, NamedTuple, Optional
+
+import yaml
+
+# Shells a step may ask for that we can run locally, as GitHub invokes them
+SHELL_COMMANDS = {
+    "bash": ["bash", "--noprofile", "--norc", "-eo", "pipefail", "-c"],
+    "sh": ["sh", "-e", "-c"],
+    "python": ["python", "-c"],
+}
+
+# ${{ ... }} expressions are only evaluated by the Actions runner
+EXPRESSION = re.compile(r"\$\{\{.*?\}\}")
+
+# GitHub appends the matrix values to a job's name: "test (3.11, ubuntu)"
+MATRIX_SUFFIX = re.compile(r" \([^()]*\)$")
+
+
+class NotReproducible(Exception):
+    """The failing step cannot be run outside the Actions runner."""
+
+
+class WorkflowStep(NamedTuple):
+    """A `run:` step resolved from a workflow file, ready to run locally."""
+
+    job: str  # Job ID in the workflow
+    name: str  # Step name as GitHub shows it
+    run: str  # The script
+    shell: str  # Key of SHELL_COMMANDS
+    working_directory: str  # Relative to the repository root ("" for the root)
+    env: Dict[str, str]  # Workflow, job and step env with literal values
+
+
+def step_display_name(step: dict) -> str:
+    """The name GitHub shows for a step: its `name`, or "Run <first line>"."""
+    if step.get("name"):
+        return str(step["name"])
+    if step.get("run"):
+        return "Run " + str(step["run"]).strip().splitlines()[0]
+    return "Run " + str(step.get("uses", ""))
+
+
+def _name_matches(template: str, name: str) -> bool:
+    """Does a (possibly templated) job or step name match the one GitHub reported?"""
+    if "${{" not in template:
+        return template == name
+    pattern = ".+".join(re.escape(part) for part in EXPRESSION.split(template))
+    return re.fullmatch(pattern, name) is not None
+
+
+def _literal_env(*scopes: Optional[dict]) -> Dict[str, str]:
+    """Merge env mappings (later scopes win), dropping values that need the runner."""
+    env = {}
+    for scope in scopes:
+        if isinstance(scope, dict):
+            env.update({str(key): str(value) for key, value in scope.items()})
+    return {key: value for key, value in env.items() if "${{" not in value}
+
+
+def _run_default(key: str, job: dict, workflow: dict) -> str:
+    """`defaults.run.<key>` of the job, else of the workflow ("" if neither sets it)."""
+    for scope in (job, workflow):
+        defaults = scope.get("defaults")
+        run = defaults.get("run") if isinstance(defaults, dict) else None
+        if isinstance(run, dict) and run.get(key):
+            return str(run[key])
+    return ""
+
+
+def find_step(workflow_text: str, job_name: str, step_name: str) -> WorkflowStep:
+    """
+    Find the step a run reported as failed in its workflow file.
+
+    Args:
+        workflow_text: The workflow YAML at the failing commit
+        job_name: Job name from the run's jobs (with any matrix suffix)
+        step_name: Name of the failed step in that job
+
+    Raises:
+        NotReproducible: if the step cannot be found, is an action
+            (`uses:`), depends on `${{ }}` expressions or needs a shell we
+            do not run
+    """
+    try:
+        workflow = yaml.safe_load(workflow_text)
+    except yaml.YAMLError as e:
+        raise NotReproducible(f"the workflow file does not parse: {e}") from None
+    if not isinstance(workflow, dict) or not isinstance(workflow.get("jobs"), dict):
+        raise NotReproducible("the workflow file has no jobs")
+
+    base_name = MATRIX_SUFFIX.sub("", job_name)
+    for job_id, job in workflow["jobs"].items():
+        if not isinstance(job, dict):
+            continue
+        template = str(job.get("name") or job_id)
+        if not any(_name_matches(template, name) for name in (job_name, base_name)):
+            continue
+
+        for step in job.get("steps") or []:
+            if not isinstance(step, dict) or not _name_matches(step_display_name(step), step_name):
+                continue
+            if "run" not in step:
+                raise NotReproducible(f"step '{step_name}' runs the action {step.get('uses')}, not a command")
+            run = str(step["run"])
+            if "${{" in run:
+                raise NotReproducible(f"step '{step_name}' uses ${{{{ }}}} expressions")
+            shell = str(step.get("shell") or _run_default("shell", job, workflow) or "bash")
+            if shell not in SHELL_COMMANDS:
+                raise NotReproducible(f"step '{step_name}' runs in '{shell}', which is not supported locally")
+            directory = str(step.get("working-directory") or _run_default("working-directory", job, workflow))
+            if "${{" in directory:
+                raise NotReproducible(f"step '{step_name}' has a templated working directory")
+            return WorkflowStep(
+                job=str(job_id),
+                name=step_name,
+                run=run,
+                shell=shell,
+                working_directory=directory,
+                env=_literal_env(workflow.get("env"), job.get("env"), step.get("env")),
+            )
+        raise NotReproducible(f"job '{job_id}' has no step named '{step_name}'")
+
+    raise NotReproducible(f"no job named '{job_name}' in the workflow file")